@@ -0,0 +1,304 @@
+"""Benchmarks for YouTubeMultiStreamer
+
+Run with: python benchmark.py [--sizes 10,100,500] [--store-accounts 10000] [--output results.json]
+
+Streams run against fake_ffmpeg.py and a local TCP sink standing in for
+the RTMP ingest, so no real encoder or network is needed. Each size runs
+in its own process so memory and thread counts are not mixed between runs.
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import multiprocessing
+import time
+import contextlib
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from main import YouTubeMultiStreamer
+
+FAKE_FFMPEG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_ffmpeg.py')
+
+
+def run_sink(ready, stats):
+    """Accept fake RTMP connections and count the bytes received"""
+    async def handle(reader, writer):
+        with stats.get_lock():
+            stats[0] += 1
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            with stats.get_lock():
+                stats[1] += len(data)
+        writer.close()
+
+    async def serve():
+        server = await asyncio.start_server(handle, '127.0.0.1', 0, backlog=1024)
+        ready.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def start_sink():
+    """Start the RTMP sink in its own process, returning (process, port, stats)"""
+    ready = multiprocessing.Queue()
+    stats = multiprocessing.Array('q', 2)  # connections, bytes
+    process = multiprocessing.Process(target=run_sink, args=(ready, stats), daemon=True)
+    process.start()
+    return process, ready.get(timeout=10), stats
+
+
+class FakeScreen:
+    """Minimal curses window that only counts the calls render_dashboard makes"""
+
+    def __init__(self, height=50, width=120):
+        self.size = (height, width)
+        self.writes = 0
+
+    def getmaxyx(self):
+        return self.size
+
+    def erase(self):
+        pass
+
+    def addstr(self, *args):
+        self.writes += 1
+
+    def clrtoeol(self):
+        pass
+
+    def refresh(self):
+        pass
+
+
+def process_memory():
+    """Resident set size of this process in MB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    import resource
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def wait_for(streamer, statuses, timeout):
+    """Wait until every account is in one of statuses, returning seconds waited or None"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if all(account['status'] in statuses for account in list(streamer.accounts.values())):
+            return round(time.perf_counter() - started, 3)
+        time.sleep(0.05)
+    return None
+
+
+def make_streamer(sink_port):
+    """Streamer in a fresh working directory, wired to the fake ffmpeg and sink"""
+    os.chdir(tempfile.mkdtemp(prefix='ytms-bench-'))
+    with contextlib.redirect_stdout(sys.stderr):  # keep stdout for the JSON results
+        streamer = YouTubeMultiStreamer()
+    streamer.settings.update({
+        'ffmpeg_path': FAKE_FFMPEG,
+        'rtmp_base': f"rtmp://127.0.0.1:{sink_port}/live2",
+        'cpu_budget': 1000000,  # admission is not what is being measured
+        'ramp_interval': 0,
+        'relay_urls': False  # the bench URLs serve nothing, FFmpeg (fake) opens them itself
+    })
+    return streamer
+
+
+def bench_dashboard(streamer, frames=50):
+    """Time a full redraw and the average incremental redraw of the dashboard"""
+    screen = FakeScreen()
+    view = streamer.new_dashboard_view()
+    started = time.perf_counter()
+    streamer.render_dashboard(screen, view)
+    full = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(frames):
+        streamer.render_dashboard(screen, view)
+    incremental = (time.perf_counter() - started) / frames
+    return {'full_render_ms': round(full * 1000, 2), 'incremental_render_ms': round(incremental * 1000, 2)}
+
+
+def bench_streams(accounts, sink_port, hold=5.0):
+    """Start, hold and stop one stream per account, measuring the manager process"""
+    os.environ.setdefault('FAKE_FFMPEG_BITRATE_SCALE', '0.01')
+    streamer = make_streamer(sink_port)
+    for i in range(accounts):
+        # Distinct sources, so no two accounts share an encode: one FFmpeg per account
+        streamer.add_account(f"key-{i}", f"http://127.0.0.1/bench-{i}.mp4", f"Bench {i}")
+    streamer.flush_config()
+    baseline_threads = threading.active_count()
+    timeout = 60 + accounts * 0.5
+
+    writes_before = streamer.config_writes
+    window_started = time.perf_counter()
+    started = time.perf_counter()
+    streamer.start_all_streams()
+    start_call = time.perf_counter() - started
+    all_streaming = wait_for(streamer, ('streaming',), timeout)
+
+    time.sleep(hold)
+    result = {
+        'accounts': accounts,
+        'start_all_call_s': round(start_call, 3),
+        'all_streaming_s': None if all_streaming is None else round(start_call + all_streaming, 3),
+        'streaming': sum(1 for account in streamer.accounts.values() if account['status'] == 'streaming'),
+        'rss_mb': process_memory(),
+        'threads': threading.active_count(),
+        'threads_added': threading.active_count() - baseline_threads,
+        'dashboard': bench_dashboard(streamer)
+    }
+
+    started = time.perf_counter()
+    streamer.stop_all_streams()
+    stop_call = time.perf_counter() - started
+    all_stopped = wait_for(streamer, ('stopped', 'failed'), timeout)
+    result['stop_all_call_s'] = round(stop_call, 3)
+    result['all_stopped_s'] = None if all_stopped is None else round(stop_call + all_stopped, 3)
+
+    window = time.perf_counter() - window_started
+    streamer.flush_pending_config()
+    result['config_writes_per_sec'] = round((streamer.config_writes - writes_before) / window, 2)
+    return result
+
+
+def bench_config_writes(streams=100, duration=5.0):
+    """Measure config.json writes/sec while every stream churns its runtime state"""
+    workdir = tempfile.mkdtemp(prefix='ytms-bench-')
+    os.chdir(workdir)
+    with contextlib.redirect_stdout(sys.stderr):
+        streamer = YouTubeMultiStreamer()
+    for i in range(streams):
+        streamer.add_account(f"key-{i}", f"video-{i}.mp4", f"Bench {i}")
+    streamer.flush_config()
+    writes_before = streamer.config_writes
+
+    # Same update pattern as a looping stream worker: starting, restart, stop
+    deadline = time.time() + duration
+    updates = [0]
+
+    def worker(account_id):
+        while time.time() < deadline:
+            streamer.update_account(account_id, status='streaming', pid=account_id,
+                                    start_time=datetime.now().isoformat())
+            streamer.update_account(account_id, status='stopped', pid=None, start_time=None)
+            updates[0] += 2
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=worker, args=(account_id,)) for account_id in streamer.accounts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    streamer.flush_pending_config()
+
+    return {
+        'streams': streams,
+        'duration': duration,
+        'account_updates_per_sec': round(updates[0] / duration, 1),
+        'config_writes_per_sec': round((streamer.config_writes - writes_before) / duration, 2)
+    }
+
+
+def bench_account_store(accounts=10000):
+    """Compare the config.json and SQLite account stores at a given account count"""
+    def timed(call, *args, **kwargs):
+        started = time.perf_counter()
+        result = call(*args, **kwargs)
+        return result, round((time.perf_counter() - started) * 1000, 2)
+
+    workdir = tempfile.mkdtemp(prefix='ytms-bench-')
+    os.chdir(workdir)
+    with open('accounts.csv', 'w') as f:
+        f.write('stream_key,video_source,label,preset\n')
+        for i in range(accounts):
+            f.write(f"key-{i},video-{i % 50}.mp4,Bench {i},{('low', 'medium', 'high')[i % 3]}\n")
+
+    results = {'accounts': accounts}
+    for store in ('json', 'sqlite'):
+        if os.path.exists('config.json'):
+            os.remove('config.json')
+        with open('config.json', 'w') as f:
+            json.dump({'settings': {'account_store': store}}, f)
+        with contextlib.redirect_stdout(sys.stderr):
+            streamer = YouTubeMultiStreamer()
+            _, import_ms = timed(streamer.import_accounts, 'accounts.csv')
+            _, import_flush_ms = timed(streamer.flush_config)
+            _, load_ms = timed(YouTubeMultiStreamer)
+
+        streamer.update_account(accounts // 2, label='Renamed')
+        _, update_flush_ms = timed(streamer.flush_config)
+        matches, preset_query_ms = timed(streamer.find_accounts, preset='high')
+        _, label_query_ms = timed(streamer.find_accounts, label='Bench 99')
+        _, export_csv_ms = timed(streamer.export_accounts, 'export.csv')
+        _, export_json_ms = timed(streamer.export_accounts, 'export.json')
+        paths = ['config.json'] if store == 'json' else [streamer.settings['account_db'],
+                                                         streamer.settings['account_db'] + '-wal']
+        results[store] = {
+            'import_ms': round(import_ms + import_flush_ms, 2),
+            'load_ms': load_ms,
+            'single_update_flush_ms': update_flush_ms,
+            'preset_query_ms': preset_query_ms,
+            'preset_query_matches': len(matches),
+            'label_prefix_query_ms': label_query_ms,
+            'export_csv_ms': export_csv_ms,
+            'export_json_ms': export_json_ms,
+            'file_mb': round(sum(os.path.getsize(path) for path in paths if os.path.exists(path)) / 1048576, 2)
+        }
+    return results
+
+
+def run_isolated(target, *args):
+    """Run a benchmark function in a fresh process and return its result"""
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(target, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark YouTubeMultiStreamer with a fake FFmpeg")
+    parser.add_argument('--sizes', default='10,100,500', help="comma separated account counts")
+    parser.add_argument('--hold', type=float, default=5.0, help="seconds to keep streams running")
+    parser.add_argument('--store-accounts', type=int, default=10000,
+                        help="account count for the config.json vs SQLite store comparison")
+    parser.add_argument('--output', help="write the JSON results to this file")
+    args = parser.parse_args()
+
+    sink, port, stats = start_sink()
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'streams': [],
+        'config_writes': run_isolated(bench_config_writes),
+        'account_store': run_isolated(bench_account_store, args.store_accounts)
+    }
+    try:
+        for size in [int(size) for size in args.sizes.split(',') if size]:
+            print(f"Benchmarking {size} accounts...", file=sys.stderr)
+            results['streams'].append(run_isolated(bench_streams, size, port, args.hold))
+    finally:
+        results['sink'] = {'connections': stats[0], 'bytes': stats[1]}
+        sink.terminate()
+
+    output = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Stand-in for the ffmpeg binary, used by benchmark.py
+
+Point settings['ffmpeg_path'] at this file. It understands just enough of
+the command lines built by YouTubeMultiStreamer to behave like a stream:
+it writes -progress blocks to stdout, pushes bytes at the requested
+bitrate to every rtmp:// output (a plain TCP sink is enough) and writes a
+small file for local outputs such as transcode cache renditions. A
+pipe:1 output (the ingest relay puller) gets the bytes on stdout, and a
+tcp:// input (a relay consumer) is connected to and drained.
+
+Behaviour is tuned with environment variables:
+    FAKE_FFMPEG_START_DELAY      seconds before the first frame (default 0.2)
+    FAKE_FFMPEG_DURATION         exit 0 after this many seconds (default: run until killed)
+    FAKE_FFMPEG_CRASH_AFTER      exit 1 after this many seconds
+    FAKE_FFMPEG_CRASH_MESSAGE    stderr line written on crash (default "Conversion failed!")
+    FAKE_FFMPEG_SPEED            reported encoding speed (default 1.0)
+    FAKE_FFMPEG_BITRATE_SCALE    multiplier on the bytes sent to outputs (default 1.0)
+    FAKE_FFMPEG_PROGRESS_INTERVAL seconds between -progress blocks (default 0.5)
+    FAKE_FFMPEG_IGNORE_QUIT      ignore 'q' on stdin, SIGINT and SIGTERM, like a hung encoder
+
+Like ffmpeg, 'q' on stdin or SIGINT ends the run cleanly (exit 0).
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import threading
+
+
+def env_float(name, default=None):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def parse_kbits(value, default):
+    try:
+        return int(value.rstrip('k')) if value else default
+    except ValueError:
+        return default
+
+
+def output_urls(args):
+    """Output URLs of every flv or tee output, or the last argument"""
+    urls = []
+    for i, arg in enumerate(args[:-2]):
+        if arg == '-f' and args[i + 1] in ('flv', 'tee'):
+            urls += [part.split(']', 1)[-1] for part in args[i + 2].split('|')]
+    return urls or args[-1:]
+
+
+def connect(url):
+    """Open a TCP connection for rtmp://host:port/app/key, announcing the key"""
+    address = url.split('://', 1)[1]
+    host_port, _, path = address.partition('/')
+    host, _, port = host_port.partition(':')
+    sock = socket.create_connection((host, int(port or 1935)), timeout=5)
+    sock.sendall(path.encode('utf-8') + b'\n')
+    return sock
+
+
+def drain(url):
+    """Read a tcp:// input until it closes, like a demuxer would"""
+    host, _, port = url.split('://', 1)[1].split('/')[0].partition(':')
+    try:
+        with socket.create_connection((host, int(port)), timeout=5) as sock:
+            sock.settimeout(None)
+            while sock.recv(65536):
+                pass
+    except OSError:
+        pass
+
+
+def watch_stdin(quit_event):
+    """Set quit_event when 'q' arrives on stdin"""
+    while True:
+        data = sys.stdin.buffer.read(1)
+        if not data:
+            return
+        if data == b'q':
+            quit_event.set()
+            return
+
+
+def main():
+    args = sys.argv[1:]
+    quit_event = threading.Event()
+    if os.environ.get('FAKE_FFMPEG_IGNORE_QUIT'):
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, signal.SIG_IGN)
+    else:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(255))
+        signal.signal(signal.SIGINT, lambda signum, frame: quit_event.set())
+
+    source = args[args.index('-i') + 1] if '-i' in args else ''
+    if source.startswith('tcp://'):
+        threading.Thread(target=drain, args=(source,), daemon=True).start()
+
+    outputs = output_urls(args)
+    if outputs and outputs[0] in ('pipe:1', '-'):
+        outputs = []
+    elif outputs and '://' not in outputs[0]:
+        # Local output, e.g. a transcode cache rendition
+        with open(outputs[0], 'wb') as f:
+            f.write(b'FLV\x01' + b'\x00' * 1024)
+        return 0
+    if not sys.stdin.isatty() and not os.environ.get('FAKE_FFMPEG_IGNORE_QUIT'):
+        threading.Thread(target=watch_stdin, args=(quit_event,), daemon=True).start()
+
+    start_delay = env_float('FAKE_FFMPEG_START_DELAY', 0.2)
+    duration = env_float('FAKE_FFMPEG_DURATION')
+    crash_after = env_float('FAKE_FFMPEG_CRASH_AFTER')
+    speed = env_float('FAKE_FFMPEG_SPEED', 1.0)
+    interval = env_float('FAKE_FFMPEG_PROGRESS_INTERVAL', 0.5)
+    scale = env_float('FAKE_FFMPEG_BITRATE_SCALE', 1.0)
+    progress = '-progress' in args
+    video_kbits = parse_kbits(args[args.index('-b:v') + 1] if '-b:v' in args else None, 3000)
+    audio_kbits = parse_kbits(args[args.index('-b:a') + 1] if '-b:a' in args else None, 128)
+    fps = float(args[args.index('-r') + 1]) if '-r' in args else 30.0
+
+    time.sleep(start_delay)
+    try:
+        sockets = [connect(url) for url in outputs if url.startswith('rtmp://')]
+    except OSError as e:
+        sys.stderr.write(f"{outputs[0]}: Connection refused ({e})\n")
+        return 1
+
+    started = time.time()
+    chunk = b'\x00' * int((video_kbits + audio_kbits) * 1000 / 8 * interval * scale)
+    while True:
+        elapsed = time.time() - started
+        if crash_after is not None and elapsed >= crash_after:
+            sys.stderr.write(os.environ.get('FAKE_FFMPEG_CRASH_MESSAGE', 'Conversion failed!') + '\n')
+            return 1
+        if (duration is not None and elapsed >= duration) or quit_event.is_set():
+            if progress:
+                sys.stdout.write("progress=end\n")
+                sys.stdout.flush()
+            return 0
+
+        for sock in sockets:
+            try:
+                sock.sendall(chunk)
+            except OSError:
+                pass  # Like onfail=ignore: other outputs keep going
+        if not outputs:
+            sys.stdout.buffer.write(chunk)
+            sys.stdout.flush()
+        if progress:
+            out_time = time.strftime('%H:%M:%S', time.gmtime(elapsed))
+            sys.stdout.write(
+                f"frame={int(elapsed * fps) + 1}\nfps={fps * speed:.2f}\n"
+                f"bitrate={video_kbits + audio_kbits:.1f}kbits/s\n"
+                f"drop_frames=0\ndup_frames=0\nout_time={out_time}.000000\n"
+                f"speed={speed:.3f}x\nprogress=continue\n"
+            )
+            sys.stdout.flush()
+        quit_event.wait(interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,30 +3,187 @@ import time
 import subprocess
 import threading
 import json
-from datetime import datetime
+import csv
+import shutil
+import sqlite3
+import hashlib
+import math
+import queue
+import atexit
+import random
+import itertools
+import glob
+import heapq
+import re
+import sys
+import argparse
+import asyncio
+from datetime import datetime, timedelta
 import platform
 import signal
-import curses
-from curses import wrapper
-from collections import OrderedDict
+import weakref
+from collections import OrderedDict, deque
+
+# Streamers still in use, flushed once at interpreter exit (see flush_at_exit)
+live_streamers = weakref.WeakSet()
+
+@atexit.register
+def flush_at_exit():
+    """Write outstanding config changes and cache LRU times of every live streamer"""
+    for streamer in list(live_streamers):
+        streamer.flush_pending_config()
+        streamer.flush_cache_index()
 
 class YouTubeMultiStreamer:
-    def __init__(self):
+    def __init__(self, background=True):
         self.accounts = OrderedDict()  # {id: account_data}
+        self.accounts_version = 0  # bumped on every account change, see dashboard_account_ids
         self.next_account_id = 1
-        self.stream_processes = {}
+        self.stream_processes = {}  # {id: stream dict shared by accounts on one process}
+        self.stream_ids = itertools.count(1)
+        self.stream_stats = {}  # {id: runtime counters}, not persisted
+        self.stream_telemetry = {}  # {id: deque of -progress samples}
+        self.preset_overrides = {}  # {id: preset} while stepped down the ladder
+        self.playlist_durations = {}  # {concat list path: seconds per pass, None if unknown}
         self.presets = {
             'low': {'video': '1500k', 'audio': '128k', 'scale': '854:480', 'fps': 30},
             'medium': {'video': '3000k', 'audio': '128k', 'scale': '1280:720', 'fps': 30},
             'high': {'video': '4500k', 'audio': '192k', 'scale': '1920:1080', 'fps': 30},
             'ultra': {'video': '6000k', 'audio': '256k', 'scale': '2560:1440', 'fps': 60}
         }
+        # Encoder fields added after the first release, filled in on every preset
+        self.preset_defaults = {
+            'x264_preset': 'veryfast',
+            'tune': None,
+            'keyint': 2,  # seconds between keyframes
+            'threads': 0,  # x264 threads, 0 = share of the cores (see encoder_threads)
+            'x264_params': ''  # extra -x264-params, e.g. "rc-lookahead=20:ref=2"
+        }
+        for preset in self.presets.values():
+            preset.update(self.preset_defaults)
+        self.builtin_presets = tuple(self.presets)
         self.current_preset = 'medium'
+        self.settings = {
+            'ffmpeg_path': 'ffmpeg',
+            'ffprobe_path': 'ffprobe',
+            'rtmp_base': 'rtmp://a.rtmp.youtube.com/live2',
+            'cache_dir': 'cache',
+            'cache_max_mb': 20480,
+            'cpu_budget': 0,  # cores, 0 = all
+            'cores_per_720p30': 1.0,
+            'ramp_interval': 0.5,  # seconds between starts
+            'pin_cores': False,
+            'nice': 0,
+            'telemetry_samples': 120,  # ~1 minute of -progress blocks
+            'config_flush_interval': 1.0,  # seconds to coalesce config writes
+            'start_timeout': 30,  # seconds without progress before the first frame
+            'stall_timeout': 15,  # seconds without progress once streaming
+            'min_speed': 0.9,
+            'slow_timeout': 60,  # seconds below min_speed before a restart, 0 = off
+            'proc_sample_interval': 5,  # seconds between /proc samples for metrics
+            'relay_urls': True,  # pull each remote URL once and fan it out locally
+            'relay_linger': 10,  # seconds a relay outlives its last consumer
+            'relay_backoff_max': 30,
+            'uplink_kbps': 0,  # egress budget for all streams, 0 = unlimited
+            'congestion_speed': 0.95,  # encoder speed below this counts as congestion
+            'congestion_bitrate_ratio': 0.5,  # measured/target bitrate below this too
+            'downgrade_after': 20,  # seconds of congestion per step down the ladder
+            'upgrade_after': 300,  # seconds without congestion per step back up
+            'bandwidth_interval': 5,
+            'prewarm_window': 300,  # seconds before a scheduled start to prepare it
+            'log_tail_kb': 64,  # FFmpeg stderr kept in memory per stream
+            'log_to_file': False,  # also append it to log_dir/account-<id>.log
+            'log_dir': 'logs',
+            'log_file_max_kb': 1024,  # rotate an account's log file past this size
+            'log_file_backups': 3,
+            'stop_timeout': 5,  # seconds from a graceful stop to SIGKILL
+            'drain_timeout': 15,  # overall deadline for stop_all_streams
+            'pid_file': 'ffmpeg.pids',  # FFmpeg children, to clean up after a crash
+            'still_fps': 2,  # frame rate of still-image streams
+            'still_keyint': 4,  # seconds between their keyframes
+            'slide_seconds': 10,  # how long each image of a slideshow is shown
+            'agents': [],  # host:port of worker agents; when set, streams run on them, see NodeCoordinator
+            'agent_interval': 2,  # seconds between polls of each agent
+            'agent_timeout': 10,  # seconds without an answer before an agent's streams move
+            'node_name': '',  # name reported when running as an agent, default host:port
+            'account_store': 'json',  # 'sqlite' keeps accounts in account_db, one row each
+            'account_db': 'accounts.db',
+            'restart_policy': {
+                'backoff_base': 2,
+                'backoff_max': 300,
+                'jitter': 0.2,
+                'max_restarts': 10,
+                'restart_window': 600,
+                'circuit_reset': 900,
+                'stable_after': 60
+            }
+        }
+        # Persistent per-account fields added after the first release
+        self.account_defaults = {
+            'restart_policy': None,  # overrides for settings['restart_policy']
+            'shuffle': False,  # playlist sources only
+            'priority': 0,  # higher keeps its preset longer under congestion
+            'schedules': [],  # timed starts and stops, see ScheduleTimer
+            'mode': 'video',  # 'still' streams image over the audio of video_source
+            'image': ''  # still mode: image file, or a folder/glob of images for a slideshow
+        }
+
+        # Runtime fields live in memory only, everything else is persisted
+        self.runtime_fields = ('status', 'pid', 'start_time')
+        # Absolute, because the exit flush may run after the working directory changed
+        self.config_path = os.path.abspath('config.json')
+        self.config_lock = threading.RLock()
+        self.config_write_lock = threading.Lock()
+        self.config_dirty = threading.Event()
+        self.config_writer = None
+        self.config_writes = 0
+        self.store = None  # AccountStore when settings['account_store'] is 'sqlite'
+        self.dirty_accounts = set()  # ids whose rows the next flush writes or deletes
+        self.config_meta_dirty = False  # config.json itself needs writing (SQLite store only)
+        live_streamers.add(self)
+
         self.load_config()
-        self.status_refresh_rate = 5  # seconds
+        self.cache_dir = os.path.abspath(self.settings['cache_dir'])
+        self.status_refresh_rate = 1  # seconds between dashboard redraws
+
+        # Pre-encoded renditions of local files, pushed later with -c copy
+        self.cache_lock = threading.Lock()
+        self.cache_index = self.load_cache_index()
+        self.cache_index_dirty = False  # only last_used changed since the last save
+        self.cache_pending = set()
+        self.cache_queue = queue.Queue()
+        self.cache_thread = None
+
+        # ffprobe results for local files, keyed by path and checked against
+        # size and mtime, so unchanged files are never probed twice
+        self.probe_lock = threading.Lock()
+        self.probe_index = self.load_probe_index()
+        self.ffprobe_missing = False
+
+        # Directories, globs and m3u/txt lists play back to back through the
+        # concat demuxer in one FFmpeg process
+        self.media_extensions = ('.mp4', '.mkv', '.mov', '.flv', '.avi', '.webm', '.ts', '.m4v',
+                                 '.mp3', '.m4a', '.aac', '.wav')
+        self.playlist_extensions = ('.m3u', '.m3u8', '.txt')
+        self.image_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+        self.source_modes = ('video', 'still')
+
+        # One asyncio supervisor owns every FFmpeg child and admits streams
+        # against the CPU budget
+        self.active_states = ('queued', 'starting', 'streaming', 'restarting', 'stopping')
+        self.supervisor = StreamSupervisor(self)
+        self.schedule_timer = ScheduleTimer(self)
+        self.coordinator = NodeCoordinator(self)
+        # One-shot commands only read and edit the config (background=False)
+        if background:
+            if any(account['schedules'] for account in self.accounts.values()):
+                self.schedule_timer.reschedule()
+            self.coordinator.ensure_running()
+        self.node_name = self.settings['node_name'] or platform.node()
 
     def init_curses(self):
         """Initialize curses for status display"""
+        import curses
         self.stdscr = curses.initscr()
         curses.noecho()
         curses.cbreak()
@@ -34,6 +191,7 @@ class YouTubeMultiStreamer:
 
     def cleanup_curses(self):
         """Cleanup curses before exiting"""
+        import curses
         curses.nocbreak()
         self.stdscr.keypad(False)
         curses.echo()
@@ -61,36 +219,154 @@ class YouTubeMultiStreamer:
         ]
 
         if stdscr:
+            import curses
             for i, line in enumerate(banner):
                 stdscr.addstr(i, 0, line, curses.A_BOLD)
         else:
             print("\n".join(banner))
 
     def load_config(self):
-        """Load configuration from JSON file"""
+        """Load configuration from JSON file, and accounts from the SQLite store when enabled"""
         try:
-            with open('config.json', 'r') as f:
+            with open(self.config_path, 'r') as f:
                 config = json.load(f, object_pairs_hook=OrderedDict)
-                self.accounts = config.get('accounts', OrderedDict())
-                self.next_account_id = config.get('next_account_id', 1)
-                self.current_preset = config.get('current_preset', 'medium')
-                print("Configuration loaded successfully.")
         except (FileNotFoundError, json.JSONDecodeError):
+            config = None
+
+        if config is None:
             print("Creating new configuration file...")
-            self.save_config()
+            accounts = OrderedDict()
+        else:
+            # JSON object keys are strings, account ids are ints
+            accounts = OrderedDict(
+                (int(account_id), account)
+                for account_id, account in config.get('accounts', OrderedDict()).items()
+            )
+            self.next_account_id = config.get('next_account_id', 1)
+            self.current_preset = config.get('current_preset', 'medium')
+            self.settings.update(config.get('settings', {}))
+            for name, fields in config.get('presets', {}).items():
+                try:
+                    self.presets[name] = self.validate_preset(fields)
+                except (ValueError, TypeError) as e:
+                    print(f"Ignoring preset {name}: {str(e)}")
+
+        if self.settings['account_store'] == 'sqlite':
+            self.store = AccountStore(self.settings['account_db'])
+            if config is not None and 'accounts' in config:
+                # config.json loses its accounts on the next write, keep the original
+                shutil.copyfile(self.config_path, self.config_path + '.bak')
+            if self.store.count() == 0 and accounts:
+                print(f"Migrating {len(accounts)} accounts to {self.settings['account_db']}...")
+                self.dirty_accounts.update(accounts)
+            else:
+                accounts = self.store.load_accounts()
+                self.next_account_id = self.store.get_meta('next_account_id', self.next_account_id)
+            self.config_meta_dirty = config is None or 'accounts' in config
 
-    def save_config(self):
-        """Save configuration to JSON file"""
-        with open('config.json', 'w') as f:
-            json.dump({
-                'accounts': self.accounts,
-                'next_account_id': self.next_account_id,
-                'current_preset': self.current_preset
-            }, f, indent=4)
+        self.accounts = OrderedDict(
+            (account_id, self.reset_runtime_fields(account)) for account_id, account in accounts.items()
+        )
+        for account in self.accounts.values():
+            for key, value in self.account_defaults.items():
+                account.setdefault(key, value)
 
-    def add_account(self, stream_key, video_source='', label=''):
-        """Add new streaming account"""
+        if config is None or self.dirty_accounts or self.config_meta_dirty:
+            self.config_meta_dirty = True
+            self.flush_config()
+        else:
+            print("Configuration loaded successfully.")
+
+    def reset_runtime_fields(self, account):
+        """Give a loaded account its in-memory runtime state"""
+        account['status'] = 'stopped'
+        account['pid'] = None
+        account['start_time'] = None
+        return account
+
+    def persistent_fields(self, account):
+        """The part of an account that is saved, without runtime fields"""
+        return {key: value for key, value in account.items() if key not in self.runtime_fields}
+
+    def save_config(self, account_id=None):
+        """Schedule a coalesced background write of the configuration
+
+        With the SQLite store, passing account_id writes only that
+        account's row (or deletes it once removed) instead of config.json.
+        """
+        with self.config_lock:
+            self.accounts_version += 1
+            if account_id is None:
+                self.config_meta_dirty = True
+            else:
+                self.dirty_accounts.add(account_id)
+            self.config_dirty.set()
+            if self.config_writer is None:
+                self.config_writer = threading.Thread(target=self.config_writer_worker, daemon=True)
+                self.config_writer.start()
+
+    def config_writer_worker(self):
+        """Write the configuration once per flush interval while it is dirty"""
+        while True:
+            self.config_dirty.wait()
+            time.sleep(self.settings['config_flush_interval'])
+            try:
+                self.flush_config()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Error saving configuration: {str(e)}")
+
+    def flush_config(self):
+        """Write pending changes: changed account rows to the SQLite store,
+        config.json atomically (temp file + rename) when it changed"""
+        with self.config_lock:
+            self.config_dirty.clear()
+            dirty_accounts, self.dirty_accounts = self.dirty_accounts, set()
+            write_file, self.config_meta_dirty = self.store is None or self.config_meta_dirty, False
+            if self.store is not None:
+                changed = [self.persistent_fields(self.accounts[account_id])
+                           for account_id in sorted(dirty_accounts) if account_id in self.accounts]
+                removed = [account_id for account_id in dirty_accounts if account_id not in self.accounts]
+                next_account_id = self.next_account_id
+
+            data = None
+            if write_file:
+                config = OrderedDict()
+                if self.store is None:
+                    config['accounts'] = OrderedDict(
+                        (account_id, self.persistent_fields(account))
+                        for account_id, account in self.accounts.items()
+                    )
+                    config['next_account_id'] = self.next_account_id
+                config['current_preset'] = self.current_preset
+                config['presets'] = self.presets
+                config['settings'] = self.settings
+                data = json.dumps(config, indent=4)
+
+        with self.config_write_lock:
+            if self.store is not None and dirty_accounts:
+                self.store.write(changed, removed, {'next_account_id': next_account_id})
+                self.config_writes += 1
+            if data is not None:
+                temp_path = self.config_path + '.tmp'
+                with open(temp_path, 'w') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.config_path)
+                self.config_writes += 1
+
+    def flush_pending_config(self):
+        """Write outstanding changes before the process exits"""
+        if self.config_dirty.is_set():
+            self.flush_config()
+
+    def new_account(self, stream_key, video_source='', label='', **fields):
+        """Create an account in memory and mark it for saving, returning its id
+
+        The caller holds config_lock and calls save_config afterwards.
+        """
         account_id = self.next_account_id
+        self.accounts_version += 1
         self.accounts[account_id] = {
             'id': account_id,
             'stream_key': stream_key,
@@ -102,30 +378,53 @@ class YouTubeMultiStreamer:
             'start_time': None,
             'last_update': None
         }
+        self.accounts[account_id].update(json.loads(json.dumps(self.account_defaults)))
+        self.accounts[account_id].update(fields)
         self.next_account_id += 1
-        self.save_config()
+        self.dirty_accounts.add(account_id)
+        return account_id
+
+    def add_account(self, stream_key, video_source='', label=''):
+        """Add new streaming account"""
+        with self.config_lock:
+            account_id = self.new_account(stream_key, video_source, label)
+        self.save_config(account_id)
         return account_id
 
     def remove_account(self, account_id):
         """Remove streaming account"""
         if account_id in self.accounts:
-            if self.accounts[account_id]['status'] == 'streaming':
+            if self.accounts[account_id]['status'] in self.active_states:
                 self.stop_stream(account_id)
-            del self.accounts[account_id]
-            self.save_config()
+            with self.config_lock:
+                del self.accounts[account_id]
+            self.save_config(account_id)
             return True
         return False
 
     def update_account(self, account_id, **kwargs):
-        """Update account properties"""
-        if account_id in self.accounts:
+        """Update account properties
+
+        Runtime fields (status, pid, start_time) only change memory; the
+        config file is rewritten only when a persistent field changes.
+        """
+        with self.config_lock:
+            if account_id not in self.accounts:
+                return False
+            account = self.accounts[account_id]
+            persistent_change = False
             for key, value in kwargs.items():
-                if key in self.accounts[account_id]:
-                    self.accounts[account_id][key] = value
-            self.accounts[account_id]['last_update'] = datetime.now().isoformat()
-            self.save_config()
-            return True
-        return False
+                if key in account:
+                    if account[key] != value:
+                        self.accounts_version += 1
+                        persistent_change = persistent_change or key not in self.runtime_fields
+                    account[key] = value
+            account['last_update'] = datetime.now().isoformat()
+        if persistent_change:
+            self.save_config(account_id)
+        if 'schedules' in kwargs:
+            self.schedule_timer.reschedule()
+        return True
 
     def start_stream(self, account_id, loop=False):
         """Start streaming for an account"""
@@ -134,229 +433,3775 @@ class YouTubeMultiStreamer:
 
         account = self.accounts[account_id]
         
-        if account['status'] == 'streaming':
+        if account['status'] in self.active_states:
             return False
 
         if not account['video_source']:
             return False
 
-        ffmpeg_cmd = self.build_ffmpeg_command(
-            account['video_source'],
-            account['stream_key'],
-            account['preset']
+        if self.coordinator.enabled():
+            return self.coordinator.start([account_id], loop)
+
+        if not self.prepare_source(account):
+            return False
+
+        if loop or account['mode'] == 'still':
+            self.warm_cache([account_id])
+
+        def build_cmd(threads=None):
+            if account['mode'] == 'still':
+                return self.build_still_command(account['video_source'], account['image'], [account['stream_key']],
+                                                self.effective_preset(account_id), loop, threads)
+            return self.build_ffmpeg_command(
+                account['video_source'],
+                account['stream_key'],
+                self.effective_preset(account_id),
+                loop,
+                threads
+            )
+
+        return self.submit_stream(build_cmd, [account_id], loop)
+
+    def start_group(self, account_ids, loop=False):
+        """Start one shared process for accounts with the same source
+
+        Accounts on the same preset share one encode through the tee muxer;
+        several presets share one decode (see build_rendition_command).
+        """
+        account_ids = [
+            account_id for account_id in account_ids
+            if account_id in self.accounts
+            and self.accounts[account_id]['status'] not in self.active_states
+            and self.accounts[account_id]['video_source']
+        ]
+        if not account_ids:
+            return False
+        if self.coordinator.enabled():
+            return self.coordinator.start(account_ids, loop)
+        if len(account_ids) == 1:
+            return self.start_stream(account_ids[0], loop)
+
+        first = self.accounts[account_ids[0]]
+        if not self.prepare_source(first):
+            return False
+
+        outputs = self.group_outputs(account_ids)
+        if first['mode'] == 'still':
+            self.warm_cache(account_ids)
+            # The image is encoded once per preset anyway, so each preset is its own tee
+            return all([self.start_still_group(ids, loop) for ids in outputs.values()])
+        if loop and len(outputs) == 1:
+            self.warm_cache(account_ids[:1])
+        stream_keys = {account_id: self.accounts[account_id]['stream_key'] for account_id in account_ids}
+
+        def build_cmd(threads=None):
+            # Presets are read on every (re)start so bandwidth ladder steps apply
+            renditions = OrderedDict(
+                (preset_name, [stream_keys[account_id] for account_id in ids])
+                for preset_name, ids in self.group_outputs(account_ids).items()
+            )
+            if len(renditions) == 1:
+                preset_name, keys = next(iter(renditions.items()))
+                return self.build_tee_command(first['video_source'], keys, preset_name, loop, threads)
+            return self.build_rendition_command(first['video_source'], renditions, loop, threads)
+
+        return self.submit_stream(build_cmd, [account_id for ids in outputs.values() for account_id in ids], loop)
+
+    def start_still_group(self, account_ids, loop=False):
+        """Start one still-image process pushing to every account in account_ids"""
+        if len(account_ids) == 1:
+            return self.start_stream(account_ids[0], loop)
+        first = self.accounts[account_ids[0]]
+        stream_keys = [self.accounts[account_id]['stream_key'] for account_id in account_ids]
+
+        def build_cmd(threads=None):
+            return self.build_still_command(first['video_source'], first['image'], stream_keys,
+                                            self.still_group_preset(account_ids), loop, threads)
+
+        return self.submit_stream(build_cmd, account_ids, loop)
+
+    def still_group_preset(self, account_ids):
+        """The one preset a still-image process encodes at: the lowest effective rung of its accounts"""
+        return min((self.effective_preset(account_id) for account_id in account_ids), key=self.preset_kbps)
+
+    def group_outputs(self, account_ids):
+        """Accounts of one process by effective preset, in FFmpeg output order"""
+        outputs = OrderedDict()  # {preset: [account ids]}, one encode each
+        for account_id in account_ids:
+            outputs.setdefault(self.effective_preset(account_id), []).append(account_id)
+        return outputs
+
+    def effective_preset(self, account_id):
+        """Preset an account streams at: its own, or a lower rung under congestion"""
+        return self.preset_overrides.get(account_id) or self.accounts[account_id]['preset']
+
+    def preset_kbps(self, preset_name):
+        """Video plus audio bitrate of a preset in kbit/s"""
+        preset = self.presets.get(preset_name, self.presets['medium'])
+        return int(preset['video'].replace('k', '')) + int(preset['audio'].replace('k', ''))
+
+    def preset_ladder(self):
+        """Preset names from the lowest to the highest bitrate"""
+        return sorted(self.presets, key=self.preset_kbps)
+
+    def validate_preset(self, fields):
+        """Check a preset definition, returning a clean copy with defaults or raising ValueError"""
+        preset = {key: fields.get(key) for key in ('video', 'audio', 'scale', 'fps')}
+        for key, default in self.preset_defaults.items():
+            preset[key] = fields.get(key, default)
+        for key in ('video', 'audio'):
+            if not re.fullmatch(r'\d+k', str(preset.get(key, ''))):
+                raise ValueError(f"{key} must be a bitrate like 3000k")
+        if not re.fullmatch(r'\d+:\d+', str(preset.get('scale', ''))):
+            raise ValueError("scale must be WIDTH:HEIGHT")
+        preset['fps'] = int(preset.get('fps') or 0)
+        if not 1 <= preset['fps'] <= 120:
+            raise ValueError("fps must be between 1 and 120")
+        if preset['x264_preset'] not in ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast',
+                                         'medium', 'slow', 'slower', 'veryslow'):
+            raise ValueError(f"unknown x264 preset {preset['x264_preset']}")
+        preset['tune'] = preset['tune'] or None
+        if preset['tune'] not in (None, 'film', 'animation', 'grain', 'stillimage', 'fastdecode',
+                                  'zerolatency', 'psnr', 'ssim'):
+            raise ValueError(f"unknown x264 tune {preset['tune']}")
+        preset['keyint'] = float(preset['keyint'])
+        if not 0 < preset['keyint'] <= 10:
+            raise ValueError("keyint must be between 0 and 10 seconds")
+        preset['threads'] = int(preset['threads'])
+        if preset['threads'] < 0:
+            raise ValueError("threads must be 0 (automatic) or more")
+        preset['x264_params'] = preset['x264_params'] or ''
+        if not re.fullmatch(r'[\w.:=,/+-]*', preset['x264_params']):
+            raise ValueError("x264_params must look like key=value:key=value")
+        return preset
+
+    def validate_account_fields(self, fields):
+        """Check an account's priority, shuffle and restart_policy, returning a clean copy or raising ValueError"""
+        clean = dict(fields)
+        if 'priority' in clean:
+            priority = clean['priority']
+            if isinstance(priority, bool) or not isinstance(priority, int) or not -1000 <= priority <= 1000:
+                raise ValueError("priority must be a whole number from -1000 to 1000")
+        if 'shuffle' in clean and not isinstance(clean['shuffle'], bool):
+            raise ValueError("shuffle must be true or false")
+        policy = clean.get('restart_policy')
+        if policy is not None:
+            if not isinstance(policy, dict):
+                raise ValueError("restart_policy must be an object")
+            for key, value in policy.items():
+                if key not in self.settings['restart_policy']:
+                    raise ValueError(f"unknown restart_policy field {key}")
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                    raise ValueError(f"restart_policy.{key} must be a number, 0 or more")
+            if not isinstance(policy.get('max_restarts', 0), int):
+                raise ValueError("restart_policy.max_restarts must be a whole number")
+            if policy.get('jitter', 0) > 1:
+                raise ValueError("restart_policy.jitter must be between 0 and 1")
+            clean['restart_policy'] = dict(policy) or None
+        return clean
+
+    def set_preset(self, name, fields):
+        """Create or update a preset, merging fields into an existing one; raises ValueError"""
+        if not re.fullmatch(r'[\w-]{1,16}', name) or name == 'default':
+            raise ValueError("preset names are 1-16 letters, digits, _ or -")
+        preset = self.validate_preset(dict(self.presets.get(name, {}), **fields))
+        with self.config_lock:
+            self.presets[name] = preset
+        self.save_config()
+        return preset
+
+    def remove_preset(self, name):
+        """Delete a custom preset that no account uses; raises ValueError otherwise"""
+        if name not in self.presets:
+            raise ValueError(f"unknown preset {name}")
+        if name in self.builtin_presets:
+            raise ValueError(f"{name} is a built-in preset")
+        if name == self.current_preset:
+            raise ValueError(f"{name} is the default preset")
+        if self.find_accounts(preset=name):
+            raise ValueError(f"{name} is used by accounts")
+        with self.config_lock:
+            del self.presets[name]
+        self.save_config()
+
+    def stream_bandwidth(self, stream):
+        """Egress of one process in kbit/s; every tee output uploads its own copy"""
+        return sum(self.preset_kbps(self.effective_preset(account_id))
+                   for account_id in stream['accounts'] if account_id in self.accounts)
+
+    def submit_stream(self, build_cmd, account_ids, loop):
+        """Hand one FFmpeg process for the given accounts to the supervisor"""
+        stream = {
+            'id': next(self.stream_ids),
+            'accounts': list(account_ids),
+            'loop': loop,
+            'state': None,
+            'process': None,
+            'task': None,
+            'build_cmd': build_cmd,
+            'cost': self.group_cost(account_ids),
+            'admitted': False,
+            'cores': None,
+            'log': LogRing(self.settings['log_tail_kb'] * 1024)
+        }
+        for account_id in account_ids:
+            self.stream_processes[account_id] = stream
+            self.stream_stats[account_id] = {
+                'restarts': 0,
+                'first_frame_latency': None,
+                'output_error': None,
+                'last_error': None,
+                'log': stream['log']  # outlives the stream until the account starts again
+            }
+            self.stream_telemetry[account_id] = deque(maxlen=self.settings['telemetry_samples'])
+
+        return self.supervisor.submit(stream)
+
+    def group_cost(self, account_ids):
+        """Estimated CPU cores of one process for accounts sharing a source, one encode per preset"""
+        first = self.accounts[account_ids[0]]
+        if first['mode'] == 'still':
+            presets = [self.still_group_preset(account_ids)]  # One encode, see start_still_group
+        else:
+            presets = OrderedDict((self.effective_preset(account_id), True) for account_id in account_ids)
+        return round(sum(self.estimate_still_cost(first['image'], preset_name) if first['mode'] == 'still'
+                         else self.estimate_encode_cost(first['video_source'], preset_name)
+                         for preset_name in presets), 2)
+
+    def restart_policy(self, account_id):
+        """Restart policy for an account: global settings with account overrides"""
+        policy = dict(self.settings['restart_policy'])
+        policy.update(self.accounts.get(account_id, {}).get('restart_policy') or {})
+        return policy
+
+    def estimate_encode_cost(self, video_source, preset_name):
+        """Estimate CPU cores one realtime encode of a preset needs"""
+        if self.has_cached_rendition(video_source, preset_name):
+            return 0.05  # Stream copy only remuxes
+
+        info = None if self.is_playlist(video_source) else self.get_media_info(video_source)
+        plan = self.encode_plan(info, preset_name)
+        if plan == 'copy':
+            return 0.05
+        if plan == 'audio':
+            return 0.1
+
+        preset = self.presets.get(preset_name, self.presets['medium'])
+        width, height = (int(value) for value in preset['scale'].split(':'))
+        fps = preset['fps']
+        if info and info['height'] and info['height'] <= height and info['width'] <= width:
+            width, height = info['width'], info['height']
+        if info and info['fps']:
+            fps = min(fps, info['fps'])
+        pixel_rate = width * height * fps
+        return round(pixel_rate / (1280 * 720 * 30) * self.settings['cores_per_720p30'], 2)
+
+    def estimate_still_cost(self, image, preset_name):
+        """Estimate CPU cores of a still-image stream: audio encode plus the image at still_fps"""
+        if self.has_cached_still(image, preset_name):
+            return 0.1  # Looped clip is copied, only the audio is encoded
+        preset = self.presets.get(preset_name, self.presets['medium'])
+        width, height = (int(value) for value in preset['scale'].split(':'))
+        pixel_rate = width * height * self.settings['still_fps']
+        return round(0.1 + pixel_rate / (1280 * 720 * 30) * self.settings['cores_per_720p30'], 2)
+
+    def cpu_budget(self):
+        """Get the CPU budget in cores (0 in settings means every core)"""
+        return self.settings['cpu_budget'] or os.cpu_count() or 1
+
+    def parse_progress_block(self, block):
+        """Convert one -progress block into a telemetry sample"""
+        def number(value, suffix=''):
+            if value is None:
+                return None
+            try:
+                return float(value[:-len(suffix)] if suffix and value.endswith(suffix) else value)
+            except (TypeError, ValueError):
+                return None
+
+        return {
+            'time': time.time(),
+            'frame': int(number(block.get('frame')) or 0),
+            'fps': number(block.get('fps')),
+            'bitrate': number(block.get('bitrate'), 'kbits/s'),
+            'speed': number(block.get('speed'), 'x'),
+            'drop_frames': int(number(block.get('drop_frames')) or 0),
+            'dup_frames': int(number(block.get('dup_frames')) or 0),
+            'out_time': block.get('out_time', '')[:8] or None
+        }
+
+    def telemetry_summary(self, account_id):
+        """Latest encoder sample plus short trends over the ring buffer"""
+        samples = list(self.stream_telemetry.get(account_id, ()))
+        if not samples:
+            return {
+                'fps': None, 'bitrate': None, 'speed': None,
+                'drop_frames': 0, 'dup_frames': 0, 'out_time': None,
+                'speed_min': None, 'speed_trend': '', 'speed_spark': ''
+            }
+
+        latest = samples[-1]
+        speeds = [sample['speed'] for sample in samples if sample['speed'] is not None]
+        summary = {key: latest[key] for key in ('fps', 'bitrate', 'speed', 'drop_frames', 'dup_frames', 'out_time')}
+        summary['speed_min'] = min(speeds) if speeds else None
+        summary['speed_trend'] = self.trend_arrow(speeds)
+        summary['speed_spark'] = self.sparkline(speeds[-10:])
+        return summary
+
+    def trend_arrow(self, values):
+        """Compare the newest third of a series with the oldest third"""
+        if len(values) < 3:
+            return ''
+        third = len(values) // 3
+        old = sum(values[:third]) / third
+        new = sum(values[-third:]) / third
+        if new > old * 1.02:
+            return '↑'
+        if new < old * 0.98:
+            return '↓'
+        return '→'
+
+    def sparkline(self, values):
+        """Render values (speeds around 1.0x) as a tiny bar chart"""
+        bars = '▁▂▃▄▅▆▇█'
+        return ''.join(bars[max(0, min(len(bars) - 1, int(value * 4)))] for value in values)
+
+    def stop_stream(self, account_id, keep_siblings=True):
+        """Stop streaming for an account"""
+        if account_id not in self.accounts:
+            return False
+
+        stream = self.stream_processes.get(account_id)
+        if self.accounts[account_id]['status'] not in self.active_states:
+            return False
+        if stream is None:
+            # Started through the coordinator, running on an agent
+            return self.coordinator.enabled() and self.coordinator.stop([account_id])
+
+        return self.supervisor.call(self.supervisor.stop_account, stream, account_id, keep_siblings)
+
+    def load_probe_index(self):
+        """Load saved ffprobe results without re-probing anything"""
+        try:
+            with open(os.path.join(self.cache_dir, 'probe.json'), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_probe_index(self):
+        """Save ffprobe results (caller holds probe_lock)"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, 'probe.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.probe_index, f)
+        os.replace(path + '.tmp', path)
+
+    def get_media_info(self, video_source):
+        """Get stream metadata for a local file, probing it only when it changed"""
+        try:
+            stat = os.stat(video_source)
+        except (OSError, ValueError):
+            return None
+        path = os.path.abspath(video_source)
+
+        with self.probe_lock:
+            entry = self.probe_index.get(path)
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                return entry['info']
+
+        info = self.probe_media(video_source)
+        if info is False:
+            return None  # ffprobe itself is unavailable, try again next run
+        with self.probe_lock:
+            self.probe_index[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'info': info}
+            try:
+                self.save_probe_index()
+            except OSError as e:
+                print(f"Error saving probe cache: {str(e)}")
+        return info
+
+    def probe_media(self, video_source):
+        """Run ffprobe on a file: metadata dict, None if unreadable, False without ffprobe"""
+        if self.ffprobe_missing:
+            return False
+        try:
+            result = subprocess.run(
+                [self.settings['ffprobe_path'], '-v', 'error', '-print_format', 'json',
+                 '-show_streams', '-show_format', video_source],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                timeout=30
+            )
+        except FileNotFoundError:
+            self.ffprobe_missing = True
+            return False
+        except subprocess.TimeoutExpired:
+            return False
+        if result.returncode != 0:
+            return None
+
+        try:
+            probe = json.loads(result.stdout)
+        except ValueError:
+            return None
+        video = next((s for s in probe.get('streams', []) if s.get('codec_type') == 'video'), None)
+        audio = next((s for s in probe.get('streams', []) if s.get('codec_type') == 'audio'), None)
+
+        def rate(value):
+            try:
+                num, _, den = (value or '').partition('/')
+                return round(float(num) / float(den or 1), 3)
+            except (ValueError, ZeroDivisionError):
+                return None
+
+        def integer(value):
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
+
+        return {
+            'video_codec': video.get('codec_name') if video else None,
+            'pix_fmt': video.get('pix_fmt') if video else None,
+            'width': integer(video.get('width')) if video else None,
+            'height': integer(video.get('height')) if video else None,
+            'fps': (rate(video.get('avg_frame_rate')) or rate(video.get('r_frame_rate'))) if video else None,
+            'video_bitrate': integer(video.get('bit_rate')) if video else None,
+            'audio_codec': audio.get('codec_name') if audio else None,
+            'bitrate': integer(probe.get('format', {}).get('bit_rate')),
+            'duration': rate(probe.get('format', {}).get('duration'))
+        }
+
+    def encode_plan(self, info, preset_name):
+        """Choose 'copy', 'audio' (re-encode audio only) or 'transcode' for a source
+
+        Video is copied when it is already H.264 4:2:0 no larger, faster or
+        heavier than the preset asks for; anything else is transcoded.
+        """
+        if not info or not info['video_codec']:
+            return 'transcode'
+        preset = self.presets.get(preset_name, self.presets['medium'])
+        width, height = (int(value) for value in preset['scale'].split(':'))
+        video_kbits = int(preset['video'].replace('k', ''))
+        bitrate = info['video_bitrate'] or info['bitrate']
+
+        if (info['video_codec'] != 'h264' or info['pix_fmt'] not in ('yuv420p', 'yuvj420p')
+                or not info['width'] or info['width'] > width or info['height'] > height
+                or not info['fps'] or info['fps'] > preset['fps'] + 0.5
+                or (bitrate and bitrate > video_kbits * 1000 * 1.5)):
+            return 'transcode'
+        if info['audio_codec'] in ('aac', None):
+            return 'copy'
+        return 'audio'
+
+    def output_scale(self, preset_name, info=None):
+        """Scale filter size for a preset, or None when the source already fits"""
+        preset = self.presets.get(preset_name, self.presets['medium'])
+        width, height = (int(value) for value in preset['scale'].split(':'))
+        if info and info['height'] and info['height'] <= height and info['width'] <= width:
+            return None  # Keep the source resolution rather than upscaling
+        return preset['scale']
+
+    def build_encode_settings(self, preset_name, info=None, scale_filter=True, threads=None):
+        """Build FFmpeg encoder arguments for a preset, never scaling a source up
+
+        scale_filter=False leaves scaling to a -filter_complex branch.
+        threads is the encoder's share of the cores, unless the preset
+        fixes its own thread count.
+        """
+        preset = self.presets.get(preset_name, self.presets['medium'])
+        audio = ['-c:a', 'aac', '-b:a', preset['audio'], '-ar', '44100']
+
+        plan = self.encode_plan(info, preset_name)
+        if plan == 'copy':
+            return ['-c', 'copy']
+        if plan == 'audio':
+            return ['-c:v', 'copy'] + audio
+
+        fps = preset['fps']
+        scale = self.output_scale(preset_name, info)
+        video_filter = ['-vf', f"scale={scale}"] if scale and scale_filter else []
+        if info and info['fps'] and info['fps'] < fps:
+            fps = max(1, round(info['fps']))  # Duplicated frames only cost bitrate
+
+        video = ['-c:v', 'libx264', '-preset', preset['x264_preset']]
+        if preset['tune']:
+            video += ['-tune', preset['tune']]
+        threads = preset['threads'] or threads
+        if threads:
+            video += ['-threads', str(threads)]
+        if preset['x264_params']:
+            video += ['-x264-params', preset['x264_params']]
+
+        return video + [
+            '-b:v', preset['video'], '-maxrate', preset['video'],
+            '-bufsize', f"{int(preset['video'].replace('k', '')) * 2}k",
+        ] + video_filter + [
+            '-g', str(max(1, round(fps * preset['keyint']))), '-r', str(fps)
+        ] + audio
+
+    def build_input_args(self, video_source, loop=False, input_path=None):
+        """Build FFmpeg input arguments; input_path replaces the source (cached renditions)"""
+        base_cmd = [self.settings['ffmpeg_path'], '-nostats', '-progress', 'pipe:1']
+        return base_cmd + self.source_input_args(video_source, loop, input_path)
+
+    def source_input_args(self, video_source, loop=False, input_path=None):
+        """Realtime (-re) input options and -i for one source"""
+        if self.is_playlist(video_source):
+            # The list is flat and re-read on restart, see reload_playlist
+            loop_args = ['-stream_loop', '-1'] if loop else []
+            return ['-re'] + loop_args + ['-f', 'concat', '-safe', '0', '-i', self.playlist_path(video_source)]
+
+        relay = self.supervisor.relay_address(video_source) if self.is_remote(video_source) else None
+        if relay:
+            return ['-re', '-f', 'mpegts', '-i', relay]
+
+        # A file loops inside one process with continuous timestamps
+        if loop and os.path.isfile(video_source):
+            return ['-re', '-stream_loop', '-1', '-i', input_path or video_source]
+        return ['-re', '-i', input_path or video_source]
+
+    def is_remote(self, video_source):
+        """Check whether a source is a network URL rather than a local file"""
+        return '://' in video_source and not video_source.startswith('file:')
+
+    def relay_source(self, video_source):
+        """URL a source should be read from through the ingest relay, or None"""
+        if self.settings['relay_urls'] and self.is_remote(video_source):
+            return video_source
+        return None
+
+    def source_info(self, video_source):
+        """Media info for a single-file source, None for playlists and URLs"""
+        return None if self.is_playlist(video_source) else self.get_media_info(video_source)
+
+    def build_source_args(self, video_source, preset_name, loop=False, threads=None):
+        """Build input and codec arguments, using a cached rendition when available"""
+        if not self.is_playlist(video_source):
+            cached = self.get_cached_rendition(video_source, preset_name)
+            if cached:
+                return self.build_input_args(video_source, loop, cached), ['-c', 'copy']
+
+        info = self.source_info(video_source)
+        return (self.build_input_args(video_source, loop),
+                self.build_encode_settings(preset_name, info, threads=threads))
+
+    def build_ffmpeg_command(self, video_source, stream_key, preset_name, loop=False, threads=None):
+        """Build FFmpeg command (argument list) based on preset"""
+        base_cmd, video_settings = self.build_source_args(video_source, preset_name, loop, threads)
+        
+        output = ['-f', 'flv', self.rtmp_url(stream_key)]
+        
+        return base_cmd + video_settings + output
+
+    def build_tee_command(self, video_source, stream_keys, preset_name, loop=False, threads=None):
+        """Build one FFmpeg command that encodes once and pushes to several stream keys"""
+        base_cmd, video_settings = self.build_source_args(video_source, preset_name, loop, threads)
+
+        output = ['-map', '0:v', '-map', '0:a?'] + self.tee_output(stream_keys)
+
+        return base_cmd + video_settings + output
+
+    def build_rendition_command(self, video_source, renditions, loop=False, threads=None):
+        """Build one FFmpeg command that decodes once and encodes each preset once
+
+        renditions maps preset name -> stream keys. Presets that need a
+        transcode get a branch of one split filter; presets the source
+        already satisfies are stream-copied from the input. The encoders
+        split threads between them.
+        """
+        cmd = self.build_input_args(video_source, loop)
+        info = self.source_info(video_source)
+        branches = [preset_name for preset_name in renditions
+                    if self.encode_plan(info, preset_name) == 'transcode']
+
+        if branches:
+            graph = [f"[0:v]split={len(branches)}" + ''.join(f"[s{i}]" for i in range(len(branches)))]
+            for i, preset_name in enumerate(branches):
+                scale = self.output_scale(preset_name, info)
+                graph.append(f"[s{i}]{'scale=' + scale if scale else 'null'}[v{i}]")
+            cmd += ['-filter_complex', ';'.join(graph)]
+
+        branch_threads = max(1, threads // len(branches)) if threads and branches else None
+        for preset_name, stream_keys in renditions.items():
+            video = f"[v{branches.index(preset_name)}]" if preset_name in branches else '0:v'
+            cmd += (['-map', video, '-map', '0:a?']
+                    + self.build_encode_settings(preset_name, info, scale_filter=False, threads=branch_threads)
+                    + self.tee_output(stream_keys))
+        return cmd
+
+    def build_still_command(self, video_source, image, stream_keys, preset_name, loop=False, threads=None):
+        """Build a command streaming a still image (or slideshow) over the audio of video_source
+
+        A pre-encoded clip of the image loops with stream copy, so only the
+        audio is encoded. Until the clip is in the cache the image is
+        encoded live at still_fps, which is still a fraction of a video encode.
+        """
+        preset = self.presets.get(preset_name, self.presets['medium'])
+        cmd = [self.settings['ffmpeg_path'], '-nostats', '-progress', 'pipe:1']
+        clip = self.get_cached_still(image, preset_name)
+        if clip:
+            cmd += ['-re', '-stream_loop', '-1', '-i', clip]
+            video = ['-c:v', 'copy']
+        else:
+            cmd += ['-re'] + self.still_input_args(image)
+            video = self.build_still_settings(preset_name, preset['threads'] or threads or 1)
+        cmd += self.source_input_args(video_source, loop)
+
+        info = None if self.is_remote(video_source) else self.source_info(video_source)
+        if info and info['audio_codec'] == 'aac':
+            audio = ['-c:a', 'copy']
+        else:
+            audio = ['-c:a', 'aac', '-b:a', preset['audio'], '-ar', '44100']
+
+        # The image loops forever, so the audio decides when the stream ends
+        cmd += ['-map', '0:v', '-map', '1:a'] + video + audio + ['-shortest']
+        if len(stream_keys) == 1:
+            return cmd + ['-f', 'flv', self.rtmp_url(stream_keys[0])]
+        return cmd + self.tee_output(stream_keys)
+
+    def build_still_settings(self, preset_name, threads=None):
+        """x264 arguments for a still image: low frame rate, fixed GOP, letterboxed to the preset size"""
+        preset = self.presets.get(preset_name, self.presets['medium'])
+        width, height = preset['scale'].split(':')
+        fps = self.settings['still_fps']
+        gop = str(max(1, round(fps * self.settings['still_keyint'])))
+        video = ['-c:v', 'libx264', '-preset', preset['x264_preset'], '-tune', 'stillimage']
+        if threads:
+            video += ['-threads', str(threads)]
+        return video + [
+            '-b:v', preset['video'], '-maxrate', preset['video'],
+            '-bufsize', f"{int(preset['video'].replace('k', '')) * 2}k",
+            '-vf', (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                    f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,format=yuv420p"),
+            '-g', gop, '-keyint_min', gop, '-sc_threshold', '0', '-r', str(fps)
+        ]
+
+    def still_input_args(self, image):
+        """Input options and -i reading an image, or a looping slideshow of several"""
+        images = self.resolve_images(image)
+        if len(images) == 1:
+            return ['-loop', '1', '-framerate', str(self.settings['still_fps']), '-i', images[0]]
+        return ['-stream_loop', '-1', '-f', 'concat', '-safe', '0', '-i', self.write_slideshow(image, images)]
+
+    def resolve_images(self, image):
+        """List the image files of a still source: one file, or a directory or glob in name order"""
+        if not image:
+            return []
+        if os.path.isfile(image):
+            return [os.path.abspath(image)]  # Even when its name looks like a glob, e.g. "cover [1].png"
+        if os.path.isdir(image):
+            paths = [os.path.join(image, name) for name in sorted(os.listdir(image))]
+        elif any(char in image for char in '*?['):
+            paths = sorted(glob.glob(image))
+        else:
+            return []
+        return [os.path.abspath(path) for path in paths
+                if path.lower().endswith(self.image_extensions) and os.path.isfile(path)]
+
+    def write_slideshow(self, image, images):
+        """Write the concat list showing each image for slide_seconds, returning its path"""
+        name = hashlib.sha1(os.path.abspath(image).encode('utf-8')).hexdigest()[:16]
+        path = os.path.abspath(os.path.join(self.cache_dir, 'playlists', f"{name}.slides.ffconcat"))
+        lines = ['ffconcat version 1.0']
+        for item in images:
+            lines += ["file '" + item.replace("'", "'\\''") + "'", f"duration {self.settings['slide_seconds']}"]
+        # The concat demuxer ignores the duration of the last entry
+        lines.append("file '" + images[-1].replace("'", "'\\''") + "'")
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(path + '.tmp', path)
+        return path
+
+    def tee_output(self, stream_keys):
+        """Output arguments pushing one encode to several stream keys"""
+        # onfail=ignore keeps the other outputs alive when one ingest drops
+        outputs = "|".join(
+            f"[f=flv:onfail=ignore]{self.rtmp_url(stream_key)}" for stream_key in stream_keys
         )
+        return ['-flags', '+global_header', '-f', 'tee', outputs]
 
-        def stream_worker(cmd, acc_id, loop_flag):
-            while True:
-                try:
-                    # Start FFmpeg in background
-                    if platform.system() == "Windows":
-                        startupinfo = subprocess.STARTUPINFO()
-                        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                        process = subprocess.Popen(
-                            cmd, 
-                            shell=True,
-                            stdout=subprocess.DEVNULL,
-                            stderr=subprocess.DEVNULL,
-                            startupinfo=startupinfo
-                        )
-                    else:
-                        process = subprocess.Popen(
-                            cmd, 
-                            shell=True,
-                            stdout=subprocess.DEVNULL,
-                            stderr=subprocess.DEVNULL,
-                            preexec_fn=os.setsid
-                        )
+    def rtmp_url(self, stream_key):
+        """Get YouTube ingest URL for a stream key"""
+        return f"{self.settings['rtmp_base']}/{stream_key}"
+
+    def group_accounts(self, account_ids):
+        """Group accounts by video source so each group needs one decode
+
+        Still-image accounts only group with others showing the same image.
+        """
+        groups = OrderedDict()
+        for account_id in account_ids:
+            account = self.accounts[account_id]
+            key = (account['video_source'], account['image'] if account['mode'] == 'still' else None)
+            groups.setdefault(key, []).append(account_id)
+        return groups
+
+    def start_all_streams(self, loop=False):
+        """Start all streams"""
+        pending = [
+            account_id for account_id in self.accounts
+            if self.accounts[account_id]['video_source']
+            and self.accounts[account_id]['status'] not in self.active_states
+        ]
+        for account_ids in self.group_accounts(pending).values():
+            self.start_group(account_ids, loop)
+
+    def stop_all_streams(self, timeout=None):
+        """Stop all streams at once, waiting up to drain_timeout seconds for them to exit
+
+        Returns True when every FFmpeg process has exited in time; the
+        rest were killed.
+        """
+        streams = OrderedDict(
+            (stream['id'], stream) for account_id, stream in list(self.stream_processes.items())
+            if self.accounts.get(account_id, {}).get('status') in self.active_states
+        )
+        if timeout is None:
+            timeout = self.settings['drain_timeout']
+        remote = [account_id for account_id, account in list(self.accounts.items())
+                  if account['status'] in self.active_states and account_id not in self.stream_processes]
+        if remote and self.coordinator.enabled():
+            self.coordinator.stop(remote, timeout)
+        return self.supervisor.drain(list(streams.values()), timeout)
+
+    def node_report(self):
+        """Capacity, load and stream statuses reported to a coordinator when running as an agent"""
+        def load():
+            # Queued streams count too, they run as soon as capacity frees up
+            waiting = list(self.supervisor.start_queue)
+            return (round(self.supervisor.cpu_in_use + sum(stream['cost'] for stream in waiting), 2),
+                    self.supervisor.egress_kbps() + sum(self.stream_bandwidth(stream) for stream in waiting))
+
+        used_cores, egress_kbps = self.supervisor.call(load)
+        return {
+            'name': self.node_name,
+            'cores': self.cpu_budget(),
+            'uplink_kbps': self.settings['uplink_kbps'],
+            'used_cores': used_cores,
+            'egress_kbps': egress_kbps,
+            'accounts': [self.get_stream_status(account_id) for account_id in list(self.accounts)]
+        }
+
+    def adopt_accounts(self, accounts, presets, loop=False):
+        """Take over accounts placed here by a coordinator and start them, returning their ids
+
+        Accounts keep the coordinator's ids and bring the presets they use.
+        Accounts already running here are left alone.
+        """
+        for name, fields in presets.items():
+            if self.presets.get(name) != fields:
+                self.set_preset(name, fields)
+
+        account_ids = []
+        with self.config_lock:
+            for fields in accounts:
+                account_id = int(fields['id'])
+                if self.accounts.get(account_id, {}).get('status') in self.active_states:
+                    continue
+                account = json.loads(json.dumps(self.account_defaults))
+                account.update({key: value for key, value in fields.items() if key not in self.runtime_fields})
+                # The coordinator keeps the schedules
+                account.update(id=account_id, schedules=[])
+                self.accounts[account_id] = self.reset_runtime_fields(account)
+                self.next_account_id = max(self.next_account_id, account_id + 1)
+                self.dirty_accounts.add(account_id)
+                account_ids.append(account_id)
+        self.save_config()
+
+        for group in self.group_accounts(account_ids).values():
+            self.start_group(group, loop)
+        return account_ids
+
+    def release_accounts(self, account_ids):
+        """Stop and forget accounts the coordinator stopped or moved to another agent"""
+        for account_id in account_ids:
+            stream = self.stream_processes.get(account_id)
+            if stream is not None:
+                # Siblings only get a new process when they are not released too
+                self.stop_stream(account_id, not set(stream['accounts']) <= set(account_ids))
+            with self.config_lock:
+                self.accounts.pop(account_id, None)
+            self.save_config(account_id)
+
+    def find_accounts(self, status=None, preset=None, label=None, video_source=None):
+        """Ids of accounts matching every given filter, in id order
+
+        label matches as a case-insensitive prefix. With the SQLite store
+        the persistent fields are looked up through its indexes; status is
+        runtime state and is always filtered in memory.
+        """
+        if self.store is not None and (preset is not None or label or video_source is not None):
+            if self.dirty_accounts:
+                self.flush_config()
+            account_ids = [account_id for account_id in self.store.query(preset, label, video_source)
+                           if account_id in self.accounts]
+        else:
+            account_ids = [
+                account_id for account_id, account in list(self.accounts.items())
+                if (preset is None or account['preset'] == preset)
+                and (not label or account['label'].lower().startswith(label.lower()))
+                and (video_source is None or account['video_source'] == video_source)
+            ]
+        if status is not None:
+            account_ids = [account_id for account_id in account_ids
+                           if self.accounts[account_id]['status'] == status]
+        return account_ids
+
+    def export_fields(self):
+        """Account fields written by export_accounts, in CSV column order"""
+        return ['id', 'stream_key', 'video_source', 'label', 'preset', 'last_update'] + list(self.account_defaults)
+
+    def export_accounts(self, path, account_ids=None):
+        """Write accounts to a .csv or .json file, returning how many were written
+
+        CSV cells of non-text fields (priority, schedules, ...) hold JSON.
+        """
+        with self.config_lock:
+            accounts = [self.persistent_fields(self.accounts[account_id])
+                        for account_id in (account_ids or list(self.accounts))
+                        if account_id in self.accounts]
+        if path.lower().endswith('.csv'):
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=self.export_fields(), extrasaction='ignore')
+                writer.writeheader()
+                for account in accounts:
+                    writer.writerow({key: '' if value is None else value if isinstance(value, str) else json.dumps(value)
+                                     for key, value in account.items()})
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(accounts, f, indent=4)
+        return len(accounts)
+
+    def import_accounts(self, path):
+        """Add every account in a .csv or .json file, returning the new ids
+
+        JSON is a list of account objects, or a config.json with an
+        "accounts" object. CSV has a header row of field names, as written
+        by export_accounts. Imported accounts always get new ids. The whole
+        file is validated before anything is added.
+        """
+        with open(path, newline='', encoding='utf-8') as f:
+            if path.lower().endswith('.csv'):
+                rows = list(csv.DictReader(f))
+            else:
+                rows = json.load(f)
+                if isinstance(rows, dict):
+                    rows = list(rows.get('accounts', {}).values())
+
+        accounts = []
+        for number, row in enumerate(rows, 1):
+            if not isinstance(row, dict) or not row.get('stream_key'):
+                raise ValueError(f"account {number}: stream_key is required")
+            account = {key: self.import_field(key, value) for key, value in row.items()
+                       if key in self.account_defaults and value not in ('', None)}
+            try:
+                account['schedules'] = [self.schedule_timer.normalize(entry)
+                                        for entry in account.get('schedules') or []]
+            except (TypeError, AttributeError, ValueError) as e:
+                raise ValueError(f"account {number}: invalid schedule: {e}")
+            preset = row.get('preset') or self.current_preset
+            if preset not in self.presets:
+                raise ValueError(f"account {number}: unknown preset {preset}")
+            if account.get('mode', 'video') not in self.source_modes:
+                raise ValueError(f"account {number}: unknown mode {account['mode']}")
+            try:
+                account = self.validate_account_fields(account)
+            except ValueError as e:
+                raise ValueError(f"account {number}: {e}")
+            accounts.append((row['stream_key'], row.get('video_source') or '', row.get('label') or '',
+                             dict(account, preset=preset)))
+
+        with self.config_lock:
+            account_ids = [self.new_account(stream_key, video_source, label, **fields)
+                           for stream_key, video_source, label, fields in accounts]
+        self.save_config()
+        if any(fields['schedules'] for _, _, _, fields in accounts):
+            self.schedule_timer.reschedule()
+        return account_ids
+
+    def import_field(self, key, value):
+        """Convert an imported value to the type of the account default"""
+        default = self.account_defaults[key]
+        if isinstance(value, str) and not isinstance(default, str):
+            if isinstance(default, bool) and value.lower() in ('y', 'yes', 'n', 'no'):
+                return value.lower() in ('y', 'yes')
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError:
+                raise ValueError(f"{key}: invalid value {value!r}")
+        if isinstance(default, bool):
+            return bool(value)
+        if isinstance(default, int):
+            return int(value)
+        return value
+
+    def is_playlist(self, video_source):
+        """Check whether a source is a directory, glob or m3u/txt list of media files"""
+        if not video_source or '://' in video_source:
+            return False
+        # An existing path is never a pattern, e.g. "My Stream [HD].mp4"
+        if os.path.isfile(video_source):
+            return video_source.lower().endswith(self.playlist_extensions)
+        return os.path.isdir(video_source) or any(char in video_source for char in '*?[')
+
+    def resolve_playlist(self, video_source):
+        """List the media files of a playlist source, in playlist order"""
+        if os.path.isdir(video_source):
+            paths = [os.path.join(video_source, name) for name in sorted(os.listdir(video_source))]
+        elif os.path.isfile(video_source):
+            base = os.path.dirname(os.path.abspath(video_source))
+            with open(video_source, 'r', encoding='utf-8-sig') as f:
+                lines = [line.strip() for line in f]
+            # Relative entries are relative to the list itself, as in players
+            return [line if '://' in line else os.path.join(base, line)
+                    for line in lines if line and not line.startswith('#')]
+        else:
+            paths = sorted(glob.glob(video_source))
+        return [os.path.abspath(path) for path in paths if path.lower().endswith(self.media_extensions)]
+
+    def validate_playlist(self, video_source):
+        """Probe every playlist item, returning ([(path, info)], [problems])
+
+        The concat demuxer needs the same streams in every file, so items
+        whose codecs differ from the first playable item are skipped.
+        """
+        items, problems = [], []
+        signature = None
+        for path in self.resolve_playlist(video_source):
+            if '://' in path or not os.path.isfile(path):
+                problems.append(f"{path}: not a local file")
+                continue
+            info = self.get_media_info(path)
+            if info is None and not self.ffprobe_missing:
+                problems.append(f"{path}: unreadable")
+                continue
+            if info:
+                item_signature = (info['video_codec'], info['audio_codec'])
+                if signature is None:
+                    signature = item_signature
+                elif item_signature != signature:
+                    problems.append(f"{path}: codecs differ from the first item")
+                    continue
+            items.append((path, info))
+        return items, problems
+
+    def playlist_path(self, video_source):
+        """Path of the concat list generated for a playlist source"""
+        name = hashlib.sha1(os.path.abspath(video_source).encode('utf-8')).hexdigest()[:16]
+        return os.path.abspath(os.path.join(self.cache_dir, 'playlists', f"{name}.ffconcat"))
+
+    def write_playlist(self, video_source, shuffle=False):
+        """Validate a playlist and write its concat list, returning the list path or None
+
+        The list is flat; a looping stream repeats it with -stream_loop.
+        The length of one pass is kept in playlist_durations (None when an
+        item's duration is unknown), see reload_playlist.
+        """
+        items, problems = self.validate_playlist(video_source)
+        for problem in problems:
+            print(f"Skipping playlist item {problem}")
+        if not items:
+            return None
+        if shuffle:
+            random.shuffle(items)
+
+        def quote(path):
+            return "'" + path.replace("'", "'\\''") + "'"
+
+        path = self.playlist_path(video_source)
+        lines = ['ffconcat version 1.0']
+        for item, info in items:
+            lines.append(f"file {quote(item)}")
+            if info and info.get('duration'):
+                lines.append(f"duration {info['duration']}")
+        durations = [info.get('duration') if info else None for _, info in items]
+        self.playlist_durations[path] = sum(durations) if all(durations) else None
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(path + '.tmp', path)
+        return path
+
+    def prepare_source(self, account):
+        """Write the concat list for a playlist source, False when nothing is playable"""
+        if account.get('mode') == 'still' and not self.resolve_images(account.get('image')):
+            print(f"No image found for {account.get('label') or account['id']}: {account.get('image')}")
+            return False
+        if not self.is_playlist(account['video_source']):
+            return True
+        return self.write_playlist(account['video_source'], account.get('shuffle', False)) is not None
+
+    def reload_playlist(self, account_id):
+        """Re-read an account's playlist; a running loop restarts on it after the current pass"""
+        account = self.accounts.get(account_id)
+        if not account or not self.is_playlist(account['video_source']):
+            return False
+        # The pass that is playing is one of the list being replaced
+        duration = self.playlist_durations.get(self.playlist_path(account['video_source']))
+        if not self.prepare_source(account):
+            return False
+        stream = self.stream_processes.get(account_id)
+        if stream and stream['loop'] and account['status'] in self.active_states:
+            self.supervisor.call(self.supervisor.restart_after_pass, stream, duration)
+        return True
+
+    def valid_stream_key(self, stream_key):
+        """Check the usual YouTube stream key shape, e.g. abcd-efgh-ijkl-mnop-qrst"""
+        return re.fullmatch(r"[A-Za-z0-9]{4}(-[A-Za-z0-9]{4}){3,4}", stream_key or '') is not None
+
+    def prewarm(self, account_id, loop=False):
+        """Do the slow parts of a start ahead of time, returning a list of problems
+
+        Checks the stream key format, probes the source (or validates and
+        writes a playlist) and queues pre-encoding for looping file sources.
+        Remote sources are pre-buffered by ScheduleTimer through the relay.
+        """
+        account = self.accounts.get(account_id)
+        if account is None:
+            return ['account removed']
+        problems = []
+        if not self.valid_stream_key(account['stream_key']):
+            problems.append('stream key format looks wrong')
+
+        if account['mode'] == 'still':
+            if not self.resolve_images(account['image']):
+                problems.append('no image found')
+            else:
+                self.warm_cache([account_id])
+
+        video_source = account['video_source']
+        if not video_source:
+            problems.append('no video source')
+        elif self.is_playlist(video_source):
+            if not self.prepare_source(account):
+                problems.append('playlist has no playable items')
+        elif not self.is_remote(video_source):
+            if not os.path.isfile(video_source):
+                problems.append('source file not found')
+            elif self.get_media_info(video_source) is None and not self.ffprobe_missing:
+                problems.append('source file not readable')
+            elif loop:
+                self.warm_cache([account_id])
+        return problems
+
+    def cache_key(self, video_source, preset_name):
+        """Get transcode cache key for a local file, or None for URLs, playlists and missing files"""
+        try:
+            stat = os.stat(video_source)
+        except (OSError, ValueError):
+            return None
+        if not os.path.isfile(video_source) or self.is_playlist(video_source):
+            return None
+
+        # Thread count does not change the output
+        preset = {key: value for key, value in self.presets.get(preset_name, self.presets['medium']).items()
+                  if key != 'threads'}
+        raw = json.dumps([
+            os.path.abspath(video_source), stat.st_mtime, stat.st_size, preset
+        ], sort_keys=True)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def still_key(self, image, preset_name):
+        """Get cache key of the looping clip for a still source, or None when it has no images"""
+        images = []
+        for path in self.resolve_images(image):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+            images.append([path, stat.st_mtime, stat.st_size])
+        if not images:
+            return None
+
+        preset = {key: value for key, value in self.presets.get(preset_name, self.presets['medium']).items()
+                  if key != 'threads'}
+        still = {key: self.settings[key] for key in ('still_fps', 'still_keyint', 'slide_seconds')}
+        raw = json.dumps(['still', images, preset, still], sort_keys=True)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def load_cache_index(self):
+        """Load transcode cache index from the cache directory"""
+        try:
+            with open(os.path.join(self.cache_dir, 'index.json'), 'r') as f:
+                index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        for entry in index.values():
+            # Renditions live in the cache directory; older indexes stored cwd-relative paths
+            entry['path'] = os.path.join(self.cache_dir, os.path.basename(entry['path']))
+        # Drop entries whose files were removed outside the tool
+        return {key: entry for key, entry in index.items() if os.path.isfile(entry['path'])}
+
+    def save_cache_index(self):
+        """Save transcode cache index (caller holds cache_lock)"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, 'index.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.cache_index, f, indent=4)
+        os.replace(path + '.tmp', path)
+        self.cache_index_dirty = False
+
+    def flush_cache_index(self):
+        """Write LRU times kept in memory since the last add or eviction"""
+        with self.cache_lock:
+            if self.cache_index_dirty:
+                self.save_cache_index()
+
+    def has_cached_rendition(self, video_source, preset_name):
+        """Check for a cached rendition without touching its LRU position"""
+        key = self.cache_key(video_source, preset_name)
+        with self.cache_lock:
+            return key is not None and key in self.cache_index
+
+    def has_cached_still(self, image, preset_name):
+        """Check for a cached still clip without touching its LRU position"""
+        key = self.still_key(image, preset_name)
+        with self.cache_lock:
+            return key is not None and key in self.cache_index
+
+    def get_cached_rendition(self, video_source, preset_name):
+        """Get path of a ready cached rendition and mark it as recently used"""
+        return self.get_cached_path(self.cache_key(video_source, preset_name))
+
+    def get_cached_still(self, image, preset_name):
+        """Get path of a ready still clip and mark it as recently used"""
+        return self.get_cached_path(self.still_key(image, preset_name))
+
+    def get_cached_path(self, key):
+        """Get path of a cache entry by key, dropping entries whose file is gone
+
+        The new last_used is only kept in memory; index.json is rewritten
+        when entries are added or evicted, and at exit (flush_cache_index).
+        """
+        if key is None:
+            return None
+
+        with self.cache_lock:
+            entry = self.cache_index.get(key)
+            if not entry:
+                return None
+            if not os.path.isfile(entry['path']):
+                del self.cache_index[key]
+                self.save_cache_index()
+                return None
+            entry['last_used'] = time.time()
+            self.cache_index_dirty = True
+            return entry['path']
+
+    def build_cache_command(self, video_source, preset_name, output_path):
+        """Build FFmpeg command that encodes a file once into a preset rendition"""
+        return (
+            [self.settings['ffmpeg_path'], '-y', '-i', video_source]
+            + self.build_encode_settings(preset_name, self.get_media_info(video_source))
+            + ['-f', 'flv', output_path]
+        )
+
+    def build_still_clip_command(self, image, preset_name, output_path):
+        """Build FFmpeg command encoding a still source once into a clip that loops seamlessly
+
+        One image needs a single GOP; a slideshow needs one full pass.
+        """
+        images = self.resolve_images(image)
+        if len(images) == 1:
+            source = ['-loop', '1', '-framerate', str(self.settings['still_fps']), '-i', images[0]]
+            duration = self.settings['still_keyint']
+        else:
+            source = ['-f', 'concat', '-safe', '0', '-i', self.write_slideshow(image, images)]
+            duration = len(images) * self.settings['slide_seconds']
+        return (
+            [self.settings['ffmpeg_path'], '-y'] + source
+            + self.build_still_settings(preset_name)
+            + ['-an', '-t', str(duration), '-f', 'flv', output_path]
+        )
+
+    def encode_to_cache(self, video_source, preset_name):
+        """Encode a local file into the transcode cache, returning the rendition path"""
+        key = self.cache_key(video_source, preset_name)
+        if key is None:
+            return None
+        return self.encode_cache_entry(key, os.path.abspath(video_source), preset_name,
+                                       lambda path: self.build_cache_command(video_source, preset_name, path))
+
+    def encode_still(self, image, preset_name):
+        """Encode the looping clip of a still source into the cache, returning its path"""
+        key = self.still_key(image, preset_name)
+        if key is None:
+            return None
+        return self.encode_cache_entry(key, os.path.abspath(image), preset_name,
+                                       lambda path: self.build_still_clip_command(image, preset_name, path))
+
+    def encode_cache_entry(self, key, source, preset_name, build_command):
+        """Run build_command(output_path) and add the result to the cache index"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        output_path = os.path.join(self.cache_dir, f"{key}.flv")
+        partial_path = output_path + '.part'
+        result = subprocess.run(
+            build_command(partial_path),
+            stdin=subprocess.DEVNULL,  # FFmpeg would otherwise read the menu's keystrokes
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        if result.returncode != 0 or not os.path.isfile(partial_path):
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return None
+        os.replace(partial_path, output_path)
+
+        with self.cache_lock:
+            now = time.time()
+            self.cache_index[key] = {
+                'source': source,
+                'preset': preset_name,
+                'path': output_path,
+                'size': os.path.getsize(output_path),
+                'created': now,
+                'last_used': now
+            }
+            self.evict_cache()
+            self.save_cache_index()
+        return output_path
+
+    def evict_cache(self):
+        """Remove least recently used renditions until the cache fits its size cap"""
+        limit = self.settings['cache_max_mb'] * 1024 * 1024
+        total = sum(entry['size'] for entry in self.cache_index.values())
+        for key, entry in sorted(self.cache_index.items(), key=lambda item: item[1]['last_used']):
+            if total <= limit:
+                break
+            try:
+                os.remove(entry['path'])
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue  # Still open by a stream on Windows
+            total -= entry['size']
+            del self.cache_index[key]
+
+    def warm_cache(self, account_ids=None):
+        """Queue background pre-encoding for local file sources and still images"""
+        queued = 0
+        for account_id in account_ids or list(self.accounts):
+            account = self.accounts.get(account_id)
+            if not account:
+                continue
+            if account['mode'] == 'still':
+                # Only the image is pre-encoded; the audio is cheap to encode live
+                key = self.still_key(account['image'], account['preset'])
+                job = (self.encode_still, account['image'])
+            else:
+                key = self.cache_key(account['video_source'], account['preset'])
+                job = (self.encode_to_cache, account['video_source'])
+                # Sources that are streamed as-is gain nothing from a rendition
+                if key is not None and self.encode_plan(
+                        self.get_media_info(account['video_source']), account['preset']) == 'copy':
+                    continue
+            if key is None:
+                continue
+            with self.cache_lock:
+                if key in self.cache_index or key in self.cache_pending:
+                    continue
+                self.cache_pending.add(key)
+            self.cache_queue.put((key,) + job + (account['preset'],))
+            queued += 1
+
+        if queued and (self.cache_thread is None or not self.cache_thread.is_alive()):
+            self.cache_thread = threading.Thread(target=self.cache_worker, daemon=True)
+            self.cache_thread.start()
+        return queued
+
+    def cache_worker(self):
+        """Encode queued renditions one at a time so live streams keep the CPU"""
+        while True:
+            try:
+                key, encode, source, preset_name = self.cache_queue.get(timeout=1)
+            except queue.Empty:
+                return
+            try:
+                encode(source, preset_name)
+            except Exception as e:
+                print(f"Error pre-encoding {source}: {str(e)}")
+            finally:
+                with self.cache_lock:
+                    self.cache_pending.discard(key)
+
+    def list_cache(self):
+        """List cached renditions, most recently used first"""
+        with self.cache_lock:
+            entries = [dict(entry, key=key) for key, entry in self.cache_index.items()]
+        return sorted(entries, key=lambda entry: entry['last_used'], reverse=True)
+
+    def purge_cache(self, key=None):
+        """Remove one cached rendition, or all of them when key is None"""
+        with self.cache_lock:
+            keys = [key] if key else list(self.cache_index)
+            removed = 0
+            for cache_key in keys:
+                entry = self.cache_index.pop(cache_key, None)
+                if not entry:
+                    continue
+                try:
+                    os.remove(entry['path'])
+                except OSError:
+                    pass
+                removed += 1
+            self.save_cache_index()
+        return removed
+
+    def get_stream_status(self, account_id):
+        """Get detailed status for a stream"""
+        if account_id not in self.accounts:
+            return None
+            
+        account = self.accounts[account_id]
+        stream = self.stream_processes.get(account_id, {})
+        status = {
+            'id': account_id,
+            'label': account.get('label', f"Account {account_id}"),
+            'status': account['status'],
+            'preset': account['preset'],
+            'active_preset': self.effective_preset(account_id),
+            'priority': account['priority'],
+            'video_source': account['video_source'],
+            'mode': account['mode'],
+            'image': account['image'],
+            'stream_key_short': account['stream_key'][:10] + '...' if len(account['stream_key']) > 10 else account['stream_key'],
+            'pid': account.get('pid'),
+            'loop': stream.get('loop'),
+            'shared_encode': next((len(output) for output in self.group_outputs(
+                                       self.supervisor.owned_accounts(stream)).values()
+                                   if account_id in output), 1) if stream else 1,
+            'shared_decode': len(stream.get('accounts', [account_id])),
+            'cpu_cost': stream.get('cost'),
+            'threads': stream.get('threads'),
+            'restarts': self.stream_stats.get(account_id, {}).get('restarts', 0),
+            'last_exit': self.stream_stats.get(account_id, {}).get('last_exit'),
+            'output_error': self.stream_stats.get(account_id, {}).get('output_error'),
+            'last_error': self.stream_stats.get(account_id, {}).get('last_error'),
+            'next_restart_in': self.next_restart_in(account_id),
+            'first_frame_latency': self.stream_stats.get(account_id, {}).get('first_frame_latency'),
+            'start_time': account.get('start_time'),
+            'uptime': self.calculate_uptime(account.get('start_time')),
+            'node': self.coordinator.node_name(account_id)
+        }
+        status.update(self.telemetry_summary(account_id))
+        remote = self.coordinator.remote_status.get(account_id)
+        if remote and account['status'] in self.active_states:
+            # Runtime details come from the agent running the stream
+            status.update({key: value for key, value in remote.items()
+                           if key not in self.coordinator.local_fields and key in status})
+        return status
+
+    def next_restart_in(self, account_id):
+        """Seconds until a restarting stream is retried, None otherwise"""
+        restart_at = self.stream_processes.get(account_id, {}).get('restart_at')
+        if not restart_at:
+            return None
+        return max(0, round(restart_at - time.time()))
+
+    def preset_column(self, status):
+        """Preset name, marked when stepped down and with the group size when the encode is shared"""
+        preset = status['active_preset']
+        if preset != status['preset']:
+            preset += '↓'
+        if status['shared_encode'] > 1:
+            return f"{preset} x{status['shared_encode']}"
+        return preset
+
+    def speed_column(self, status):
+        """Encoder speed with trend arrow, e.g. '0.97x↓'"""
+        if status['speed'] is None:
+            return '-'
+        return f"{status['speed']:.2f}x{status['speed_trend']}"
+
+    def uptime_seconds(self, start_time_iso):
+        """Seconds elapsed since start time"""
+        if not start_time_iso:
+            return 0
+        return int((datetime.now() - datetime.fromisoformat(start_time_iso)).total_seconds())
+
+    def calculate_uptime(self, start_time_iso):
+        """Calculate uptime from start time"""
+        if not start_time_iso:
+            return "00:00:00"
+            
+        hours, remainder = divmod(self.uptime_seconds(start_time_iso), 3600)
+        minutes, seconds = divmod(remainder, 60)
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+    def metrics_text(self):
+        """Render stream and host metrics in the Prometheus text format"""
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+        def labels(**values):
+            return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in values.items()) + '}'
+
+        metrics = {
+            'ytms_stream_state': ('gauge', "1 for the current state of each account's stream"),
+            'ytms_stream_uptime_seconds': ('gauge', "Seconds since the account's FFmpeg process started"),
+            'ytms_stream_restarts_total': ('counter', "Crash or watchdog restarts since the stream was started"),
+            'ytms_encoder_fps': ('gauge', "Encoder frames per second from -progress"),
+            'ytms_encoder_bitrate_kbps': ('gauge', "Output bitrate from -progress"),
+            'ytms_encoder_speed': ('gauge', "Encoding speed relative to realtime"),
+            'ytms_process_cpu_seconds_total': ('counter', "CPU time of the FFmpeg process tree feeding the account"),
+            'ytms_process_resident_memory_bytes': ('gauge', "RSS of the FFmpeg process tree feeding the account"),
+            'ytms_streams': ('gauge', "Accounts per stream state"),
+            'ytms_ffmpeg_processes': ('gauge', "Running FFmpeg processes"),
+            'ytms_host_ffmpeg_cpu_seconds_total': ('counter', "CPU time of all FFmpeg process trees"),
+            'ytms_host_ffmpeg_resident_memory_bytes': ('gauge', "RSS of all FFmpeg process trees"),
+            'ytms_host_cpu_budget_cores': ('gauge', "Cores the scheduler may hand out"),
+            'ytms_host_cpu_reserved_cores': ('gauge', "Cores reserved by admitted streams"),
+            'ytms_stream_preset_stepped_down': ('gauge', "1 while the account streams below its preset"),
+            'ytms_host_egress_kbps': ('gauge', "Summed preset bitrates of admitted streams"),
+            'ytms_host_uplink_budget_kbps': ('gauge', "Uplink budget, 0 when unlimited")
+        }
+        samples = {name: [] for name in metrics}
+        process_samples = self.supervisor.process_samples
+        states = dict.fromkeys(StreamSupervisor.transitions, 0)
+
+        for account_id, account in list(self.accounts.items()):
+            status = account['status']
+            states[status] = states.get(status, 0) + 1
+            stream = self.stream_processes.get(account_id)
+            base = dict(account=account_id, label=account.get('label', ''))
+            samples['ytms_stream_state'].append((labels(state=status, **base), 1))
+            samples['ytms_stream_uptime_seconds'].append((labels(**base), self.uptime_seconds(account.get('start_time'))))
+            samples['ytms_stream_restarts_total'].append(
+                (labels(**base), self.stream_stats.get(account_id, {}).get('restarts', 0)))
+            samples['ytms_stream_preset_stepped_down'].append(
+                (labels(**base), int(account_id in self.preset_overrides)))
+
+            telemetry = self.stream_telemetry.get(account_id)
+            if telemetry:
+                latest = telemetry[-1]
+                for name, key in (('ytms_encoder_fps', 'fps'), ('ytms_encoder_bitrate_kbps', 'bitrate'),
+                                  ('ytms_encoder_speed', 'speed')):
+                    if latest[key] is not None:
+                        samples[name].append((labels(**base), latest[key]))
+
+            usage = process_samples.get(stream['id']) if stream else None
+            if usage:
+                stream_labels = labels(stream=stream['id'], **base)
+                samples['ytms_process_cpu_seconds_total'].append((stream_labels, usage['cpu_seconds']))
+                samples['ytms_process_resident_memory_bytes'].append((stream_labels, usage['rss_bytes']))
+
+        for state, count in states.items():
+            samples['ytms_streams'].append((labels(state=state), count))
+        # Host totals count each process tree once, even when it feeds several accounts
+        samples['ytms_ffmpeg_processes'].append(('', len(process_samples)))
+        samples['ytms_host_ffmpeg_cpu_seconds_total'].append(
+            ('', round(sum(usage['cpu_seconds'] for usage in process_samples.values()), 2)))
+        samples['ytms_host_ffmpeg_resident_memory_bytes'].append(
+            ('', sum(usage['rss_bytes'] for usage in process_samples.values())))
+        samples['ytms_host_cpu_budget_cores'].append(('', self.cpu_budget()))
+        samples['ytms_host_cpu_reserved_cores'].append(('', round(self.supervisor.cpu_in_use, 2)))
+        samples['ytms_host_egress_kbps'].append(('', self.supervisor.egress_kbps()))
+        samples['ytms_host_uplink_budget_kbps'].append(('', self.settings['uplink_kbps']))
+
+        lines = []
+        for name, (metric_type, help_text) in metrics.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(f"{name}{label_text} {value}" for label_text, value in samples[name])
+        return '\n'.join(lines) + '\n'
+
+    def display_status_dashboard(self, stdscr):
+        """Display real-time streaming status dashboard"""
+        import curses
+        curses.curs_set(0)  # Hide cursor
+        curses.noecho()
+        curses.cbreak()
+        stdscr.keypad(True)
+        stdscr.timeout(200)  # getch() doubles as the refresh timer
+
+        view = self.new_dashboard_view()
+        last_render = 0
+        while True:
+            if view['dirty'] or time.time() - last_render >= self.status_refresh_rate:
+                self.render_dashboard(stdscr, view)
+                last_render = time.time()
+
+            key = stdscr.getch()
+            if key == -1:
+                continue
+            result = self.handle_dashboard_key(view, key)
+            if result:
+                return result
+
+    def new_dashboard_view(self):
+        """Initial dashboard view state: selection, scroll, sort and filters"""
+        return {
+            'selected': 0,
+            'top': 0,
+            'page': 1,
+            'sort': 'id',
+            'status_filter': None,
+            'preset_filter': None,
+            'loop': True,
+            'message': '',
+            'size': None,
+            'lines': {},  # {screen line: (text, attr)} as last drawn
+            'dirty': True,
+            'ids_key': None,  # (accounts version, sort, filters) account_ids was built for
+            'account_ids': []
+        }
+
+    def dashboard_account_ids(self, view):
+        """Account ids matching the view filters, in view sort order
+
+        The list is rebuilt only when an account or the view's sort or
+        filters changed, so an idle frame does not rescan every account.
+        """
+        key = (self.accounts_version, view['sort'], view['status_filter'], view['preset_filter'])
+        if view['ids_key'] == key:
+            return view['account_ids']
+        account_ids = self.find_accounts(status=view['status_filter'], preset=view['preset_filter'])
+        if view['sort'] != 'id':
+            account_ids.sort(key=lambda account_id: str(self.accounts[account_id].get(view['sort']) or ''))
+        view['ids_key'], view['account_ids'] = key, account_ids
+        return account_ids
+
+    def render_dashboard(self, stdscr, view):
+        """Draw the dashboard, writing only the screen lines that changed
+
+        Status is only computed for the rows on the visible page, so the
+        cost of a frame does not grow with the number of accounts.
+        """
+        import curses
+        height, width = stdscr.getmaxyx()
+        if view['size'] != (height, width):
+            stdscr.erase()
+            view['size'] = (height, width)
+            view['lines'] = {}
+            if height >= 20:
+                self.show_banner(stdscr)
+
+        header_line = 8 if height >= 20 else 0
+        first_row = header_line + 3
+        view['page'] = max(1, height - 3 - first_row)
+
+        account_ids = self.dashboard_account_ids(view)
+        view['selected'] = max(0, min(view['selected'], len(account_ids) - 1))
+        if view['selected'] < view['top']:
+            view['top'] = view['selected']
+        elif view['selected'] >= view['top'] + view['page']:
+            view['top'] = view['selected'] - view['page'] + 1
+        view['top'] = max(0, min(view['top'], len(account_ids) - view['page']))
+
+        nodes = self.coordinator.enabled()
+        lines = {
+            header_line: ("=" * 80, curses.A_NORMAL),
+            header_line + 1: (
+                "ID  Label              Preset    Status      Uptime    Speed       FPS   "
+                + ("Node         " if nodes else '') + "Video Source",
+                curses.A_BOLD),
+            header_line + 2: ("-" * 80, curses.A_NORMAL)
+        }
+
+        visible = account_ids[view['top']:view['top'] + view['page']]
+        for offset in range(view['page']):
+            if offset >= len(visible):
+                lines[first_row + offset] = ('', curses.A_NORMAL)
+                continue
+
+            status = self.get_stream_status(visible[offset])
+            fps = '-' if status['fps'] is None else f"{status['fps']:.0f}"
+            # A streaming account whose own output failed inside a shared process
+            state = 'degraded' if status['output_error'] and status['status'] == 'streaming' else status['status']
+            line_str = (
+                f"{status['id']:<4} "
+                f"{status['label'][:15].ljust(16)} "
+                f"{self.preset_column(status).ljust(9)} "
+                f"{state.ljust(11)} "
+                f"{status['uptime'].ljust(9)} "
+                f"{self.speed_column(status).ljust(11)} "
+                f"{fps.ljust(5)} "
+                + (f"{(status['node'] or '-')[:12].ljust(13)}" if nodes else '')
+                + f"{status['video_source'][:20]}"
+            )
+
+            # Highlight running streams, flag ones falling behind realtime
+            attr = curses.A_BOLD if status['status'] == 'streaming' else curses.A_NORMAL
+            if status['speed'] is not None and status['speed'] < 1.0:
+                attr |= curses.A_UNDERLINE
+            if view['top'] + offset == view['selected']:
+                attr |= curses.A_REVERSE
+            lines[first_row + offset] = (line_str, attr)
+
+        shown = f"{view['top'] + 1}-{view['top'] + len(visible)}" if visible else "0"
+        lines[height - 3] = ("=" * 80, curses.A_NORMAL)
+        lines[height - 2] = (
+            f"Sort: {view['sort']} | Status: {view['status_filter'] or 'all'} | "
+            f"Preset: {view['preset_filter'] or 'all'} | Loop: {'on' if view['loop'] else 'off'} | "
+            f"{shown} of {len(account_ids)}  {view['message']}",
+            curses.A_NORMAL)
+        lines[height - 1] = (
+            "q quit  m menu  arrows/PgUp/PgDn scroll  s start  x stop  l loop  o sort  f status  p preset",
+            curses.A_DIM)
+
+        for line_no, (text, attr) in lines.items():
+            if 0 <= line_no < height and view['lines'].get(line_no) != (text, attr):
+                stdscr.addstr(line_no, 0, text[:width - 1], attr)
+                stdscr.clrtoeol()
+                view['lines'][line_no] = (text, attr)
+
+        stdscr.refresh()
+        view['dirty'] = False
+
+    def handle_dashboard_key(self, view, key):
+        """Apply one dashboard key press, returning 'exit' or 'menu' to leave"""
+        import curses
+        view['dirty'] = True
+        if key == ord('q'):
+            return 'exit'
+        elif key == ord('m'):
+            return 'menu'
+        elif key in (curses.KEY_UP, ord('k')):
+            view['selected'] -= 1
+        elif key in (curses.KEY_DOWN, ord('j')):
+            view['selected'] += 1
+        elif key == curses.KEY_PPAGE:
+            view['selected'] -= view['page']
+        elif key == curses.KEY_NPAGE:
+            view['selected'] += view['page']
+        elif key == curses.KEY_HOME:
+            view['selected'] = 0
+        elif key == curses.KEY_END:
+            view['selected'] = len(self.accounts)
+        elif key == curses.KEY_RESIZE:
+            view['size'] = None
+        elif key == ord('o'):
+            view['sort'] = self.next_choice(['id', 'label', 'status', 'preset'], view['sort'])
+        elif key == ord('f'):
+            view['status_filter'] = self.next_choice([None, 'streaming', 'starting', 'restarting', 'queued', 'stopped', 'failed'], view['status_filter'])
+        elif key == ord('p'):
+            view['preset_filter'] = self.next_choice([None] + list(self.presets), view['preset_filter'])
+        elif key == ord('l'):
+            view['loop'] = not view['loop']
+        elif key in (ord('s'), ord('x')):
+            account_ids = self.dashboard_account_ids(view)
+            if 0 <= view['selected'] < len(account_ids):
+                account_id = account_ids[view['selected']]
+                if key == ord('s'):
+                    done = self.start_stream(account_id, view['loop'])
+                    view['message'] = f"Start {account_id}: {'ok' if done else 'failed'}"
+                else:
+                    done = self.stop_stream(account_id)
+                    view['message'] = f"Stop {account_id}: {'ok' if done else 'not running'}"
+        return None
+
+    def next_choice(self, choices, current):
+        """Cycle to the choice after current"""
+        index = choices.index(current) if current in choices else -1
+        return choices[(index + 1) % len(choices)]
+
+class StreamSupervisor:
+    """Owns every FFmpeg child from one asyncio event loop in one thread
+
+    Each running FFmpeg process is a stream dict shared by the accounts it
+    feeds. Stream state only changes on the loop thread, following
+    `transitions`, so a stop can never race with a looping restart.
+    """
+
+    transitions = {
+        'queued': ('starting', 'stopped'),
+        'starting': ('streaming', 'restarting', 'stopping', 'stopped', 'failed'),
+        'streaming': ('restarting', 'stopping', 'stopped', 'failed'),
+        'restarting': ('starting', 'stopping', 'stopped', 'failed'),
+        'stopping': ('stopped', 'failed'),
+        'stopped': (),
+        'failed': ()
+    }
+
+    # Checked in order against error lines with URLs removed, first match wins
+    exit_patterns = (
+        ('auth', re.compile(r'\b40[13] (?:unauthorized|forbidden)\b|\bhttp error 40[13]\b|'
+                            r'\bauthentication failed\b')),
+        ('input_missing', re.compile(r'no such file or directory|\b404 not found\b|\bhttp error 404\b|'
+                                     r'does not exist')),
+        ('network', re.compile(r'connection refused|connection reset|\btimed out\b|network is unreachable|'
+                               r'broken pipe|failed to resolve|\bi/o error\b|input/output error|end of file')),
+        ('encoder', re.compile(r'error initializing output stream|error while opening encoder|unknown encoder|'
+                               r'error while encoding|invalid argument|conversion failed'))
+    )
+
+    # Only lines like these report an error; FFmpeg's info output (bitrates,
+    # stream layouts, metadata) is never classified
+    error_line = re.compile(r'error|fail|refused|denied|forbidden|unauthorized|no such file|invalid|'
+                            r'timed out|broken pipe|unreachable|does not exist', re.IGNORECASE)
+
+    # Output URLs carry the stream key, whose characters must not match a pattern
+    url = re.compile(r'\b[a-z][a-z0-9+.-]*://\S*', re.IGNORECASE)
+
+    def __init__(self, streamer):
+        self.streamer = streamer
+        self.loop = None
+        self.thread = None
+        self.thread_lock = threading.Lock()
+        self.start_queue = deque()
+        self.running = {}  # {stream id: stream} with a live task
+        self.process_samples = {}  # {stream id: {'cpu_seconds', 'rss_bytes'}}
+        self.queue_event = None
+        self.cpu_in_use = 0.0
+        self.core_load = {}
+        self.relays = {}  # {url: IngestRelay}
+        self.children = set()  # pids of live FFmpeg children, mirrored to pid_file
+        self.escalations = {}  # {process: task that SIGKILLs it after stop_timeout}
+
+    def ensure_running(self):
+        """Start the supervisor thread and event loop on first use"""
+        with self.thread_lock:
+            if self.thread is not None:
+                return
+            self.reap_orphans()
+            atexit.register(self.shutdown)
+            self.loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            self.thread = threading.Thread(target=self.run, args=(ready,), daemon=True)
+            self.thread.start()
+            ready.wait()
+
+    def run(self, ready):
+        """Event loop thread body"""
+        asyncio.set_event_loop(self.loop)
+        self.install_child_watcher()
+        self.queue_event = asyncio.Event()
+        self.loop.create_task(self.scheduler())
+        self.loop.create_task(self.watchdog())
+        self.loop.create_task(self.sample_processes())
+        self.loop.create_task(self.bandwidth_governor())
+        self.loop.call_soon(ready.set)
+        self.loop.run_forever()
+
+    def install_child_watcher(self):
+        """Reap children through pidfds instead of one waiter thread per child
+
+        Python 3.12+ does this by itself; 3.8-3.11 default to a thread per
+        child process.
+        """
+        if sys.version_info >= (3, 12) or not hasattr(asyncio, 'PidfdChildWatcher'):
+            return
+        try:
+            os.close(os.pidfd_open(os.getpid()))
+        except (AttributeError, OSError):
+            return
+        watcher = asyncio.PidfdChildWatcher()
+        asyncio.set_child_watcher(watcher)
+        watcher.attach_loop(self.loop)
+
+    def call(self, callback, *args):
+        """Run callback on the loop thread and return its result"""
+        self.ensure_running()
+        if threading.current_thread() is self.thread:
+            return callback(*args)
+
+        done = threading.Event()
+        result = {}
+
+        def invoke():
+            try:
+                result['value'] = callback(*args)
+            except Exception as e:
+                result['error'] = e
+            done.set()
+
+        self.loop.call_soon_threadsafe(invoke)
+        done.wait()
+        if 'error' in result:
+            raise result['error']
+        return result['value']
+
+    def submit(self, stream):
+        """Queue a stream for admission"""
+        return self.call(self.enqueue, stream)
+
+    def stop(self, stream):
+        """Stop a queued or running stream"""
+        return self.call(self.request_stop, stream)
+
+    def stop_account(self, stream, account_id, keep_siblings=True):
+        """Stop the process feeding an account; siblings sharing it get a new process without it
+
+        Siblings are detached here on the loop thread, so the stop cannot
+        race with the stream's own state changes. Their new process is
+        prepared in the executor, since that may probe the source.
+        """
+        if self.streamer.stream_processes.get(account_id) is not stream:
+            return False  # Stopped meanwhile
+        remaining = [acc_id for acc_id in self.owned_accounts(stream) if acc_id != account_id]
+        if keep_siblings:
+            for acc_id in remaining:
+                del self.streamer.stream_processes[acc_id]
+                self.streamer.update_account(acc_id, status='stopped', pid=None, start_time=None)
+
+        stopped = self.request_stop(stream)
+        if remaining and keep_siblings:
+            asyncio.get_running_loop().create_task(self.restart_siblings(remaining, stream['loop']))
+        return stopped
+
+    async def restart_siblings(self, account_ids, loop):
+        await asyncio.get_running_loop().run_in_executor(None, self.streamer.start_group, account_ids, loop)
+
+    def restart_after_pass(self, stream, duration):
+        """Restart a looping playlist at the end of its current pass, so a rewritten list is read
+
+        -stream_loop repeats the list FFmpeg opened at launch; only a new
+        process reads the new one. Without a known pass length it restarts now.
+        The restart reconnects RTMP once; the session only survives list
+        changes if a separate pusher outlives the reader, which is not done.
+        """
+        process = stream['process']
+        if process is None or process.returncode is not None:
+            return False  # Not running, the next launch reads the new list anyway
+        if stream.get('reload_task'):
+            return True  # Already due at the end of this pass, and reads the newest list
+        delay = 0
+        if duration:
+            elapsed = time.time() - stream['launched']
+            delay = math.ceil(elapsed / duration) * duration - elapsed
+        stream['reload_task'] = asyncio.get_running_loop().create_task(self.reload_later(stream, process, delay))
+        return True
+
+    async def reload_later(self, stream, process, delay):
+        await asyncio.sleep(delay)
+        stream['reload_task'] = None
+        if stream['process'] is process and process.returncode is None:
+            stream['watchdog_kill'] = 'playlist_reload'
+            self.terminate(process)
+
+    def enqueue(self, stream):
+        self.set_state(stream, 'queued')
+        self.start_queue.append(stream)
+        self.queue_event.set()
+        return True
+
+    def set_state(self, stream, state, **fields):
+        """Move a stream to a new state and mirror it on every account it feeds"""
+        current = stream.get('state')
+        if current is not None and state not in self.transitions[current]:
+            return False
+        stream['state'] = state
+
+        for account_id in self.owned_accounts(stream):
+            if state in ('stopped', 'failed'):
+                del self.streamer.stream_processes[account_id]
+                self.streamer.preset_overrides.pop(account_id, None)
+                fields = dict(fields, pid=None, start_time=None)
+            self.streamer.update_account(account_id, status=state, **fields)
+        return True
+
+    def owned_accounts(self, stream):
+        """Accounts still fed by this stream (siblings may have moved on)"""
+        return [account_id for account_id in stream['accounts']
+                if self.streamer.stream_processes.get(account_id) is stream]
+
+    def request_stop(self, stream):
+        """Cancel a stream on the loop thread"""
+        state = stream.get('state')
+        if state == 'queued':
+            self.start_queue.remove(stream)
+            self.set_state(stream, 'stopped')
+            return True
+        if state not in ('starting', 'streaming', 'restarting'):
+            return False
+
+        self.set_state(stream, 'stopping')
+        if stream['process'] and stream['process'].returncode is None:
+            self.terminate(stream['process'], graceful=True)
+        elif stream['task']:
+            stream['task'].cancel()  # Waiting out a restart delay
+        return True
+
+    def terminate(self, process, graceful=False):
+        """Stop an FFmpeg process group, escalating to SIGKILL after stop_timeout
+
+        A graceful stop asks FFmpeg to quit ('q' on stdin, and SIGINT
+        outside Windows) so it finishes the FLV trailer; otherwise the
+        group gets SIGTERM.
+        """
+        try:
+            if graceful:
+                if process.stdin is not None and not process.stdin.is_closing():
+                    process.stdin.write(b'q')
+                    process.stdin.close()
+                if platform.system() != "Windows":
+                    os.killpg(process.pid, signal.SIGINT)
+            elif platform.system() == "Windows":
+                process.terminate()
+            else:
+                os.killpg(process.pid, signal.SIGTERM)
+        except (ProcessLookupError, ConnectionError):
+            pass
+        if process not in self.escalations:
+            self.escalations[process] = self.loop.create_task(self.escalate(process))
+
+    async def escalate(self, process):
+        """SIGKILL a process that is still running stop_timeout seconds after terminate()"""
+        try:
+            await asyncio.wait_for(process.wait(), self.streamer.settings['stop_timeout'])
+        except asyncio.TimeoutError:
+            self.kill(process)
+        finally:
+            self.escalations.pop(process, None)
+
+    def kill(self, process):
+        """SIGKILL the FFmpeg process group"""
+        try:
+            if platform.system() == "Windows":
+                process.kill()
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def drain(self, streams, timeout):
+        """Stop streams together, waiting up to timeout seconds for all of them
+
+        Called on the loop thread it only requests
+        the stops, since blocking there would stall the processes it is
+        waiting for; the stop_timeout escalation still applies.
+        """
+        if not streams:
+            return True
+        if threading.current_thread() is self.thread:
+            for stream in streams:
+                self.request_stop(stream)
+            return False
+        self.ensure_running()
+        return asyncio.run_coroutine_threadsafe(self.stop_streams(streams, timeout), self.loop).result()
+
+    async def stop_streams(self, streams, timeout):
+        """Request every stop at once, then SIGKILL whatever outlives the deadline"""
+        for stream in streams:
+            self.request_stop(stream)
+        tasks = [stream['task'] for stream in streams if stream['task'] and not stream['task'].done()]
+        if not tasks:
+            return True
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        if not pending:
+            return True
+        for stream in streams:
+            if stream['process'] is not None and stream['process'].returncode is None:
+                self.kill(stream['process'])
+        await asyncio.wait(pending, timeout=2)
+        return False
+
+    def shutdown(self):
+        """At interpreter exit: drain streams, close relays, forget the pid file"""
+        atexit.unregister(self.shutdown)
+        if self.thread is None or not self.thread.is_alive():
+            return
+        try:
+            self.drain(list(self.running.values()) + list(self.start_queue),
+                       self.streamer.settings['drain_timeout'])
+            asyncio.run_coroutine_threadsafe(self.close_relays(), self.loop).result()
+        except RuntimeError:
+            pass  # Loop already closed
+        if not self.children:
+            try:
+                os.remove(self.streamer.settings['pid_file'])
+            except OSError:
+                pass
+
+    async def close_relays(self):
+        """Close every relay, lingering or not, and wait for its puller to exit"""
+        relays = list(self.relays.values())
+        self.relays.clear()
+        for relay in relays:
+            await relay.close()
+        waits = [self.loop.create_task(relay.process.wait()) for relay in relays
+                 if relay.process is not None and relay.process.returncode is None]
+        if waits:
+            await asyncio.wait(waits, timeout=self.streamer.settings['stop_timeout'] + 1)
+
+    def track_child(self, pid, alive=True):
+        """Record a spawned or exited FFmpeg child in the pid file
+
+        The file names this process as the owner, so only the children of
+        a supervisor that is no longer running get reaped.
+        """
+        if alive:
+            self.children.add(pid)
+        else:
+            self.children.discard(pid)
+        path = self.streamer.settings['pid_file']
+        try:
+            with open(path + '.tmp', 'w') as f:
+                json.dump({'owner': os.getpid(), 'children': sorted(self.children)}, f)
+            os.replace(path + '.tmp', path)
+        except OSError:
+            pass
+
+    def reap_orphans(self):
+        """Kill FFmpeg children left behind by a supervisor that crashed
+
+        Only on POSIX, where a pid can be checked for liveness and its
+        command line compared without side effects.
+        """
+        path = self.streamer.settings['pid_file']
+        if platform.system() == "Windows":
+            return
+        try:
+            with open(path) as f:
+                recorded = json.load(f)
+            owner, children = recorded['owner'], recorded['children']
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        if owner != os.getpid():
+            try:
+                os.kill(owner, 0)
+                return  # The owner is still running, its children are not orphans
+            except ProcessLookupError:
+                pass
+            except OSError:
+                return  # Alive under another user
+
+        name = os.path.basename(self.streamer.settings['ffmpeg_path'])
+        for pid in children:
+            try:
+                with open(f"/proc/{pid}/cmdline", 'rb') as f:
+                    if name.encode() not in f.read():
+                        continue
+            except FileNotFoundError:
+                continue  # Gone already
+            except OSError:
+                pass  # No /proc (macOS), trust the record
+            try:
+                os.killpg(pid, signal.SIGKILL)
+                print(f"Killed orphaned FFmpeg process {pid}")
+            except OSError:
+                pass
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def next_admissible_stream(self):
+        """Pop the queue head if it fits in the CPU and uplink budgets"""
+        if not self.start_queue:
+            return None
+
+        stream = self.start_queue[0]
+        # A stream bigger than the whole budget still runs once the host is idle
+        if self.cpu_in_use and self.cpu_in_use + stream['cost'] > self.streamer.cpu_budget():
+            return None
+        uplink = self.streamer.settings['uplink_kbps']
+        egress = self.egress_kbps()
+        if uplink and egress and egress + self.streamer.stream_bandwidth(stream) > uplink:
+            return None
+
+        self.start_queue.popleft()
+        self.cpu_in_use += stream['cost']
+        stream['admitted'] = True
+        if self.streamer.settings['pin_cores']:
+            stream['cores'] = self.allocate_cores(stream['cost'])
+        return stream
+
+    def egress_kbps(self):
+        """Summed preset bitrates of every admitted stream"""
+        return sum(self.streamer.stream_bandwidth(stream) for stream in list(self.running.values()))
+
+    def allocate_cores(self, cost):
+        """Pick the least loaded cores for a stream"""
+        if not hasattr(os, 'sched_getaffinity'):
+            return None
+
+        cores = sorted(os.sched_getaffinity(0))
+        count = max(1, min(len(cores), math.ceil(cost)))
+        chosen = sorted(cores, key=lambda core: self.core_load.get(core, 0))[:count]
+        for core in chosen:
+            self.core_load[core] = self.core_load.get(core, 0) + 1
+        return chosen
+
+    def encoder_threads(self, stream):
+        """x264 threads for a stream: its share of the cores among running streams
+
+        Each admitted stream gets cores in proportion to its encode cost,
+        so an idle host gives one stream every core while a full one gives
+        each about its cost, instead of every encoder starting one thread
+        per core. Pinned streams use exactly their pinned cores.
+
+        The count is fixed when FFmpeg launches: x264 cannot change it in
+        a running encoder, and a restart just to rebalance would reconnect
+        RTMP. Streams pick up a new share on their next (re)start, so ones
+        started on an idle host keep their extra threads while it fills;
+        the OS shares the cores between them meanwhile.
+        """
+        if stream['cores']:
+            return len(stream['cores'])
+        cores = min(self.streamer.cpu_budget(), os.cpu_count() or 1)
+        demand = sum(running['cost'] for running in self.running.values()
+                     if running['admitted'] and running is not stream) + stream['cost']
+        return max(1, min(cores, math.ceil(stream['cost'] * cores / max(demand, 0.01))))
+
+    def release_cpu(self, stream):
+        """Return a finished stream's CPU share and cores"""
+        if not stream['admitted']:
+            return
+        stream['admitted'] = False
+        self.cpu_in_use = max(0.0, self.cpu_in_use - stream['cost'])
+        for core in stream['cores'] or []:
+            self.core_load[core] -= 1
+        self.queue_event.set()
+
+    async def scheduler(self):
+        """Launch queued streams one at a time while the CPU budget allows"""
+        while True:
+            stream = self.next_admissible_stream()
+            if stream is None:
+                self.queue_event.clear()
+                await self.queue_event.wait()
+                continue
+
+            self.set_state(stream, 'starting')
+            self.running[stream['id']] = stream
+            stream['task'] = self.loop.create_task(self.run_stream(stream))
+            # Also runs when the task is cancelled before its first step
+            stream['task'].add_done_callback(lambda task, stream=stream: self.finish_stream(stream))
+            # Stagger starts so encoders don't all probe and fill buffers at once
+            await asyncio.sleep(self.streamer.settings['ramp_interval'])
+
+    async def run_stream(self, stream):
+        """Run one admitted FFmpeg process, restarting it after crashes when looping
+
+        Looping file sources loop inside FFmpeg (-stream_loop -1), so the
+        process only exits on a crash or at the end of a live URL. Restarts
+        follow the account's restart policy; errors that a retry cannot fix
+        (bad stream key, missing input) fail the stream straight away. The
+        command is rebuilt on every restart so a looping stream switches to
+        the cached rendition as soon as it is ready.
+        """
+        settings = self.streamer.settings
+
+        def prepare_child():
+            os.setsid()
+            if stream['cores']:
+                os.sched_setaffinity(0, stream['cores'])
+            if settings['nice']:
+                os.nice(settings['nice'])
+
+        if settings['log_to_file']:
+            stream['log_files'] = [
+                RotatingLogFile(os.path.join(settings['log_dir'], f"account-{account_id}.log"),
+                                settings['log_file_max_kb'] * 1024, settings['log_file_backups'])
+                for account_id in stream['accounts']
+            ]
+
+        try:
+            source = self.streamer.relay_source(self.streamer.accounts[stream['accounts'][0]]['video_source'])
+            if source:
+                await self.acquire_relay(source)
+                stream['relay'] = source
+
+            while True:
+                launched = time.time()
+                try:
+                    stream['threads'] = self.encoder_threads(stream)
+                    # Building probes the source when it changed, off the loop
+                    cmd = await asyncio.get_running_loop().run_in_executor(
+                        None, stream['build_cmd'], stream['threads'])
+                    if platform.system() == "Windows":
+                        startupinfo = subprocess.STARTUPINFO()
+                        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+                        process = await asyncio.create_subprocess_exec(
+                            *cmd,
+                            stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE,
+                            startupinfo=startupinfo,
+                            creationflags=subprocess.BELOW_NORMAL_PRIORITY_CLASS if settings['nice'] > 0 else 0
+                        )
+                    else:
+                        process = await asyncio.create_subprocess_exec(
+                            *cmd,
+                            stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE,
+                            preexec_fn=prepare_child
+                        )
+                except OSError as e:
+                    self.record_exit(stream, None, 'spawn', str(e))
+                    stream['failed'] = True
+                    break
+
+                stream['process'] = process
+                stream['launched'] = launched
+                self.track_child(process.pid)
+                stream['last_progress'] = launched
+                stream['slow_since'] = None
+                stream['stderr_tail'] = deque(maxlen=50)
+                for account_id in self.owned_accounts(stream):
+                    self.streamer.stream_stats[account_id]['output_error'] = None
+
+                start_time = datetime.now().isoformat()
+                for account_id in self.owned_accounts(stream):
+                    self.streamer.update_account(account_id, pid=process.pid, start_time=start_time)
+                self.log_line(stream, f"--- {start_time} started FFmpeg, pid {process.pid} ---")
+
+                await asyncio.gather(
+                    self.read_progress(stream, process, launched),
+                    self.read_stderr(stream, process)
+                )
+                returncode = await process.wait()
+                stream['process'] = None
+                self.track_child(process.pid, alive=False)
+                self.log_line(stream, f"--- {datetime.now().isoformat()} FFmpeg exited with code {returncode} ---")
+
+                if stream['state'] == 'stopping':
+                    break
+
+                watchdog_reason = stream.pop('watchdog_kill', None)
+                if watchdog_reason in ('preset_change', 'playlist_reload'):
+                    # Planned restart on another ladder rung or a reloaded list, not a failure
+                    if self.set_state(stream, 'restarting', pid=None) and self.set_state(stream, 'starting'):
+                        continue
+                    break
+                reason, message = self.classify_exit(returncode, stream['stderr_tail'])
+                if watchdog_reason:
+                    reason, message = watchdog_reason, f"killed by watchdog ({watchdog_reason})"
+                self.record_exit(stream, returncode, reason, message)
+
+                # A watchdog kill restarts even non-looping streams, they were meant to be live
+                if not stream['loop'] and not watchdog_reason:
+                    break
+
+                delay = self.restart_delay(stream, reason, time.time() - launched)
+                if delay is None:
+                    stream['failed'] = True
+                    break
+
+                for account_id in self.owned_accounts(stream):
+                    self.streamer.stream_stats[account_id]['restarts'] += 1
+                stream['restart_at'] = time.time() + delay
+                self.set_state(stream, 'restarting', pid=None)
+                await asyncio.sleep(delay)
+                stream['restart_at'] = None
+                if not self.set_state(stream, 'starting'):
+                    break
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error in stream supervisor for accounts {stream['accounts']}: {str(e)}")
+            stream['failed'] = True
+
+    def classify_exit(self, returncode, stderr_lines):
+        """Classify why FFmpeg exited from its exit code and last stderr lines"""
+        if returncode == 0:
+            return 'ended', 'input ended'
+        if returncode is not None and returncode < 0:
+            return 'killed', f"killed by signal {-returncode}"
+
+        last_error = None
+        for line in reversed(stderr_lines):
+            reason = self.classify_line(line)
+            if reason and reason != 'unknown':
+                return reason, line
+            if reason and last_error is None:
+                last_error = line
+        return 'unknown', last_error or (stderr_lines[-1] if stderr_lines else f"exit code {returncode}")
+
+    def classify_line(self, line):
+        """Error class of one stderr line: None when it reports no error, 'unknown' when no class fits"""
+        text = self.url.sub('<url>', line)
+        if not self.error_line.search(text):
+            return None
+        lowered = text.lower()
+        for reason, pattern in self.exit_patterns:
+            if pattern.search(lowered):
+                return reason
+        return 'unknown'
+
+    def record_exit(self, stream, returncode, reason, message):
+        """Store the last exit of a stream on every account it feeds
+
+        Exits other than the input ending also become the last error.
+        """
+        last_exit = {
+            'time': datetime.now().isoformat(),
+            'code': returncode,
+            'reason': reason,
+            'message': message
+        }
+        for account_id in self.owned_accounts(stream):
+            self.streamer.stream_stats[account_id]['last_exit'] = last_exit
+            if reason != 'ended':
+                self.streamer.stream_stats[account_id]['last_error'] = last_exit
+
+    def restart_delay(self, stream, reason, ran_for):
+        """Seconds to wait before the next restart, or None to give up
+
+        Exponential backoff with jitter; a stream that ran for stable_after
+        seconds starts over at the base delay. More than max_restarts within
+        restart_window opens the circuit breaker for circuit_reset seconds
+        (or for good when circuit_reset is 0).
+        """
+        if reason in ('auth', 'input_missing', 'spawn'):
+            return None
+
+        policy = self.streamer.restart_policy(stream['accounts'][0])
+        now = time.time()
+        if ran_for >= policy['stable_after']:
+            stream['failures'] = 0
+        stream['failures'] = stream.get('failures', 0) + 1
+
+        history = stream.setdefault('restart_history', deque())
+        history.append(now)
+        while history and history[0] < now - policy['restart_window']:
+            history.popleft()
+        if len(history) > policy['max_restarts']:
+            if not policy['circuit_reset']:
+                return None
+            history.clear()
+            stream['failures'] = 0
+            return policy['circuit_reset']
+
+        delay = min(policy['backoff_max'], policy['backoff_base'] * 2 ** (stream['failures'] - 1))
+        return delay * random.uniform(1 - policy['jitter'], 1 + policy['jitter'])
+
+    async def watchdog(self):
+        """Kill streams whose output stalled or that stay below realtime"""
+        settings = self.streamer.settings
+        while True:
+            await asyncio.sleep(1)
+            now = time.time()
+            for stream in list(self.running.values()):
+                process = stream['process']
+                if process is None or process.returncode is not None or 'watchdog_kill' in stream:
+                    continue
+
+                reason = None
+                timeout = settings['start_timeout'] if stream['state'] == 'starting' else settings['stall_timeout']
+                if now - stream['last_progress'] > timeout:
+                    reason = 'stalled'
+                elif (settings['slow_timeout'] and stream['slow_since']
+                      and now - stream['slow_since'] > settings['slow_timeout']):
+                    reason = 'slow'
+                if reason:
+                    stream['watchdog_kill'] = reason
+                    self.terminate(process)
+
+    async def bandwidth_governor(self):
+        """Step accounts down the preset ladder under congestion, back up once it clears
+
+        Congestion is egress over uplink_kbps, a queued stream that does
+        not fit the uplink, an encoder below congestion_speed, or an output
+        well under its target bitrate. One
+        account moves one rung per downgrade_after seconds of congestion;
+        stepping back up needs upgrade_after seconds without any, so a
+        borderline link does not flap between presets.
+        """
+        settings = self.streamer.settings
+        congested_since = clear_since = None
+        while True:
+            await asyncio.sleep(settings['bandwidth_interval'])
+            now = time.time()
+            streams = [stream for stream in list(self.running.values())
+                       if stream['state'] == 'streaming' and stream['process'] is not None]
+            # congested() may probe a source, so it only reads state from the executor
+            try:
+                congested = await asyncio.get_running_loop().run_in_executor(None, self.congested, streams)
+            except RuntimeError:
+                return  # Executor already shut down at interpreter exit
+            if congested:
+                clear_since = None
+                congested_since = congested_since or now
+                if now - congested_since >= settings['downgrade_after'] and self.step_preset(streams, -1):
+                    congested_since = now
+            else:
+                congested_since = None
+                clear_since = clear_since or now
+                if now - clear_since >= settings['upgrade_after'] and self.step_preset(streams, 1):
+                    clear_since = now
+
+    def congested(self, streams):
+        """Check the uplink budget and the latest encoder sample of each stream"""
+        settings = self.streamer.settings
+        uplink = settings['uplink_kbps']
+        if uplink and self.egress_kbps() > uplink:
+            return True
+        # A queued stream waiting for uplink makes room by stepping others down
+        if (uplink and self.start_queue and not self.start_queue[0]['admitted']
+                and self.egress_kbps() + self.streamer.stream_bandwidth(self.start_queue[0]) > uplink):
+            return True
+        for stream in streams:
+            samples = self.streamer.stream_telemetry.get(stream['accounts'][0])
+            if not samples:
+                continue
+            sample = samples[-1]
+            if sample['speed'] is not None and sample['speed'] < settings['congestion_speed']:
+                return True
+            # -progress reports the first output, compare it with that output's preset
+            outputs = self.streamer.group_outputs(self.owned_accounts(stream))
+            if sample['bitrate'] and outputs:
+                target = self.streamer.preset_kbps(next(iter(outputs)))
+                video_source = self.streamer.accounts[stream['accounts'][0]]['video_source']
+                info = self.streamer.source_info(video_source)
+                if (self.streamer.encode_plan(info, next(iter(outputs))) == 'transcode'
+                        and sample['bitrate'] < target * settings['congestion_bitrate_ratio']):
+                    return True
+        return False
+
+    def step_preset(self, streams, direction):
+        """Move one account a rung down (-1) or up (1) the ladder and restart its process
+
+        Down picks the lowest priority account, heaviest bitrate first; up
+        picks the highest priority stepped-down account that still fits
+        the uplink budget.
+        """
+        streamer = self.streamer
+        ladder = streamer.preset_ladder()
+        candidates = []
+        for stream in streams:
+            for account_id in self.owned_accounts(stream):
+                current = streamer.effective_preset(account_id)
+                rung = ladder.index(current) if current in ladder else 0
+                if direction < 0 and rung > 0:
+                    candidates.append((account_id, stream, ladder[rung - 1]))
+                elif direction > 0 and account_id in streamer.preset_overrides and rung + 1 < len(ladder):
+                    candidates.append((account_id, stream, ladder[rung + 1]))
+        if not candidates:
+            return False
+
+        def priority(candidate):
+            account_id = candidate[0]
+            return (streamer.accounts[account_id]['priority'],
+                    -streamer.preset_kbps(streamer.effective_preset(account_id)), -account_id)
+
+        if direction < 0:
+            account_id, stream, preset_name = min(candidates, key=priority)
+        else:
+            uplink = streamer.settings['uplink_kbps']
+            fitting = [
+                candidate for candidate in candidates
+                if not uplink or self.egress_kbps() + streamer.preset_kbps(candidate[2])
+                - streamer.preset_kbps(streamer.effective_preset(candidate[0])) <= uplink
+            ]
+            if not fitting:
+                return False
+            account_id, stream, preset_name = max(fitting, key=priority)
+
+        # A still-image process has one encode for all its keys, so they move together
+        owned = self.owned_accounts(stream)
+        for target in owned if streamer.accounts[account_id]['mode'] == 'still' else [account_id]:
+            if preset_name == streamer.accounts[target]['preset']:
+                streamer.preset_overrides.pop(target, None)
+            else:
+                streamer.preset_overrides[target] = preset_name
+        cost = streamer.group_cost(owned)
+        if stream['admitted']:
+            self.cpu_in_use = max(0.0, self.cpu_in_use + cost - stream['cost'])
+        stream['cost'] = cost
+        if stream['process'] is not None and stream['process'].returncode is None:
+            stream['watchdog_kill'] = 'preset_change'
+            self.terminate(stream['process'])
+        self.queue_event.set()  # Freed uplink may admit a queued stream
+        return True
+
+    def finish_stream(self, stream):
+        """Release a stream's resources once its task is done"""
+        self.running.pop(stream['id'], None)
+        # Don't leave an orphan behind when the task died with FFmpeg still running
+        if stream['process'] is not None and stream['process'].returncode is None:
+            self.terminate(stream['process'])
+        stream['process'] = None
+        self.release_cpu(stream)
+        for log_file in stream.pop('log_files', []):
+            log_file.close()
+        if stream.get('relay'):
+            self.release_relay(stream.pop('relay'))
+        if stream.get('failed') and stream['state'] != 'stopping':
+            self.set_state(stream, 'failed')
+        else:
+            self.set_state(stream, 'stopped')
+
+    async def acquire_relay(self, url):
+        """Take a reference on the relay for url, starting its puller if needed"""
+        relay = self.relays.get(url)
+        if relay is None:
+            relay = self.relays[url] = IngestRelay(self, url)
+            relay.ready = self.loop.create_task(relay.start())
+        # A consumer arriving while the port opens waits for it instead of reading the URL itself
+        await asyncio.shield(relay.ready)
+        if relay.linger is not None:
+            relay.linger.cancel()
+            relay.linger = None
+        relay.refs += 1
+        return relay
+
+    def release_relay(self, url):
+        """Drop a reference; the last one closes the relay after relay_linger seconds"""
+        relay = self.relays.get(url)
+        if relay is None:
+            return
+        relay.refs -= 1
+        if relay.refs <= 0 and relay.linger is None:
+            # Lingering lets a restarting consumer reattach without a new pull
+            relay.linger = self.loop.call_later(self.streamer.settings['relay_linger'], self.close_relay, url)
+
+    def close_relay(self, url):
+        relay = self.relays.get(url)
+        if relay is not None and relay.refs <= 0:
+            del self.relays[url]
+            self.loop.create_task(relay.close())
+
+    def relay_address(self, url):
+        """Local address consumers read url from, None when it is not relayed"""
+        relay = self.relays.get(url)
+        return f"tcp://127.0.0.1:{relay.port}" if relay is not None and relay.port else None
+
+    def relay_status(self):
+        """Snapshot of every relay for the status API"""
+        return [relay.status() for relay in list(self.relays.values())]
+
+    async def sample_processes(self):
+        """Sample CPU time and RSS of every FFmpeg process tree on one timer"""
+        while True:
+            await asyncio.sleep(self.streamer.settings['proc_sample_interval'])
+            roots = {
+                stream['process'].pid: stream_id
+                for stream_id, stream in list(self.running.items())
+                if stream['process'] is not None and stream['process'].returncode is None
+            }
+            self.process_samples = self.read_process_trees(roots) if roots else {}
+
+    def read_process_trees(self, roots):
+        """Sum /proc CPU time and RSS per process tree in a single pass over /proc
+
+        roots maps a root pid to a stream id. Returns {stream id: usage};
+        empty where /proc is unavailable (Windows, macOS).
+        """
+        try:
+            pids = [name for name in os.listdir('/proc') if name.isdigit()]
+        except OSError:
+            return {}
+
+        clock_ticks = os.sysconf('SC_CLK_TCK')
+        page_size = os.sysconf('SC_PAGE_SIZE')
+        parents = {}
+        usage = {}
+        for pid in pids:
+            try:
+                with open(f"/proc/{pid}/stat", 'rb') as f:
+                    stat = f.read()
+            except OSError:
+                continue  # Exited while scanning
+            # The command name may contain spaces, fields start after its ')'
+            fields = stat[stat.rindex(b')') + 2:].split()
+            pid = int(pid)
+            parents[pid] = int(fields[1])
+            usage[pid] = (
+                (int(fields[11]) + int(fields[12])) / clock_ticks,
+                int(fields[21]) * page_size
+            )
+
+        samples = {}
+        for pid in usage:
+            # Walk up to a stream's root pid, if any
+            ancestor = pid
+            while ancestor not in roots and ancestor in parents and ancestor > 1:
+                ancestor = parents[ancestor]
+            if ancestor not in roots:
+                continue
+            sample = samples.setdefault(roots[ancestor], {'cpu_seconds': 0.0, 'rss_bytes': 0})
+            sample['cpu_seconds'] = round(sample['cpu_seconds'] + usage[pid][0], 2)
+            sample['rss_bytes'] += usage[pid][1]
+        return samples
+
+    async def read_stderr(self, stream, process):
+        """Feed FFmpeg's stderr into the stream log line by line
+
+        Reads chunks rather than lines, so a missing newline or a huge line
+        can neither stall the pipe nor grow memory past the cap below.
+        """
+        pending = b''
+        while True:
+            chunk = await process.stderr.read(65536)
+            if not chunk:
+                break
+            *lines, pending = re.split(rb'[\r\n]', pending + chunk)
+            if len(pending) > 4096:
+                lines.append(pending)
+                pending = b''
+            for line in lines:
+                self.handle_stderr_line(stream, line.decode('utf-8', 'replace').strip())
+        self.handle_stderr_line(stream, pending.decode('utf-8', 'replace').strip())
+
+    def handle_stderr_line(self, stream, line):
+        """Keep one stderr line and classify it if it reports an error"""
+        if not line:
+            return
+        stream['stderr_tail'].append(line)
+        self.log_line(stream, line)
+        if 'Slave' in line:
+            self.record_output_failure(stream, line)
+        reason = self.classify_line(line)
+        if reason:
+            last_error = {'time': datetime.now().isoformat(), 'code': None, 'reason': reason, 'message': line}
+            for account_id in self.owned_accounts(stream):
+                self.streamer.stream_stats[account_id]['last_error'] = last_error
+
+    def log_line(self, stream, line):
+        """Append a line to the stream's ring buffer and its account log files"""
+        stream['log'].append(line)
+        for log_file in stream.get('log_files', []):
+            try:
+                log_file.write(line)
+            except OSError:
+                pass  # A full disk must not take the stream down
+
+    def record_output_failure(self, stream, line):
+        """Pin a failed tee slave on its account; the other outputs keep streaming
+
+        Open errors name the slave URL. Write errors only give the slave
+        index, which is attributed when one output has a slave at that index.
+        """
+        account_id = None
+        owned = self.owned_accounts(stream)
+        if 'error opening' in line:
+            account_id = next((acc_id for acc_id in owned
+                               if self.streamer.rtmp_url(self.streamer.accounts[acc_id]['stream_key']) + "'" in line),
+                              None)
+        else:
+            match = re.search(r"Slave muxer #(\d+) failed", line)
+            if match:
+                index = int(match.group(1))
+                candidates = [output[index] for output in self.streamer.group_outputs(stream['accounts']).values()
+                              if len(output) > index]
+                if len(candidates) == 1:
+                    account_id = candidates[0]
+        if account_id in owned:
+            self.streamer.stream_stats[account_id]['output_error'] = line
+
+    async def read_progress(self, stream, process, launched):
+        """Parse FFmpeg -progress output into per-account telemetry samples
+
+        FFmpeg writes one key=value per line and closes each block with a
+        progress= line, roughly twice a second. The first block with a
+        frame marks the stream as live.
+        """
+        streamer = self.streamer
+        block = {}
+        while True:
+            line = await process.stdout.readline()
+            if not line:
+                break
+            key, _, value = line.decode('utf-8', 'replace').strip().partition('=')
+            if key != 'progress':
+                block[key] = value
+                continue
+
+            sample = streamer.parse_progress_block(block)
+            block = {}
+            stream['last_progress'] = sample['time']
+            if sample['speed'] is not None and sample['speed'] < streamer.settings['min_speed']:
+                stream['slow_since'] = stream['slow_since'] or sample['time']
+            else:
+                stream['slow_since'] = None
+            account_ids = self.owned_accounts(stream)
+            if sample['frame'] and stream['state'] == 'starting':
+                self.set_state(stream, 'streaming')
+                latency = round(time.time() - launched, 3)
+                for account_id in account_ids:
+                    streamer.stream_stats[account_id]['first_frame_latency'] = latency
+            for account_id in account_ids:
+                streamer.stream_telemetry[account_id].append(sample)
+
+class LogRing:
+    """The most recent lines of a log, capped at max_bytes in total"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lines = deque()
+        self.size = 0
+
+    def append(self, line):
+        """Add a line, dropping the oldest ones past the cap"""
+        self.lines.append(line)
+        self.size += len(line) + 1
+        while self.size > self.max_bytes and len(self.lines) > 1:
+            self.size -= len(self.lines.popleft()) + 1
+
+    def tail(self, count=None):
+        """The last count lines, or all of them"""
+        lines = list(self.lines)
+        return lines[-count:] if count else lines
+
+class RotatingLogFile:
+    """Append-only log file renamed to .1, .2, ... once it reaches max_bytes
+
+    The file is opened on the first write, so an unwritable log_dir only
+    costs the log and never the stream.
+    """
+
+    def __init__(self, path, max_bytes, backups):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file = None
+
+    def write(self, line):
+        """Append one line, rotating first when the file is full"""
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self.file = open(self.path, 'a', encoding='utf-8')
+        elif self.file.tell() >= self.max_bytes:
+            self.rotate()
+        self.file.write(line + '\n')
+        self.file.flush()
+
+    def rotate(self):
+        """Shift path.N-1 to path.N down to path itself, dropping the oldest"""
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        """Close the file if it was opened"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class IngestRelay:
+    """Pulls one remote URL once and serves it to local FFmpeg consumers
+
+    A puller FFmpeg remuxes the URL to MPEG-TS on stdout; every consumer
+    connected to the local TCP port gets the same bytes. MPEG-TS can be
+    joined at any point, so consumers come and go without touching the
+    pull, and a reconnecting puller does not drop the consumers. A
+    consumer that falls too far behind is disconnected instead of
+    holding the others back.
+    """
+
+    chunk_size = 65536
+    client_queue = 64  # chunks buffered per consumer before it is dropped
+
+    def __init__(self, supervisor, url):
+        self.supervisor = supervisor
+        self.url = url
+        self.refs = 0
+        self.linger = None
+        self.server = None
+        self.port = None
+        self.ready = None  # Task of start(), awaited by every consumer
+        self.clients = set()
+        self.process = None
+        self.task = None
+        self.reconnects = 0
+        self.bytes_in = 0
+        self.last_error = None
+
+    async def start(self):
+        """Open the local port and start pulling"""
+        self.server = await asyncio.start_server(self.handle_client, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.task = asyncio.get_running_loop().create_task(self.pull())
+
+    async def close(self):
+        """Stop the puller and disconnect every consumer"""
+        if self.task is not None:
+            self.task.cancel()
+        if self.process is not None and self.process.returncode is None:
+            self.supervisor.terminate(self.process)
+        self.server.close()
+        for queue_ in list(self.clients):
+            self.drop(queue_)
+
+    def build_pull_command(self):
+        """Remux the URL to MPEG-TS on stdout without re-encoding"""
+        cmd = [self.supervisor.streamer.settings['ffmpeg_path'], '-nostats', '-loglevel', 'error', '-re']
+        if self.url.startswith(('http://', 'https://')):
+            cmd += ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '30']
+        return cmd + ['-i', self.url, '-map', '0', '-c', 'copy', '-f', 'mpegts', 'pipe:1']
+
+    async def pull(self):
+        """Run the puller, reconnecting with backoff while the relay is open"""
+        delay = 1
+        while True:
+            launched = time.time()
+            try:
+                self.process = await asyncio.create_subprocess_exec(
+                    *self.build_pull_command(),
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    start_new_session=platform.system() != "Windows"
+                )
+            except OSError as e:
+                self.last_error = str(e)
+            else:
+                self.supervisor.track_child(self.process.pid)
+                stderr_task = asyncio.get_running_loop().create_task(self.process.stderr.read())
+                try:
+                    while True:
+                        chunk = await self.process.stdout.read(self.chunk_size)
+                        if not chunk:
+                            break
+                        self.bytes_in += len(chunk)
+                        self.broadcast(chunk)
+                finally:
+                    if self.process.returncode is None:
+                        self.supervisor.terminate(self.process)
+                await self.process.wait()
+                self.supervisor.track_child(self.process.pid, alive=False)
+                lines = (await stderr_task).decode('utf-8', 'replace').strip().splitlines()
+                self.last_error = lines[-1] if lines else f"puller exited with code {self.process.returncode}"
+
+            # Back off while the origin keeps failing, start over once it was up a while
+            if time.time() - launched > 60:
+                delay = 1
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.supervisor.streamer.settings['relay_backoff_max'])
+
+    def broadcast(self, chunk):
+        for queue_ in list(self.clients):
+            try:
+                queue_.put_nowait(chunk)
+            except asyncio.QueueFull:
+                self.drop(queue_)
+
+    def drop(self, queue_):
+        """Disconnect a consumer: its queue is replaced by a single end marker"""
+        self.clients.discard(queue_)
+        while not queue_.empty():
+            queue_.get_nowait()
+        queue_.put_nowait(None)
+
+    async def handle_client(self, reader, writer):
+        queue_ = asyncio.Queue(maxsize=self.client_queue)
+        self.clients.add(queue_)
+        try:
+            while True:
+                chunk = await queue_.get()
+                if chunk is None:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(queue_)
+            writer.close()
+
+    def status(self):
+        return {
+            'url': self.url,
+            'port': self.port,
+            'consumers': len(self.clients),
+            'references': self.refs,
+            'pulling': self.process is not None and self.process.returncode is None,
+            'reconnects': self.reconnects,
+            'bytes_in': self.bytes_in,
+            'last_error': self.last_error
+        }
+
+class ScheduleTimer:
+    """Runs per-account start and stop schedules from one heap of due times
+
+    Entries in account['schedules']:
+        {'action': 'start', 'at': '2026-10-20T18:00', 'loop': true}     one-shot, local time
+        {'action': 'stop', 'time': '22:30', 'days': [0, 1, 2, 3, 4]}   recurring, 0 = Monday, no days = daily
+
+    Every start gets a prepare event prewarm_window seconds earlier (see
+    YouTubeMultiStreamer.prewarm); remote sources are also pre-buffered by
+    holding their relay open until the start. The timer runs on the
+    supervisor loop, blocking work goes to the default executor.
+    """
+
+    def __init__(self, streamer):
+        self.streamer = streamer
+        self.heap = []  # (due time, seq, phase, account id, entry index, occurrence time)
+        self.seq = itertools.count()
+        self.task = None
+        self.wakeup = None
+        self.prebuffered = {}  # {(account id, entry index, occurrence time): relay url}
+        self.history = deque(maxlen=100)
+
+    def reschedule(self):
+        """Rebuild the heap after schedules changed, starting the timer if needed"""
+        self.streamer.supervisor.call(self.wake)
+
+    def wake(self):
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        self.wakeup.set()
+
+    def normalize(self, entry):
+        """Validate one schedule entry, returning a clean copy or raising ValueError"""
+        if entry.get('action') not in ('start', 'stop'):
+            raise ValueError("action must be 'start' or 'stop'")
+        clean = {'action': entry['action']}
+        if entry.get('at'):
+            at = datetime.fromisoformat(entry['at'])
+            if at.tzinfo is not None:
+                at = at.astimezone().replace(tzinfo=None)  # Schedules run on local time
+            clean['at'] = at.isoformat(timespec='minutes')
+        elif entry.get('time'):
+            hour, minute = (int(part) for part in entry['time'].split(':'))
+            if not (0 <= hour < 24 and 0 <= minute < 60):
+                raise ValueError(f"invalid time {entry['time']}")
+            clean['time'] = f"{hour:02d}:{minute:02d}"
+            days = sorted({int(day) for day in entry.get('days') or []})
+            if any(day < 0 or day > 6 for day in days):
+                raise ValueError("days are 0 (Monday) to 6 (Sunday)")
+            if days:
+                clean['days'] = days
+        else:
+            raise ValueError("either 'at' or 'time' is required")
+        if clean['action'] == 'start':
+            clean['loop'] = bool(entry.get('loop', True))
+        return clean
+
+    def next_occurrence(self, entry, after):
+        """Next datetime the entry is due strictly after `after`, None when it is over"""
+        if 'at' in entry:
+            at = datetime.fromisoformat(entry['at'])
+            return at if at > after else None
+        hour, minute = (int(part) for part in entry['time'].split(':'))
+        days = entry.get('days') or range(7)
+        for offset in range(8):
+            candidate = (after + timedelta(days=offset)).replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if candidate > after and candidate.weekday() in days:
+                return candidate
+        return None
+
+    def push(self, account_id, index, entry, after):
+        """Queue the next occurrence of an entry, plus its prepare event for starts"""
+        occurrence = self.next_occurrence(entry, after)
+        if occurrence is None:
+            return
+        due = occurrence.timestamp()
+        if entry['action'] == 'start':
+            prepare_at = max(time.time(), due - self.streamer.settings['prewarm_window'])
+            heapq.heappush(self.heap, (prepare_at, next(self.seq), 'prepare', account_id, index, due))
+        heapq.heappush(self.heap, (due, next(self.seq), 'fire', account_id, index, due))
+
+    def rebuild(self):
+        self.heap = []
+        now = datetime.now()
+        for account_id, account in list(self.streamer.accounts.items()):
+            for index, entry in enumerate(account['schedules']):
+                try:
+                    self.push(account_id, index, entry, now)
+                except (ValueError, TypeError, KeyError) as e:
+                    print(f"Skipping schedule {index} of account {account_id}: {str(e)}")
+        self.release_prebuffered()  # Starts that were edited away or removed
+
+    def pending(self, key):
+        """Check whether the start a relay was pre-buffered for is still queued"""
+        return any(phase == 'fire' and (account_id, index, occurrence) == key
+                   for _, _, phase, account_id, index, occurrence in self.heap)
+
+    def release_prebuffered(self):
+        """Drop pre-buffered relays whose start fired, expired or was cancelled"""
+        for key in [key for key in self.prebuffered if not self.pending(key)]:
+            self.streamer.supervisor.release_relay(self.prebuffered.pop(key))
+
+    def entry(self, account_id, index):
+        account = self.streamer.accounts.get(account_id)
+        if account is None or index >= len(account['schedules']):
+            return None
+        return account['schedules'][index]
+
+    async def run(self):
+        while True:
+            self.wakeup.clear()
+            self.rebuild()
+            while not self.wakeup.is_set():
+                timeout = max(0, self.heap[0][0] - time.time()) if self.heap else None
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                due = []
+                while self.heap and self.heap[0][0] <= time.time():
+                    due.append(heapq.heappop(self.heap))
+                if due:
+                    try:
+                        await self.dispatch(due)
+                    except Exception as e:
+                        # One bad event must not end every schedule
+                        print(f"Schedule error: {str(e)}")
+
+    async def dispatch(self, due):
+        """Run due events; starts and stops due together are handled as groups"""
+        loop = asyncio.get_running_loop()
+        starts = {}  # {account id: loop}
+        stops = []
+        for _, _, phase, account_id, index, occurrence in due:
+            entry = self.entry(account_id, index)
+            if entry is None:
+                continue
+            if phase == 'prepare':
+                task = loop.create_task(self.prepare(account_id, index, entry, occurrence))
+                task.add_done_callback(lambda task, account_id=account_id: self.prepared(task, account_id))
+                continue
+
+            if entry['action'] == 'start':
+                starts[account_id] = entry.get('loop', True)
+            else:
+                stops.append(account_id)
+            if 'time' in entry:
+                self.push(account_id, index, entry, datetime.fromtimestamp(occurrence))
+
+        for account_id in stops:
+            # Siblings only get a new process when they are not stopping too
+            stream = self.streamer.stream_processes.get(account_id)
+            keep_siblings = stream is not None and not set(stream['accounts']) <= set(stops)
+            if stream is not None:
+                await loop.run_in_executor(None, self.streamer.stop_stream, account_id, keep_siblings)
+            self.log(account_id, 'stop', 'stopped' if stream is not None else 'not running')
+
+        for looping in (True, False):
+            account_ids = [account_id for account_id, flag in starts.items() if flag is looping]
+            for group in self.streamer.group_accounts(account_ids).values():
+                started = await loop.run_in_executor(None, self.streamer.start_group, group, looping)
+                for account_id in group:
+                    self.log(account_id, 'start', 'started' if started else 'not started')
+        # The streams hold their own relay references by now, or the relays linger briefly
+        self.release_prebuffered()
+
+    async def prepare(self, account_id, index, entry, occurrence):
+        loop = asyncio.get_running_loop()
+        problems = await loop.run_in_executor(None, self.streamer.prewarm, account_id, entry.get('loop', True))
+        account = self.streamer.accounts.get(account_id)
+        source = self.streamer.relay_source(account['video_source']) if account else None
+        key = (account_id, index, occurrence)
+        if source and key not in self.prebuffered and self.pending(key):
+            await self.streamer.supervisor.acquire_relay(source)
+            if key in self.prebuffered:
+                self.streamer.supervisor.release_relay(source)  # A prepare queued by a rebuild got there first
+            else:
+                self.prebuffered[key] = source
+            self.release_prebuffered()  # The start may have fired while the relay opened
+        self.log(account_id, 'prepare', '; '.join(problems) or 'ready')
+
+    def prepared(self, task, account_id):
+        """Report a prepare task that raised, nothing else awaits them"""
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Schedule prepare for account {account_id} failed: {task.exception()}")
+            self.log(account_id, 'prepare', f"failed: {task.exception()}")
+
+    def log(self, account_id, event, result):
+        self.history.append({'time': datetime.now().isoformat(timespec='seconds'),
+                             'account': account_id, 'event': event, 'result': result})
+
+    def upcoming(self):
+        """Due events in time order, for the API and the menu"""
+        return [
+            {'time': datetime.fromtimestamp(due).isoformat(timespec='seconds'), 'account': account_id,
+             'event': phase if phase == 'prepare' else self.entry(account_id, index)['action']}
+            for due, _, phase, account_id, index, _ in sorted(self.heap)
+            if self.entry(account_id, index) is not None
+        ]
+
+class AccountStore:
+    """SQLite account table in WAL mode, for configs with thousands of accounts
+
+    Only changed rows are written, so one account update no longer
+    rewrites every account the way config.json does. Fields that are
+    queried (label, preset, video source) are indexed columns; every other
+    persistent field goes into the JSON data column, so new account fields
+    need no schema change. The schema version is PRAGMA user_version and
+    MIGRATIONS are applied in order when the store is opened.
+    """
+
+    COLUMNS = ('id', 'stream_key', 'video_source', 'label', 'preset', 'last_update')
+    MIGRATIONS = [
+        """
+        CREATE TABLE accounts (
+            id INTEGER PRIMARY KEY,
+            stream_key TEXT NOT NULL,
+            video_source TEXT NOT NULL DEFAULT '',
+            label TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+            preset TEXT NOT NULL,
+            last_update TEXT,
+            data TEXT NOT NULL DEFAULT '{}'
+        );
+        CREATE INDEX accounts_label ON accounts (label);
+        CREATE INDEX accounts_preset ON accounts (preset);
+        CREATE INDEX accounts_video_source ON accounts (video_source);
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """
+    ]
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # Autocommit, transactions are opened explicitly in write()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.migrate()
+
+    def migrate(self):
+        """Bring the schema up to the latest version"""
+        with self.lock:
+            version = self.db.execute('PRAGMA user_version').fetchone()[0]
+            if version > len(self.MIGRATIONS):
+                raise RuntimeError(f"{self.path} has schema version {version}, "
+                                   f"this version only knows {len(self.MIGRATIONS)}")
+            for number, script in enumerate(self.MIGRATIONS[version:], version + 1):
+                self.db.executescript(f"BEGIN; {script} PRAGMA user_version = {number}; COMMIT;")
+
+    def count(self):
+        """Number of stored accounts"""
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM accounts').fetchone()[0]
+
+    def load_accounts(self):
+        """Every stored account in id order"""
+        accounts = OrderedDict()
+        with self.lock:
+            rows = self.db.execute(f"SELECT {', '.join(self.COLUMNS)}, data FROM accounts ORDER BY id").fetchall()
+        for row in rows:
+            account = dict(zip(self.COLUMNS, row))
+            account.update(json.loads(row[-1]))
+            accounts[account['id']] = account
+        return accounts
+
+    def get_meta(self, key, default=None):
+        """A value stored with write(), or default"""
+        with self.lock:
+            row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def write(self, accounts, removed_ids=(), meta=None):
+        """Upsert accounts, delete removed ids and set meta values in one transaction"""
+        rows = [
+            tuple(account.get(column) for column in self.COLUMNS)
+            + (json.dumps({key: value for key, value in account.items() if key not in self.COLUMNS}),)
+            for account in accounts
+        ]
+        with self.lock:
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                self.db.executemany(
+                    f"INSERT OR REPLACE INTO accounts ({', '.join(self.COLUMNS)}, data) "
+                    f"VALUES ({', '.join('?' * (len(self.COLUMNS) + 1))})", rows)
+                self.db.executemany('DELETE FROM accounts WHERE id = ?', [(account_id,) for account_id in removed_ids])
+                self.db.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                    [(key, json.dumps(value)) for key, value in (meta or {}).items()])
+                self.db.execute('COMMIT')
+            except BaseException:
+                self.db.execute('ROLLBACK')
+                raise
+
+    def query(self, preset=None, label=None, video_source=None):
+        """Ids of accounts matching every given filter, label as a case-insensitive prefix"""
+        clauses, params = [], []
+        if preset is not None:
+            clauses.append('preset = ?')
+            params.append(preset)
+        if video_source is not None:
+            clauses.append('video_source = ?')
+            params.append(video_source)
+        if label:
+            clauses.append("label LIKE ? ESCAPE '\\'")
+            params.append(re.sub(r'([\\%_])', r'\\\1', label) + '%')
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self.lock:
+            return [row[0] for row in self.db.execute(f"SELECT id FROM accounts{where} ORDER BY id", params)]
+
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.db.close()
+
+class NodeCoordinator:
+    """Spreads streams over worker agents and moves them off agents that die
+
+    Agents are headless instances (`main.py agent`) listed in
+    settings['agents'] as host:port. One thread owns every placement:
+    each agent_interval it polls every agent's GET /node for its capacity
+    (cores, uplink) and load, copies the statuses of its streams onto the
+    local accounts, then starts waiting accounts. A group of accounts
+    sharing a source goes to the agent with the most headroom, so the
+    agent can still share one encode between them; when every agent is
+    full the least loaded one queues it. An agent silent for agent_timeout
+    seconds is dead and its accounts are placed on the others. Streams an
+    agent still runs for accounts that moved away are stopped when it comes
+    back.
+    """
+
+    # Status fields the coordinator knows better than the agent
+    local_fields = ('id', 'label', 'preset', 'priority', 'video_source', 'mode', 'image', 'stream_key_short',
+                    'status', 'start_time', 'uptime', 'node')
+
+    def __init__(self, streamer):
+        self.streamer = streamer
+        self.thread = None
+        self.thread_lock = threading.Lock()
+        self.commands = queue.Queue()  # ('start', ids, loop), ('stop', ids, done event) or ('remove', address)
+        self.nodes = {}  # {address: capacity and load from its last poll}
+        self.placements = {}  # {account id: address of the agent running it}
+        self.pending = OrderedDict()  # {account id: loop} waiting for an agent
+        self.loops = {}  # {account id: loop}, to restart moved accounts the same way
+        self.remote_status = {}  # {account id: status reported by its agent}
+        self.placed_at = {}  # {account id: time it was sent to its agent}
+        self.history = deque(maxlen=100)
+
+    def enabled(self):
+        """Whether streams run on agents rather than on this host"""
+        return bool(self.streamer.settings['agents'])
+
+    def ensure_running(self):
+        """Start the coordinator thread once agents are configured"""
+        with self.thread_lock:
+            if self.enabled() and (self.thread is None or not self.thread.is_alive()):
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def start(self, account_ids, loop=False):
+        """Queue accounts for placement on an agent"""
+        for account_id in account_ids:
+            self.streamer.update_account(account_id, status='queued')
+        self.ensure_running()
+        self.commands.put(('start', list(account_ids), loop))
+        return True
+
+    def stop(self, account_ids, timeout=None):
+        """Stop accounts on their agents; waits up to timeout seconds when given"""
+        for account_id in account_ids:
+            self.streamer.update_account(account_id, status='stopping')
+        done = threading.Event()
+        self.ensure_running()
+        self.commands.put(('stop', list(account_ids), done))
+        return done.wait(timeout) if timeout is not None else True
+
+    def remove_node(self, address):
+        """Stop the streams of an agent removed from settings['agents'] and place them elsewhere"""
+        self.commands.put(('remove', address))
+
+    def node_name(self, account_id):
+        """Name of the agent running an account, None when it runs nowhere or locally"""
+        address = self.placements.get(account_id)
+        return self.nodes[address]['name'] if address in self.nodes else None
+
+    def node_statuses(self):
+        """Every configured agent with its capacity, load and stream count"""
+        counts = {}
+        for address in list(self.placements.values()):
+            counts[address] = counts.get(address, 0) + 1
+        return [dict(self.nodes.get(address, {'address': address, 'name': address, 'alive': False}),
+                     placed=counts.get(address, 0))
+                for address in list(self.streamer.settings['agents'])]
+
+    def log(self, event, address, account_ids):
+        self.history.append({'time': datetime.now().isoformat(timespec='seconds'), 'event': event,
+                             'node': address, 'accounts': list(account_ids)})
+
+    def request(self, address, method, path, body=None):
+        """Send one request to an agent, returning its payload or None when it failed"""
+        host, _, port = address.rpartition(':')
+        try:
+            code, payload = api_request((host or '127.0.0.1', int(port)), method, path, body,
+                                        timeout=self.streamer.settings['agent_interval'] * 2)
+        except (OSError, ValueError):
+            return None
+        return payload if code < 400 else None
+
+    def run(self):
+        next_poll = 0
+        while True:
+            try:
+                command = self.commands.get(timeout=max(0, next_poll - time.time()))
+            except queue.Empty:
+                command = None
+            try:
+                if command and command[0] == 'start':
+                    self.queue_accounts(command[1], command[2])
+                elif command and command[0] == 'stop':
+                    self.release(command[1])
+                    command[2].set()
+                elif command:
+                    self.evacuate(command[1])
+                if time.time() >= next_poll:
+                    for address in list(self.streamer.settings['agents']):
+                        self.poll(address)
+                    next_poll = time.time() + self.streamer.settings['agent_interval']
+                self.place_pending()
+            except Exception as e:
+                print(f"Coordinator error: {str(e)}")
+
+    def queue_accounts(self, account_ids, loop):
+        for account_id in account_ids:
+            if account_id not in self.placements:
+                self.pending[account_id] = loop
+                self.loops[account_id] = loop
+
+    def release(self, account_ids):
+        """Stop accounts on their agents, one request per agent"""
+        by_node = {}
+        for account_id in account_ids:
+            self.pending.pop(account_id, None)
+            self.loops.pop(account_id, None)
+            self.remote_status.pop(account_id, None)
+            address = self.placements.pop(account_id, None)
+            if address:
+                by_node.setdefault(address, []).append(account_id)
+            self.streamer.update_account(account_id, status='stopped', pid=None, start_time=None)
+        for address, ids in by_node.items():
+            # An agent that cannot be reached stops them when it comes back, see poll
+            self.request(address, 'POST', '/node/stop', {'ids': ids})
+
+    def poll(self, address):
+        """Refresh one agent's load and statuses; move its accounts once it is dead"""
+        polled_at = time.time()
+        report = self.request(address, 'GET', '/node')
+        node = self.nodes.setdefault(address, {
+            'address': address, 'name': address, 'alive': False, 'last_seen': None,
+            'cores': 0, 'uplink_kbps': 0, 'used_cores': 0, 'egress_kbps': 0
+        })
+        if report is None:
+            if node['alive'] and time.time() - node['last_seen'] > self.streamer.settings['agent_timeout']:
+                node['alive'] = False
+                moved = [account_id for account_id, placed in self.placements.items() if placed == address]
+                self.log('dead', address, moved)
+                for account_id in moved:
+                    self.requeue(account_id)
+            return
+
+        first_contact = node['last_seen'] is None
+        node.update({key: report[key] for key in ('name', 'cores', 'uplink_kbps', 'used_cores', 'egress_kbps')})
+        node.update(alive=True, last_seen=time.time())
+
+        stale = []
+        reported = {status['id']: status for status in report['accounts']}
+        for account_id, status in reported.items():
+            active = status['status'] in self.streamer.active_states
+            account = self.streamer.accounts.get(account_id)
+            placed = self.placements.get(account_id)
+            if placed is None and active and first_contact and account and account_id not in self.pending:
+                # Still running from before this coordinator started
+                self.placements[account_id] = placed = address
+                self.loops[account_id] = bool(status.get('loop'))
+            if placed != address:
+                if active:
+                    stale.append(account_id)
+                continue
+            if self.placed_at.get(account_id, 0) > polled_at:
+                continue  # Placed after this report was taken
+            self.remote_status[account_id] = status
+            self.streamer.update_account(account_id, status=status['status'], pid=status['pid'],
+                                         start_time=status.get('start_time'))
+            if not active:
+                # Ended, or failed for good, on the agent
+                del self.placements[account_id]
+                self.remote_status.pop(account_id, None)
+
+        # An agent that restarted has forgotten its accounts
+        for account_id in [account_id for account_id, placed in self.placements.items()
+                           if placed == address and account_id not in reported
+                           and self.placed_at.get(account_id, 0) <= polled_at]:
+            self.requeue(account_id)
+        if stale:
+            self.log('stale', address, stale)
+            self.request(address, 'POST', '/node/stop', {'ids': stale})
+
+    def evacuate(self, address):
+        """Move every account off an agent that is still reachable"""
+        moved = [account_id for account_id, placed in self.placements.items() if placed == address]
+        if not moved:
+            return
+        self.request(address, 'POST', '/node/stop', {'ids': moved})
+        self.log('removed', address, moved)
+        if not self.enabled():
+            self.release(moved)  # Nowhere left to run them
+            return
+        for account_id in moved:
+            self.requeue(account_id)
+
+    def requeue(self, account_id):
+        """Put an account from a dead or restarted agent back in line for placement"""
+        self.placements.pop(account_id, None)
+        self.remote_status.pop(account_id, None)
+        if account_id in self.streamer.accounts:
+            self.pending[account_id] = self.loops.get(account_id, False)
+            self.streamer.update_account(account_id, status='queued', pid=None, start_time=None)
+
+    def choose_node(self, cost, kbps):
+        """Agent whose busier resource, CPU or uplink, is least loaded with this group added"""
+        best, best_load = None, None
+        for address in self.streamer.settings['agents']:
+            node = self.nodes.get(address)
+            if not node or not node['alive']:
+                continue
+            load = (node['used_cores'] + cost) / max(node['cores'], 1)
+            if node['uplink_kbps']:
+                load = max(load, (node['egress_kbps'] + kbps) / node['uplink_kbps'])
+            if best is None or load < best_load:
+                best, best_load = address, load
+        return best
+
+    def place_pending(self):
+        """Start waiting accounts on agents, a source group at a time"""
+        streamer = self.streamer
+        for account_id in [account_id for account_id in self.pending if account_id not in streamer.accounts]:
+            del self.pending[account_id]
+        for looping in (True, False):
+            account_ids = [account_id for account_id, loop in self.pending.items() if loop is looping]
+            for group in streamer.group_accounts(account_ids).values():
+                cost = streamer.group_cost(group)
+                kbps = sum(streamer.preset_kbps(streamer.accounts[account_id]['preset']) for account_id in group)
+                address = self.choose_node(cost, kbps)
+                if address is None:
+                    return  # No agent alive, try again after the next poll
+                body = {
+                    'accounts': [streamer.persistent_fields(streamer.accounts[account_id]) for account_id in group],
+                    'presets': {streamer.accounts[account_id]['preset']:
+                                streamer.presets[streamer.accounts[account_id]['preset']] for account_id in group},
+                    'loop': looping
+                }
+                if self.request(address, 'POST', '/node/start', body) is None:
+                    continue  # Retried next round, by then perhaps on another agent
+                for account_id in group:
+                    del self.pending[account_id]
+                    self.placements[account_id] = address
+                    self.placed_at[account_id] = time.time()
+                    streamer.update_account(account_id, status='starting')
+                # Until the next poll reports the agent's real load
+                self.nodes[address]['used_cores'] += cost
+                self.nodes[address]['egress_kbps'] += kbps
+                self.log('placed', address, group)
+
+class ControlAPI:
+    """Local HTTP/JSON control API for a headless YouTubeMultiStreamer
+
+    Routes:
+        GET    /status                    all stream statuses
+        GET    /status/stream             server-sent events, one status snapshot per refresh
+        GET    /metrics                   Prometheus metrics
+        GET    /accounts                  list accounts
+        POST   /accounts                  add account {stream_key, video_source, label, preset, mode, image}
+        GET    /accounts/<id>             one account status
+        PATCH  /accounts/<id>             update {stream_key, video_source, label, preset, restart_policy,
+                                          shuffle, priority, mode, image}
+        DELETE /accounts/<id>             remove account
+        POST   /accounts/<id>/start       start {loop}
+        POST   /accounts/<id>/stop        stop
+        POST   /accounts/<id>/reload      re-read a playlist source
+        GET    /accounts/<id>/log         last FFmpeg stderr lines and the classified last error
+        PUT    /accounts/<id>/schedules   replace schedules {schedules: [entries, see ScheduleTimer]}
+        GET    /schedules                 upcoming schedule events and recent results
+        POST   /streams/start             bulk start {loop, ids, status, preset, label (all optional,
+                                          label matches as a prefix)}
+        POST   /streams/stop              bulk stop {ids, status, preset, label (all optional)}
+        GET    /presets                   presets and the default preset
+        GET    /relays                    ingest relays with consumer counts
+        PUT    /presets/default           set default preset {preset}
+        PUT    /presets/<name>            create or update a preset {video, audio, scale, fps, x264_preset,
+                                          tune, keyint, threads, x264_params}
+        DELETE /presets/<name>            delete a custom preset no account uses
+        GET    /nodes                     worker agents with capacity and load, and recent placements
+        POST   /nodes                     add a worker agent {address: "host:port"}
+        DELETE /nodes/<host:port>         remove a worker agent, moving its streams to the others
+
+    Routes an agent serves to its coordinator (see NodeCoordinator):
+        GET    /node                      capacity, load and stream statuses
+        POST   /node/start                adopt and start accounts {accounts, presets, loop}
+        POST   /node/stop                 stop and forget accounts {ids}
+    """
+
+    def __init__(self, streamer, host='127.0.0.1', port=8080):
+        self.streamer = streamer
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def start(self):
+        """Start listening, returns the bound port (useful with port 0)"""
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def close(self):
+        """Stop listening"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def handle_connection(self, reader, writer):
+        """Serve one HTTP request per connection"""
+        try:
+            request_line = (await reader.readline()).decode('latin-1').strip()
+            if not request_line:
+                return
+            method, path, _ = request_line.split(' ', 2)
+
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            body = {}
+            length = int(headers.get('content-length', 0))
+            if length:
+                try:
+                    body = json.loads(await reader.readexactly(length))
+                except json.JSONDecodeError:
+                    await self.send_json(writer, 400, {'error': 'invalid JSON body'})
+                    return
+                if not isinstance(body, dict):
+                    await self.send_json(writer, 400, {'error': 'JSON body must be an object'})
+                    return
+
+            path = path.split('?', 1)[0].rstrip('/') or '/'
+            if method == 'GET' and path == '/status/stream':
+                await self.stream_status(writer)
+                return
+            if method == 'GET' and path == '/metrics':
+                await self.send_text(writer, self.streamer.metrics_text())
+                return
+
+            # Routes may probe media or call agents, which would stall every stream on this loop
+            code, payload = await asyncio.get_running_loop().run_in_executor(None, self.route, method, path, body)
+            await self.send_json(writer, code, payload)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            pass  # Server shutting down with a status stream still open
+        finally:
+            writer.close()
+
+    async def send_json(self, writer, code, payload):
+        """Write a complete JSON response"""
+        reasons = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict', 502: 'Bad Gateway'}
+        data = json.dumps(payload).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {code} {reasons.get(code, 'OK')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1') + data
+        )
+        await writer.drain()
 
-                    # Update account status
-                    self.update_account(
-                        acc_id,
-                        status='streaming',
-                        pid=process.pid,
-                        start_time=datetime.now().isoformat()
-                    )
+    async def send_text(self, writer, text):
+        """Write a Prometheus text exposition response"""
+        data = text.encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 200 OK\r\n"
+            f"Content-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1') + data
+        )
+        await writer.drain()
 
-                    process.wait()  # Wait for process to complete
+    async def stream_status(self, writer):
+        """Push status snapshots as server-sent events until the client disconnects"""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        while True:
+            writer.write(f"data: {json.dumps(self.all_statuses())}\n\n".encode('utf-8'))
+            await writer.drain()
+            await asyncio.sleep(self.streamer.status_refresh_rate)
 
-                    if not loop_flag:
-                        break
+    def all_statuses(self):
+        """Status of every account"""
+        return [self.streamer.get_stream_status(account_id) for account_id in list(self.streamer.accounts)]
 
-                    time.sleep(2)  # Delay before restarting
-                    
-                except Exception as e:
-                    print(f"Error in stream worker for account {acc_id}: {str(e)}")
-                    break
+    def route(self, method, path, body):
+        """Dispatch a request to the streamer, returning (HTTP code, payload)"""
+        streamer = self.streamer
+        parts = path.strip('/').split('/')
 
-            # Clean up after streaming stops
-            self.update_account(
-                acc_id,
-                status='stopped',
-                pid=None,
-                start_time=None
-            )
+        if path == '/status' and method == 'GET':
+            return 200, self.all_statuses()
 
-        thread = threading.Thread(
-            target=stream_worker,
-            args=(ffmpeg_cmd, account_id, loop),
-            daemon=True
-        )
-        thread.start()
+        if parts[0] == 'accounts':
+            if len(parts) == 1:
+                if method == 'GET':
+                    return 200, self.all_statuses()
+                if method == 'POST':
+                    if not body.get('stream_key'):
+                        return 400, {'error': 'stream_key is required'}
+                    if body.get('preset') and body['preset'] not in streamer.presets:
+                        return 400, {'error': f"unknown preset {body['preset']}"}
+                    if body.get('mode', 'video') not in streamer.source_modes:
+                        return 400, {'error': f"mode must be one of {', '.join(streamer.source_modes)}"}
+                    account_id = streamer.add_account(
+                        body['stream_key'], body.get('video_source', ''), body.get('label', '')
+                    )
+                    updates = {key: body[key] for key in ('preset', 'mode', 'image') if body.get(key)}
+                    if updates:
+                        streamer.update_account(account_id, **updates)
+                    return 201, streamer.get_stream_status(account_id)
+                return 405, {'error': 'method not allowed'}
 
-        return True
+            try:
+                account_id = int(parts[1])
+            except ValueError:
+                return 404, {'error': 'not found'}
+            if account_id not in streamer.accounts:
+                return 404, {'error': f"account {account_id} not found"}
 
-    def stop_stream(self, account_id):
-        """Stop streaming for an account"""
-        if account_id not in self.accounts:
-            return False
+            if len(parts) == 2:
+                if method == 'GET':
+                    return 200, streamer.get_stream_status(account_id)
+                if method == 'PATCH':
+                    updates = {key: body[key] for key in ('stream_key', 'video_source', 'label', 'preset',
+                                                        'restart_policy', 'shuffle', 'priority', 'mode', 'image')
+                               if key in body}
+                    if 'preset' in updates and updates['preset'] not in streamer.presets:
+                        return 400, {'error': f"unknown preset {updates['preset']}"}
+                    if 'mode' in updates and updates['mode'] not in streamer.source_modes:
+                        return 400, {'error': f"mode must be one of {', '.join(streamer.source_modes)}"}
+                    try:
+                        updates = streamer.validate_account_fields(updates)
+                    except ValueError as e:
+                        return 400, {'error': str(e)}
+                    streamer.update_account(account_id, **updates)
+                    return 200, streamer.get_stream_status(account_id)
+                if method == 'DELETE':
+                    streamer.remove_account(account_id)
+                    return 200, {'removed': account_id}
+                return 405, {'error': 'method not allowed'}
 
-        account = self.accounts[account_id]
-        
-        if account['status'] != 'streaming' or account.get('pid') is None:
-            return False
+            if parts[2:] == ['log'] and method == 'GET':
+                address = streamer.coordinator.placements.get(account_id)
+                if address:
+                    log = streamer.coordinator.request(address, 'GET', f"/accounts/{account_id}/log")
+                    return (200, log) if log is not None else (502, {'error': f"agent {address} not answering"})
+                stats = streamer.stream_stats.get(account_id, {})
+                return 200, {'last_error': stats.get('last_error'),
+                             'lines': stats['log'].tail() if stats.get('log') else []}
 
-        try:
-            pid = account['pid']
-            if platform.system() == "Windows":
-                os.kill(pid, signal.CTRL_C_EVENT)
-            else:
-                os.killpg(os.getpgid(pid), signal.SIGTERM)
-            
-            self.update_account(
-                account_id,
-                status='stopped',
-                pid=None,
-                start_time=None
-            )
-            return True
-        except ProcessLookupError:
-            self.update_account(
-                account_id,
-                status='stopped',
-                pid=None,
-                start_time=None
-            )
-            return False
+            if parts[2:] == ['schedules'] and method == 'PUT':
+                try:
+                    schedules = [streamer.schedule_timer.normalize(entry) for entry in body.get('schedules', [])]
+                except (ValueError, TypeError, AttributeError) as e:
+                    return 400, {'error': str(e)}
+                streamer.update_account(account_id, schedules=schedules)
+                return 200, {'schedules': schedules}
 
-    def build_ffmpeg_command(self, video_source, stream_key, preset_name):
-        """Build FFmpeg command based on preset"""
-        preset = self.presets.get(preset_name, self.presets['medium'])
-        
-        base_cmd = f"ffmpeg -re -i \"{video_source}\" "
-        
-        video_settings = (
-            f"-c:v libx264 -preset veryfast "
-            f"-b:v {preset['video']} -maxrate {preset['video']} "
-            f"-bufsize {int(preset['video'].replace('k', '')) * 2}k "
-            f"-vf scale={preset['scale']} -g {preset['fps'] * 2} "
-            f"-r {preset['fps']} "
-            f"-c:a aac -b:a {preset['audio']} -ar 44100"
-        )
-        
-        output = f"-f flv rtmp://a.rtmp.youtube.com/live2/{stream_key}"
-        
-        return base_cmd + video_settings + " " + output
+            if len(parts) == 3 and method == 'POST':
+                if parts[2] == 'start':
+                    if not streamer.start_stream(account_id, bool(body.get('loop', False))):
+                        return 409, {'error': 'already running or no video source'}
+                    return 200, streamer.get_stream_status(account_id)
+                if parts[2] == 'stop':
+                    if not streamer.stop_stream(account_id):
+                        return 409, {'error': 'not running'}
+                    return 200, streamer.get_stream_status(account_id)
+                if parts[2] == 'reload':
+                    if not streamer.reload_playlist(account_id):
+                        return 409, {'error': 'not a playlist source or no playable items'}
+                    return 200, streamer.get_stream_status(account_id)
+            return 404, {'error': 'not found'}
 
-    def start_all_streams(self, loop=False):
-        """Start all streams"""
-        for account_id in self.accounts:
-            if self.accounts[account_id]['video_source']:
-                self.start_stream(account_id, loop)
-
-    def stop_all_streams(self):
-        """Stop all streams"""
-        for account_id in self.accounts:
-            if self.accounts[account_id]['status'] == 'streaming':
-                self.stop_stream(account_id)
+        if parts[0] == 'streams' and len(parts) == 2 and method == 'POST':
+            ids = body.get('ids')
+            filters = {key: body[key] for key in ('status', 'preset', 'label') if body.get(key)}
+            if filters:
+                matching = streamer.find_accounts(**filters)
+                ids = matching if ids is None else [account_id for account_id in ids if account_id in matching]
+            if parts[1] == 'start':
+                if ids is None:
+                    streamer.start_all_streams(bool(body.get('loop', False)))
+                else:
+                    pending = [account_id for account_id in ids if account_id in streamer.accounts]
+                    for account_ids in streamer.group_accounts(pending).values():
+                        streamer.start_group(account_ids, bool(body.get('loop', False)))
+                return 200, self.all_statuses()
+            if parts[1] == 'stop':
+                if ids is None:
+                    streamer.stop_all_streams()
+                else:
+                    for account_id in ids:
+                        # Siblings only get a new process when they are not stopping too
+                        stream = streamer.stream_processes.get(account_id)
+                        keep_siblings = stream is not None and not set(stream['accounts']) <= set(ids)
+                        streamer.stop_stream(account_id, keep_siblings)
+                return 200, self.all_statuses()
 
-    def get_stream_status(self, account_id):
-        """Get detailed status for a stream"""
-        if account_id not in self.accounts:
-            return None
-            
-        account = self.accounts[account_id]
-        status = {
-            'id': account_id,
-            'label': account.get('label', f"Account {account_id}"),
-            'status': account['status'],
-            'preset': account['preset'],
-            'video_source': account['video_source'],
-            'stream_key_short': account['stream_key'][:10] + '...' if len(account['stream_key']) > 10 else account['stream_key'],
-            'pid': account.get('pid'),
-            'uptime': self.calculate_uptime(account.get('start_time'))
-        }
-        return status
+        if path == '/schedules' and method == 'GET':
+            timer = streamer.schedule_timer
+            return 200, {'upcoming': timer.upcoming(), 'history': list(timer.history)}
 
-    def calculate_uptime(self, start_time_iso):
-        """Calculate uptime from start time"""
-        if not start_time_iso:
-            return "00:00:00"
-            
-        start_time = datetime.fromisoformat(start_time_iso)
-        uptime = datetime.now() - start_time
-        hours, remainder = divmod(int(uptime.total_seconds()), 3600)
-        minutes, seconds = divmod(remainder, 60)
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+        if path == '/relays' and method == 'GET':
+            return 200, streamer.supervisor.relay_status()
 
-    def display_status_dashboard(self, stdscr):
-        """Display real-time streaming status dashboard"""
-        curses.curs_set(0)  # Hide cursor
-        stdscr.nodelay(1)  # Non-blocking input
-        
-        while True:
-            stdscr.clear()
-            self.show_banner(stdscr)
-            
-            # Display header
-            header_line = 8
-            stdscr.addstr(header_line, 0, "=" * 80)
-            stdscr.addstr(header_line + 1, 0, 
-                "ID  Label              Preset    Status      Uptime    Video Source", 
-                curses.A_BOLD)
-            stdscr.addstr(header_line + 2, 0, "-" * 80)
-            
-            # Display each account status
-            line = header_line + 3
-            for account_id in self.accounts:
-                status = self.get_stream_status(account_id)
-                if not status:
-                    continue
-                    
-                line_str = (
-                    f"{status['id']:<4} "
-                    f"{status['label'][:15].ljust(16)} "
-                    f"{status['preset'].ljust(9)} "
-                    f"{status['status'].ljust(11)} "
-                    f"{status['uptime'].ljust(9)} "
-                    f"{status['video_source'][:30]}"
-                )
-                
-                # Highlight running streams
-                attr = curses.A_BOLD if status['status'] == 'streaming' else curses.A_NORMAL
-                stdscr.addstr(line, 0, line_str, attr)
-                line += 1
-                
-                # Wrap if too many lines
-                if line >= curses.LINES - 3:
-                    break
-            
-            # Display footer and instructions
-            stdscr.addstr(curses.LINES - 3, 0, "=" * 80)
-            stdscr.addstr(curses.LINES - 2, 0, 
-                "Press 'q' to quit, 'r' to refresh, 'm' for main menu", 
-                curses.A_DIM)
-            
-            # Check for user input
-            key = stdscr.getch()
-            if key == ord('q'):
-                break
-            elif key == ord('m'):
-                return 'menu'
-            
-            stdscr.refresh()
-            time.sleep(self.status_refresh_rate)
-        
-        return 'exit'
+        if parts[0] == 'node':
+            # Agent side, called by a coordinator
+            if len(parts) == 1 and method == 'GET':
+                return 200, streamer.node_report()
+            if parts[1:] == ['start'] and method == 'POST':
+                try:
+                    account_ids = streamer.adopt_accounts(body.get('accounts', []), body.get('presets', {}),
+                                                          bool(body.get('loop', False)))
+                except (ValueError, KeyError, TypeError) as e:
+                    return 400, {'error': str(e)}
+                return 200, {'started': account_ids}
+            if parts[1:] == ['stop'] and method == 'POST':
+                streamer.release_accounts([int(account_id) for account_id in body.get('ids', [])])
+                return 200, {'stopped': body.get('ids', [])}
+            return 404, {'error': 'not found'}
+
+        if parts[0] == 'nodes':
+            coordinator = streamer.coordinator
+            if len(parts) == 1 and method == 'GET':
+                return 200, {'nodes': coordinator.node_statuses(), 'history': list(coordinator.history)}
+            if len(parts) == 1 and method == 'POST':
+                address = str(body.get('address', ''))
+                if not re.fullmatch(r'[\w.\-]+:\d+', address):
+                    return 400, {'error': 'address must be host:port'}
+                if address not in streamer.settings['agents']:
+                    with streamer.config_lock:
+                        streamer.settings['agents'] = streamer.settings['agents'] + [address]
+                    streamer.save_config()
+                    coordinator.ensure_running()
+                return 200, {'nodes': coordinator.node_statuses()}
+            if len(parts) == 2 and method == 'DELETE':
+                if parts[1] not in streamer.settings['agents']:
+                    return 404, {'error': f"agent {parts[1]} not found"}
+                with streamer.config_lock:
+                    streamer.settings['agents'] = [address for address in streamer.settings['agents']
+                                                   if address != parts[1]]
+                streamer.save_config()
+                coordinator.remove_node(parts[1])
+                return 200, {'nodes': coordinator.node_statuses()}
+            return 405, {'error': 'method not allowed'}
+
+        if parts[0] == 'presets':
+            if len(parts) == 1 and method == 'GET':
+                return 200, {'presets': streamer.presets, 'default': streamer.current_preset}
+            if parts[1:] == ['default'] and method == 'PUT':
+                if body.get('preset') not in streamer.presets:
+                    return 400, {'error': 'unknown preset'}
+                streamer.current_preset = body['preset']
+                streamer.save_config()
+                return 200, {'default': streamer.current_preset}
+            if len(parts) == 2 and method == 'PUT':
+                try:
+                    return 200, streamer.set_preset(parts[1], body)
+                except (ValueError, TypeError) as e:
+                    return 400, {'error': str(e)}
+            if len(parts) == 2 and method == 'DELETE':
+                try:
+                    streamer.remove_preset(parts[1])
+                except ValueError as e:
+                    return 409, {'error': str(e)}
+                return 200, {'removed': parts[1]}
+
+        return 404, {'error': 'not found'}
 
 def account_management_menu(streamer):
     """Account management menu"""
@@ -368,16 +4213,19 @@ def account_management_menu(streamer):
         print("2. Edit Account")
         print("3. Remove Account")
         print("4. List All Accounts")
-        print("5. Back to Main Menu")
+        print("5. Schedules")
+        print("6. Import Accounts (CSV/JSON)")
+        print("7. Export Accounts (CSV/JSON)")
+        print("8. Back to Main Menu")
         
-        choice = input("\nSelect option (1-5): ")
+        choice = input("\nSelect option (1-8): ")
         
         if choice == '1':
             streamer.clear_screen()
             streamer.show_banner()
             print("\nAdd New Streaming Account:")
             stream_key = input("YouTube Stream Key: ")
-            video_source = input("Video Source (file path or URL): ")
+            video_source = input("Video Source (file path, URL, folder, glob or .m3u/.txt playlist): ")
             label = input("Account Label (optional): ")
             account_id = streamer.add_account(stream_key, video_source, label)
             print(f"\nAccount added successfully with ID: {account_id}")
@@ -395,11 +4243,25 @@ def account_management_menu(streamer):
                     print(f"\nEditing Account {account_id}: {account.get('label', 'No Label')}")
                     print(f"Current Stream Key: {account['stream_key'][:10]}...")
                     print(f"Current Video Source: {account['video_source']}")
+                    print(f"Current Mode: {account['mode']}" + (f" ({account['image']})" if account['image'] else ''))
                     print(f"Current Preset: {account['preset']}")
                     
                     new_key = input("\nNew Stream Key (leave blank to keep current): ")
                     new_source = input("New Video Source (leave blank to keep current): ")
                     new_preset = input(f"New Preset ({', '.join(streamer.presets.keys())}, leave blank to keep current): ")
+                    policy = streamer.restart_policy(account_id)
+                    new_max_restarts = input(f"Max restarts per {policy['restart_window']}s before giving up "
+                                             f"(current {policy['max_restarts']}, leave blank to keep current): ")
+                    new_priority = input(f"Priority under congestion, higher keeps its preset longer "
+                                         f"(current {account['priority']}, leave blank to keep current): ")
+                    new_shuffle = input(f"Shuffle playlist? (y/n, current {'y' if account['shuffle'] else 'n'}, "
+                                        f"leave blank to keep current): ").lower()
+                    new_mode = input("Mode: video, or still to show an image over the source's audio "
+                                     "(leave blank to keep current): ").lower()
+                    new_image = ''
+                    if new_mode == 'still' or (not new_mode and account['mode'] == 'still'):
+                        new_image = input("Image file, folder or glob for a slideshow "
+                                          "(leave blank to keep current): ")
                     
                     updates = {}
                     if new_key:
@@ -408,6 +4270,17 @@ def account_management_menu(streamer):
                         updates['video_source'] = new_source
                     if new_preset and new_preset in streamer.presets:
                         updates['preset'] = new_preset
+                    if new_max_restarts.isdigit():
+                        updates['restart_policy'] = dict(account.get('restart_policy') or {},
+                                                         max_restarts=int(new_max_restarts))
+                    if new_priority.lstrip('-').isdigit():
+                        updates['priority'] = int(new_priority)
+                    if new_shuffle in ('y', 'n'):
+                        updates['shuffle'] = new_shuffle == 'y'
+                    if new_mode in streamer.source_modes:
+                        updates['mode'] = new_mode
+                    if new_image:
+                        updates['image'] = new_image
                     
                     if updates:
                         streamer.update_account(account_id, **updates)
@@ -453,14 +4326,109 @@ def account_management_menu(streamer):
             
             print("-" * 90)
             input("\nPress Enter to continue...")
-            
+
         elif choice == '5':
+            schedule_menu(streamer)
+
+        elif choice == '6':
+            path = input("\nFile to import (.csv or .json): ").strip()
+            try:
+                account_ids = streamer.import_accounts(path)
+                print(f"\nImported {len(account_ids)} accounts.")
+            except (OSError, ValueError, csv.Error) as e:
+                print(f"\nImport failed, nothing was added: {str(e)}")
+            input("\nPress Enter to continue...")
+
+        elif choice == '7':
+            path = input("\nExport to (.csv or .json): ").strip()
+            try:
+                count = streamer.export_accounts(path)
+                print(f"\nExported {count} accounts to {path}.")
+            except OSError as e:
+                print(f"\nExport failed: {str(e)}")
+            input("\nPress Enter to continue...")
+            
+        elif choice == '8':
             break
             
         else:
             print("\nInvalid option. Please try again.")
             time.sleep(1)
 
+def schedule_menu(streamer):
+    """Timed start/stop schedules"""
+    timer = streamer.schedule_timer
+    days_help = "0=Mon ... 6=Sun, comma separated, blank = every day"
+    while True:
+        streamer.clear_screen()
+        streamer.show_banner()
+        print("\nSchedules:")
+        print("1. List Schedules")
+        print("2. Add Schedule")
+        print("3. Remove Schedule")
+        print("4. Back")
+
+        choice = input("\nSelect option (1-4): ")
+
+        if choice == '1':
+            streamer.clear_screen()
+            streamer.show_banner()
+            print("\nSchedules:")
+            print("-" * 90)
+            for account_id, account in streamer.accounts.items():
+                for index, entry in enumerate(account['schedules']):
+                    when = entry.get('at') or f"{entry['time']} days {entry.get('days', 'all')}"
+                    print(f"{account_id:<4} #{index:<3} {entry['action'].ljust(6)} {when}")
+            print("-" * 90)
+            print("Upcoming:")
+            for event in streamer.supervisor.call(timer.upcoming)[:20]:
+                print(f"  {event['time']}  account {event['account']:<4} {event['event']}")
+            print("Recent:")
+            for event in list(timer.history)[-10:]:
+                print(f"  {event['time']}  account {event['account']:<4} {event['event']}: {event['result']}")
+            input("\nPress Enter to continue...")
+
+        elif choice == '2':
+            try:
+                account_id = int(input("\nAccount ID: "))
+                if account_id not in streamer.accounts:
+                    raise ValueError("account not found")
+                entry = {'action': 'stop' if input("Action (start/stop): ").strip().lower() == 'stop' else 'start'}
+                when = input("One-shot date and time (YYYY-MM-DD HH:MM), or daily time (HH:MM): ").strip()
+                if ' ' in when or 'T' in when:
+                    entry['at'] = when
+                else:
+                    entry['time'] = when
+                    days = input(f"Days ({days_help}): ").strip()
+                    entry['days'] = [int(day) for day in days.split(',') if day.strip()]
+                if entry['action'] == 'start':
+                    entry['loop'] = input("Enable looping? (y/n): ").lower() == 'y'
+                schedules = streamer.accounts[account_id]['schedules'] + [timer.normalize(entry)]
+                streamer.update_account(account_id, schedules=schedules)
+                print("\nSchedule added.")
+            except ValueError as e:
+                print(f"\nInvalid schedule: {str(e)}")
+            input("\nPress Enter to continue...")
+
+        elif choice == '3':
+            try:
+                account_id = int(input("\nAccount ID: "))
+                index = int(input("Schedule # to remove: "))
+                schedules = list(streamer.accounts[account_id]['schedules'])
+                del schedules[index]
+                streamer.update_account(account_id, schedules=schedules)
+                print("\nSchedule removed.")
+            except (ValueError, KeyError, IndexError):
+                print("\nSchedule not found.")
+            input("\nPress Enter to continue...")
+
+        elif choice == '4':
+            break
+
+        else:
+            print("\nInvalid option. Please try again.")
+            time.sleep(1)
+
 def stream_control_menu(streamer):
     """Stream control menu"""
     while True:
@@ -472,9 +4440,10 @@ def stream_control_menu(streamer):
         print("3. Start All Streams")
         print("4. Stop All Streams")
         print("5. View Streaming Status")
-        print("6. Back to Main Menu")
+        print("6. Reload Playlist")
+        print("7. Back to Main Menu")
         
-        choice = input("\nSelect option (1-6): ")
+        choice = input("\nSelect option (1-7): ")
         
         if choice == '1':
             streamer.clear_screen()
@@ -528,12 +4497,28 @@ def stream_control_menu(streamer):
             input("\nPress Enter to continue...")
             
         elif choice == '5':
+            import curses  # only the dashboard needs curses, keeps startup fast
             result = streamer.display_status_dashboard(curses.initscr())
             curses.endwin()
             if result == 'exit':
                 return 'exit'
-                
+
         elif choice == '6':
+            streamer.clear_screen()
+            streamer.show_banner()
+            print("\nReload Playlist:")
+            account_id = input("Enter Account ID to reload: ")
+            try:
+                if streamer.reload_playlist(int(account_id)):
+                    print("\nPlaylist reloaded. A looping stream restarts on the new list after the current pass"
+                          " (its RTMP connection reconnects once).")
+                else:
+                    print("\nNot a playlist source, or no playable items found.")
+            except ValueError:
+                print("\nInvalid Account ID. Please enter a number.")
+            input("\nPress Enter to continue...")
+                
+        elif choice == '7':
             break
             
         else:
@@ -548,24 +4533,32 @@ def preset_management_menu(streamer):
         print("\nPreset Management:")
         print("1. View All Presets")
         print("2. Set Default Preset")
-        print("3. Back to Main Menu")
+        print("3. Scheduler Settings (CPU, uplink)")
+        print("4. Create/Edit Preset")
+        print("5. Delete Preset")
+        print("6. Back to Main Menu")
         
-        choice = input("\nSelect option (1-3): ")
+        choice = input("\nSelect option (1-6): ")
         
         if choice == '1':
             streamer.clear_screen()
             streamer.show_banner()
             print("\nAvailable Presets:")
-            print("-" * 60)
-            print("Name    Video Bitrate Audio Bitrate Resolution FPS")
-            print("-" * 60)
+            print("-" * 90)
+            print("Name    Video Bitrate Audio Bitrate Resolution FPS  Cores x264      Tune       Threads")
+            print("-" * 90)
             
             for name, settings in streamer.presets.items():
                 print(f"{name.ljust(8)} {settings['video'].ljust(13)} {settings['audio'].ljust(13)} "
-                      f"{settings['scale'].ljust(11)} {settings['fps']}")
+                      f"{settings['scale'].ljust(11)} {str(settings['fps']).ljust(4)} "
+                      f"{str(streamer.estimate_encode_cost('', name)).ljust(5)} "
+                      f"{settings['x264_preset'].ljust(9)} {(settings['tune'] or '-').ljust(10)} "
+                      f"{settings['threads'] or 'auto'}")
+                if settings['x264_params']:
+                    print(f"         x264 params: {settings['x264_params']}")
             
             print(f"\nCurrent default preset: {streamer.current_preset}")
-            print("-" * 60)
+            print("-" * 90)
             input("\nPress Enter to continue...")
             
         elif choice == '2':
@@ -585,12 +4578,362 @@ def preset_management_menu(streamer):
             input("\nPress Enter to continue...")
             
         elif choice == '3':
+            streamer.clear_screen()
+            streamer.show_banner()
+            print("\nScheduler Settings:")
+            print(f"CPU budget (cores, 0 = all {os.cpu_count()}): {streamer.settings['cpu_budget']}")
+            print(f"Seconds between stream starts: {streamer.settings['ramp_interval']}")
+            print(f"Pin FFmpeg to cores: {'yes' if streamer.settings['pin_cores'] else 'no'}")
+            print(f"FFmpeg nice level: {streamer.settings['nice']}")
+            print(f"Uplink budget (kbit/s, 0 = unlimited): {streamer.settings['uplink_kbps']} "
+                  f"(in use: {streamer.supervisor.egress_kbps()})")
+
+            try:
+                budget = input("\nNew CPU budget (leave blank to keep current): ")
+                ramp = input("New seconds between starts (leave blank to keep current): ")
+                pin = input("Pin FFmpeg to cores? (y/n, leave blank to keep current): ").lower()
+                nice = input("New nice level 0-19 (leave blank to keep current): ")
+                uplink = input("New uplink budget in kbit/s (leave blank to keep current): ")
+                if budget:
+                    streamer.settings['cpu_budget'] = float(budget)
+                if ramp:
+                    streamer.settings['ramp_interval'] = float(ramp)
+                if pin in ('y', 'n'):
+                    streamer.settings['pin_cores'] = pin == 'y'
+                if nice:
+                    streamer.settings['nice'] = max(0, min(19, int(nice)))
+                if uplink:
+                    streamer.settings['uplink_kbps'] = max(0, int(uplink))
+                streamer.save_config()
+                print("\nScheduler settings saved.")
+            except ValueError:
+                print("\nInvalid number.")
+            input("\nPress Enter to continue...")
+
+        elif choice == '4':
+            streamer.clear_screen()
+            streamer.show_banner()
+            print("\nCreate/Edit Preset (leave blank to keep current or default):")
+            name = input("Preset name: ").strip()
+            current = streamer.presets.get(name, streamer.presets['medium'])
+            fields = {}
+            for key, label in (('video', 'Video bitrate'), ('audio', 'Audio bitrate'), ('scale', 'Resolution W:H'),
+                               ('fps', 'FPS'), ('x264_preset', 'x264 preset'), ('tune', 'x264 tune, - for none'),
+                               ('keyint', 'Keyframe interval (seconds)'), ('threads', 'Threads (0 = automatic)'),
+                               ('x264_params', 'x264 params, - for none')):
+                value = input(f"{label} [{current[key] if current[key] not in (None, '') else '-'}]: ").strip()
+                if value:
+                    fields[key] = '' if value == '-' else value
+            try:
+                streamer.set_preset(name, dict(current, **fields))
+                print(f"\nPreset {name} saved.")
+            except (ValueError, TypeError) as e:
+                print(f"\nInvalid preset: {str(e)}")
+            input("\nPress Enter to continue...")
+
+        elif choice == '5':
+            streamer.clear_screen()
+            streamer.show_banner()
+            print("\nDelete Preset:")
+            try:
+                streamer.remove_preset(input("Preset name: ").strip())
+                print("\nPreset deleted.")
+            except ValueError as e:
+                print(f"\nCannot delete: {str(e)}")
+            input("\nPress Enter to continue...")
+            
+        elif choice == '6':
             break
             
         else:
             print("\nInvalid option. Please try again.")
             time.sleep(1)
 
+def cache_management_menu(streamer):
+    """Transcode cache menu"""
+    while True:
+        streamer.clear_screen()
+        streamer.show_banner()
+        print("\nTranscode Cache:")
+        print("1. List Cached Renditions")
+        print("2. Pre-encode All Local Sources")
+        print("3. Purge Cached Rendition")
+        print("4. Purge All")
+        print("5. Back to Main Menu")
+
+        choice = input("\nSelect option (1-5): ")
+
+        if choice == '1':
+            streamer.clear_screen()
+            streamer.show_banner()
+            print("\nCached Renditions:")
+            print("-" * 90)
+            print("Key       Preset    Size(MB)  Last Used            Source")
+            print("-" * 90)
+
+            for entry in streamer.list_cache():
+                last_used = datetime.fromtimestamp(entry['last_used']).strftime('%Y-%m-%d %H:%M:%S')
+                print(f"{entry['key'][:8].ljust(9)} {entry['preset'].ljust(9)} "
+                      f"{entry['size'] / (1024 * 1024):<9.1f} {last_used}  {entry['source'][-40:]}")
+
+            print("-" * 90)
+            print(f"Cache limit: {streamer.settings['cache_max_mb']} MB")
+            input("\nPress Enter to continue...")
+
+        elif choice == '2':
+            queued = streamer.warm_cache()
+            print(f"\nQueued {queued} source(s) for background pre-encoding.")
+            input("\nPress Enter to continue...")
+
+        elif choice == '3':
+            key_prefix = input("\nEnter key (or first characters of it) to purge: ")
+            matches = [entry['key'] for entry in streamer.list_cache()
+                       if key_prefix and entry['key'].startswith(key_prefix)]
+            if len(matches) == 1:
+                streamer.purge_cache(matches[0])
+                print("\nCached rendition removed.")
+            else:
+                print("\nKey not found or not unique.")
+            input("\nPress Enter to continue...")
+
+        elif choice == '4':
+            removed = streamer.purge_cache()
+            print(f"\nRemoved {removed} cached rendition(s).")
+            input("\nPress Enter to continue...")
+
+        elif choice == '5':
+            break
+
+        else:
+            print("\nInvalid option. Please try again.")
+            time.sleep(1)
+
+def enter_data_dir(data_dir):
+    """Make data_dir (created if needed) the working directory, where config and state live"""
+    if data_dir:
+        os.makedirs(data_dir, exist_ok=True)
+        os.chdir(data_dir)
+
+def run_daemon(host='127.0.0.1', port=8080, instance_path='instance.json', data_dir=None):
+    """Run without a TTY, controlled through the HTTP API until SIGTERM/SIGINT
+
+    The API is served from the supervisor's event loop, so the daemon
+    runs a single asyncio loop for both HTTP clients and FFmpeg children.
+    The bound address is written to instance_path so one-shot commands
+    (see run_command) can find it.
+
+    config.json, ffmpeg.pids, the cache and logs live in data_dir (default
+    the working directory), which one daemon or agent owns at a time: a
+    second one would share the account store and reap the first one's
+    FFmpeg children as orphans. Returns 1 when the directory is taken.
+    """
+    enter_data_dir(data_dir)
+    for path in ('instance.json', 'agent.json'):
+        owner = find_instance(path)
+        if owner:
+            print(f"Another instance (http://{owner[0]}:{owner[1]}) already runs in {os.getcwd()}, "
+                  f"use --data-dir to run a second one")
+            return 1
+
+    streamer = YouTubeMultiStreamer()
+    supervisor = streamer.supervisor
+    supervisor.ensure_running()
+
+    api = ControlAPI(streamer, host, port)
+    bound_port = asyncio.run_coroutine_threadsafe(api.start(), supervisor.loop).result()
+    streamer.node_name = streamer.settings['node_name'] or f"{platform.node()}:{bound_port}"
+    with open(instance_path, 'w') as f:
+        json.dump({'host': host, 'port': bound_port, 'pid': os.getpid()}, f)
+    print(f"Control API listening on http://{host}:{bound_port}")
+
+    stop_event = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: stop_event.set())
+    try:
+        while not stop_event.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass  # Windows delivers Ctrl+C here
+    finally:
+        try:
+            os.remove(instance_path)
+        except OSError:
+            pass
+        asyncio.run_coroutine_threadsafe(api.close(), supervisor.loop).result()
+        print("Stopping all streams...")
+        streamer.stop_all_streams()
+        streamer.flush_pending_config()
+
+def api_request(address, method, path, body=None, timeout=10):
+    """Send one request to a control API at (host, port), returning (HTTP code, payload)"""
+    import http.client
+    connection = http.client.HTTPConnection(*address, timeout=timeout)
+    try:
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        connection.request(method, path, body=data, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b'null')
+    finally:
+        connection.close()
+
+def find_instance(instance_path='instance.json'):
+    """(host, port) of the running daemon recorded in instance_path, or None
+
+    A file left behind by a daemon that died is ignored, because nothing
+    answers on its address.
+    """
+    try:
+        with open(instance_path) as f:
+            instance = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # A daemon listening on every interface is reached through loopback
+    host = {'': '127.0.0.1', '0.0.0.0': '127.0.0.1', '::': '::1'}.get(instance['host'], instance['host'])
+    try:
+        api_request((host, instance['port']), 'GET', '/presets', timeout=2)
+    except (OSError, ValueError):
+        return None
+    return host, instance['port']
+
+def spawn_daemon(host, port, timeout=15):
+    """Start the daemon as a detached background process and wait for its API"""
+    if platform.system() == "Windows":
+        detach = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS}
+    else:
+        detach = {'start_new_session': True}
+    with open('daemon.log', 'a') as log:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), 'daemon', '--host', host, '--port', str(port)],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, **detach
+        )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        instance = find_instance()
+        if instance:
+            return instance
+        time.sleep(0.1)
+    return None
+
+def command_request(args):
+    """The control API request (method, path, body) for a one-shot command"""
+    if args.command in ('start', 'stop'):
+        body = {key: getattr(args, key) for key in ('preset', 'label') if getattr(args, key)}
+        if args.ids:
+            body['ids'] = args.ids
+        if args.command == 'start':
+            body['loop'] = args.loop
+        return 'POST', f"/streams/{args.command}", body
+    if args.command == 'status':
+        return 'GET', '/status', None
+    if args.command == 'presets':
+        return 'GET', '/presets', None
+    if args.command == 'nodes':
+        return 'GET', '/nodes', None
+    if args.command == 'logs':
+        return 'GET', f"/accounts/{args.id}/log", None
+    if args.accounts_command == 'add':
+        body = {'stream_key': args.stream_key, 'video_source': args.source, 'label': args.label}
+        if args.preset:
+            body['preset'] = args.preset
+        return 'POST', '/accounts', body
+    return 'GET', '/accounts', None
+
+def print_accounts(statuses):
+    """Print account statuses as a table, with the agent running each stream when there are agents"""
+    nodes = any(status.get('node') for status in statuses)
+    print("ID  Label              Preset    Status      Uptime    " + ("Node            " if nodes else '')
+          + "Video Source")
+    print("-" * 90)
+    for status in statuses:
+        node = f"{(status.get('node') or '-')[:15].ljust(16)}" if nodes else ''
+        print(f"{status['id']:<4} {status['label'][:15].ljust(16)} {status['preset'].ljust(9)} "
+              f"{status['status'].ljust(11)} {status['uptime'].ljust(9)} {node}{status['video_source'][:40]}")
+
+def run_command(args):
+    """Run one non-interactive subcommand, returning the process exit code
+
+    Commands go to the running daemon's control API when there is one,
+    so they act on its live streams; otherwise they are routed through a
+    ControlAPI on a local streamer that only edits the config. start
+    launches a daemon first, since streams only run as long as the
+    process that supervises them. The local streamer starts no
+    background work (schedules, agents), it only loads the config.
+    """
+    enter_data_dir(args.data_dir)
+    instance = find_instance()
+    if instance is None and args.command == 'start':
+        instance = spawn_daemon(args.host, args.port)
+        if instance is None:
+            print("Could not start the daemon, see daemon.log", file=sys.stderr)
+            return 1
+
+    if instance is not None:
+        def request(method, path, body=None):
+            return api_request(instance, method, path, body)
+    else:
+        import contextlib
+        with contextlib.redirect_stdout(sys.stderr):  # stdout is for command output
+            streamer = YouTubeMultiStreamer(background=False)
+        api = ControlAPI(streamer)
+
+        def request(method, path, body=None):
+            return api.route(method, path, body or {})
+
+    if args.command == 'accounts' and args.accounts_command == 'rm':
+        for account_id in args.ids:
+            code, payload = request('DELETE', f"/accounts/{account_id}")
+            if code >= 400:
+                break
+    else:
+        code, payload = request(*command_request(args))
+    if instance is None:
+        streamer.flush_pending_config()
+    if code >= 400:
+        print(f"Error: {payload.get('error', code)}", file=sys.stderr)
+        return 1
+
+    if args.command == 'accounts' and args.accounts_command == 'rm':
+        print(f"Removed {len(args.ids)} account(s).")
+    elif args.command == 'accounts' and args.accounts_command == 'add':
+        print(payload['id'])
+    elif args.command == 'logs':
+        print('\n'.join(payload['lines'][-args.lines:] if args.lines else payload['lines']))
+        if payload['last_error']:
+            error = payload['last_error']
+            print(f"Last error ({error['reason']}, {error['time']}): {error['message']}", file=sys.stderr)
+    elif getattr(args, 'json', False):
+        if args.command == 'status' and args.ids:
+            payload = [status for status in payload if status['id'] in args.ids]
+        print(json.dumps(payload, indent=4))
+    elif args.command == 'nodes':
+        print("Agent                  Name                 State  Cores        Uplink kbps      Streams")
+        print("-" * 90)
+        for node in payload['nodes']:
+            cores = f"{node.get('used_cores', 0):g}/{node.get('cores', 0):g}"
+            uplink = f"{node.get('egress_kbps', 0)}/{node.get('uplink_kbps') or '-'}"
+            print(f"{node['address'][:22].ljust(22)} {node['name'][:20].ljust(20)} "
+                  f"{('up' if node['alive'] else 'down').ljust(6)} {cores.ljust(12)} {uplink.ljust(16)} {node['placed']}")
+    elif args.command == 'presets':
+        for name, preset in payload['presets'].items():
+            marker = '*' if name == payload['default'] else ' '
+            print(f"{marker} {name.ljust(8)} {preset['scale'].ljust(10)} {preset['fps']}fps "
+                  f"video {preset['video']} audio {preset['audio']} x264 {preset['x264_preset']}"
+                  f"{' tune ' + preset['tune'] if preset['tune'] else ''}")
+    elif args.command in ('start', 'stop'):
+        selected = set(args.ids) if args.ids else None
+        active = [status for status in payload if status['status'] in ('queued', 'starting', 'streaming',
+                                                                        'restarting', 'stopping')
+                  and (selected is None or status['id'] in selected)]
+        where = f" on {instance[0]}:{instance[1]}" if instance else ''
+        if args.command == 'start':
+            print(f"{len(active)} stream(s) active{where}")
+        else:
+            print(f"{len(active)} stream(s) still stopping{where}" if active else "Stopped.")
+    else:
+        print_accounts([status for status in payload if not args.ids or status['id'] in args.ids]
+                       if args.command == 'status' else payload)
+    return 0
+
 def main():
     streamer = YouTubeMultiStreamer()
     
@@ -601,9 +4944,10 @@ def main():
         print("1. Account Management")
         print("2. Stream Control")
         print("3. Preset Management")
-        print("4. Exit")
+        print("4. Transcode Cache")
+        print("5. Exit")
         
-        choice = input("\nSelect option (1-4): ")
+        choice = input("\nSelect option (1-5): ")
         
         if choice == '1':
             account_management_menu(streamer)
@@ -617,6 +4961,9 @@ def main():
             preset_management_menu(streamer)
             
         elif choice == '4':
+            cache_management_menu(streamer)
+            
+        elif choice == '5':
             print("\nStopping all streams before exiting...")
             streamer.stop_all_streams()
             print("\nThank you for using MASANTO YouTube Multi-Streaming Tool!")
@@ -626,14 +4973,84 @@ def main():
             print("\nInvalid option. Please try again.")
             time.sleep(1)
 
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="YouTube Multi-Streaming Tool")
+    subparsers = parser.add_subparsers(dest='command')
+    # Every subcommand can point at another instance's directory
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--data-dir', help="directory for config.json, logs and cache, default the current one")
+
+    daemon_parser = subparsers.add_parser('daemon', help="run headless with the HTTP control API", parents=[common])
+    daemon_parser.add_argument('--host', default='127.0.0.1')
+    daemon_parser.add_argument('--port', type=int, default=8080)
+
+    # One-shot commands, sent to the running daemon when there is one
+    start_parser = subparsers.add_parser('start', help="start streams, launching the daemon if none is running",
+                                         parents=[common])
+    start_parser.add_argument('ids', nargs='*', type=int, help="account ids, default all")
+    start_parser.add_argument('--loop', action='store_true')
+    start_parser.add_argument('--preset', help="only accounts on this preset")
+    start_parser.add_argument('--label', help="only accounts whose label starts with this")
+    start_parser.add_argument('--host', default='127.0.0.1', help="address for a newly launched daemon")
+    start_parser.add_argument('--port', type=int, default=8080)
+
+    stop_parser = subparsers.add_parser('stop', help="stop streams on the running daemon", parents=[common])
+    stop_parser.add_argument('ids', nargs='*', type=int, help="account ids, default all")
+    stop_parser.add_argument('--preset', help="only accounts on this preset")
+    stop_parser.add_argument('--label', help="only accounts whose label starts with this")
+
+    status_parser = subparsers.add_parser('status', help="show stream status", parents=[common])
+    status_parser.add_argument('ids', nargs='*', type=int, help="account ids, default all")
+    status_parser.add_argument('--json', action='store_true')
+
+    accounts_parser = subparsers.add_parser('accounts', help="manage accounts")
+    accounts_subparsers = accounts_parser.add_subparsers(dest='accounts_command', required=True)
+    list_parser = accounts_subparsers.add_parser('list', help="list accounts", parents=[common])
+    list_parser.add_argument('--json', action='store_true')
+    add_parser = accounts_subparsers.add_parser('add', help="add an account, prints its id", parents=[common])
+    add_parser.add_argument('stream_key')
+    add_parser.add_argument('--source', default='', help="video source")
+    add_parser.add_argument('--label', default='')
+    add_parser.add_argument('--preset')
+    rm_parser = accounts_subparsers.add_parser('rm', help="remove accounts", parents=[common])
+    rm_parser.add_argument('ids', nargs='+', type=int)
+
+    logs_parser = subparsers.add_parser('logs', help="show an account's recent FFmpeg log from the daemon",
+                                        parents=[common])
+    logs_parser.add_argument('id', type=int)
+    logs_parser.add_argument('-n', '--lines', type=int, default=0, help="only the last N lines")
+
+    presets_parser = subparsers.add_parser('presets', help="list presets, * marks the default", parents=[common])
+    presets_parser.add_argument('--json', action='store_true')
+
+    nodes_parser = subparsers.add_parser('nodes', help="list worker agents and their load", parents=[common])
+    nodes_parser.add_argument('--json', action='store_true')
+
+    agent_parser = subparsers.add_parser('agent', help="run as a worker agent for a coordinator", parents=[common])
+    agent_parser.add_argument('--host', default='127.0.0.1', help="0.0.0.0 to accept a coordinator on "
+                                                                  "another host (trusted network only)")
+    agent_parser.add_argument('--port', type=int, default=8081)
+
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        main()
+        if args.command == 'daemon':
+            sys.exit(run_daemon(args.host, args.port, data_dir=args.data_dir))
+        elif args.command == 'agent':
+            # An agent is a daemon driven by a coordinator, see NodeCoordinator
+            sys.exit(run_daemon(args.host, args.port, 'agent.json', args.data_dir))
+        elif args.command:
+            sys.exit(run_command(args))
+        else:
+            main()
     except KeyboardInterrupt:
         print("\n\nProgram interrupted by user. Exiting gracefully...")
     finally:
-        # Ensure curses is properly cleaned up
+        # Ensure curses is properly cleaned up, if the dashboard loaded it
         try:
-            curses.endwin()
+            sys.modules['curses'].endwin()
         except:
             pass
@@ -0,0 +1,57 @@
+"""Shared fixtures: a streamer in a scratch directory, driving fake_ffmpeg.py into a local TCP sink"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import benchmark
+from main import YouTubeMultiStreamer
+
+FAKE_FFMPEG = benchmark.FAKE_FFMPEG
+
+
+def wait_until(predicate, timeout=10):
+    """Poll predicate until it is true, returning False on timeout"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture(scope='session')
+def sink_port():
+    process, port, _ = benchmark.start_sink()
+    yield port
+    process.terminate()
+
+
+@pytest.fixture
+def streamer(tmp_path, monkeypatch, sink_port):
+    monkeypatch.chdir(tmp_path)
+    streamer = YouTubeMultiStreamer()
+    streamer.settings.update({
+        'ffmpeg_path': FAKE_FFMPEG,
+        'rtmp_base': f"rtmp://127.0.0.1:{sink_port}/live2",
+        'cpu_budget': 1000000,
+        'ramp_interval': 0
+    })
+    yield streamer
+    streamer.stop_all_streams(timeout=5)
+    streamer.supervisor.shutdown()
+
+
+@pytest.fixture
+def media(tmp_path):
+    """Create placeholder media files, returning their absolute paths"""
+    def create(*names):
+        paths = []
+        for name in names:
+            path = tmp_path / name
+            path.write_bytes(b'\x00' * 16)
+            paths.append(str(path))
+        return paths
+    return create
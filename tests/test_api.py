@@ -0,0 +1,153 @@
+"""ControlAPI routes against live fake FFmpeg processes"""
+import pytest
+
+from main import ControlAPI
+
+from conftest import wait_until
+
+
+def add_accounts(streamer, sources):
+    with streamer.config_lock:
+        return [streamer.new_account(f"aaaa-bbbb-cccc-{i:04d}", source, f"Account {i}")
+                for i, source in enumerate(sources)]
+
+
+def test_bulk_stop_keeps_unlisted_siblings(streamer, media):
+    shared, other = media('shared.mp4', 'other.mp4')
+    first, second, third = add_accounts(streamer, [shared, shared, other])
+    api = ControlAPI(streamer)
+
+    code, _ = api.route('POST', '/streams/start', {'ids': [first, second, third], 'loop': True})
+    assert code == 200
+    assert wait_until(lambda: all(streamer.accounts[account_id]['status'] == 'streaming'
+                                  for account_id in (first, second, third)))
+    assert streamer.stream_processes[first] is streamer.stream_processes[second]
+
+    code, _ = api.route('POST', '/streams/stop', {'ids': [first]})
+    assert code == 200
+    assert wait_until(lambda: streamer.accounts[first]['status'] == 'stopped')
+    # The sibling gets a process of its own, the unrelated account is untouched
+    assert wait_until(lambda: streamer.accounts[second]['status'] == 'streaming')
+    assert streamer.stream_processes[second]['accounts'] == [second]
+    assert streamer.accounts[third]['status'] == 'streaming'
+
+
+def test_bulk_stop_of_whole_group(streamer, media):
+    shared, = media('shared.mp4')
+    first, second = add_accounts(streamer, [shared, shared])
+    api = ControlAPI(streamer)
+    api.route('POST', '/streams/start', {'ids': [first, second], 'loop': True})
+    assert wait_until(lambda: all(streamer.accounts[account_id]['status'] == 'streaming'
+                                  for account_id in (first, second)))
+
+    api.route('POST', '/streams/stop', {'ids': [first, second]})
+    assert wait_until(lambda: all(streamer.accounts[account_id]['status'] == 'stopped'
+                                  for account_id in (first, second)))
+
+
+def test_slow_probe_does_not_block_the_api(streamer, media):
+    import asyncio
+    import threading
+    import time
+    from main import api_request
+
+    source, = media('slow.mp4')
+    account_id, = add_accounts(streamer, [source])
+
+    def slow_probe(video_source):
+        time.sleep(2)
+        return None
+    streamer.get_media_info = slow_probe
+
+    supervisor = streamer.supervisor
+    supervisor.ensure_running()
+    api = ControlAPI(streamer, port=0)
+    port = asyncio.run_coroutine_threadsafe(api.start(), supervisor.loop).result()
+    try:
+        starter = threading.Thread(
+            target=api_request, args=(('127.0.0.1', port), 'POST', f"/accounts/{account_id}/start", {}))
+        starter.start()
+        time.sleep(0.3)
+        started = time.time()
+        code, _ = api_request(('127.0.0.1', port), 'GET', '/status')
+        assert code == 200
+        assert time.time() - started < 1
+        starter.join()
+    finally:
+        asyncio.run_coroutine_threadsafe(api.close(), supervisor.loop).result()
+
+
+def test_shared_encode_is_reported(streamer, media):
+    shared, = media('shared.mp4')
+    first, second = add_accounts(streamer, [shared, shared])
+    streamer.start_group([first, second], loop=True)
+    assert wait_until(lambda: streamer.accounts[second]['status'] == 'streaming')
+
+    status = streamer.get_stream_status(first)
+    assert status['shared_encode'] == 2
+    assert streamer.preset_column(status).endswith('x2')
+    streamer.stop_stream(second)
+    assert wait_until(lambda: streamer.get_stream_status(first)['shared_encode'] == 1)
+
+
+@pytest.mark.parametrize('body', [
+    {'priority': 'high'},
+    {'priority': True},
+    {'priority': 10 ** 6},
+    {'shuffle': 'yes'},
+    {'restart_policy': 'aggressive'},
+    {'restart_policy': {'max_restarts': 'x'}},
+    {'restart_policy': {'max_restarts': 2.5}},
+    {'restart_policy': {'backoff_base': -1}},
+    {'restart_policy': {'jitter': 3}},
+    {'restart_policy': {'retries': 3}},
+])
+def test_patch_rejects_invalid_account_fields(streamer, media, body):
+    source, = media('source.mp4')
+    account_id, = add_accounts(streamer, [source])
+    before = dict(streamer.accounts[account_id])
+
+    code, payload = ControlAPI(streamer).route('PATCH', f"/accounts/{account_id}", body)
+    assert code == 400 and payload['error']
+    assert streamer.accounts[account_id] == before
+
+
+def test_patch_accepts_valid_account_fields(streamer, media):
+    source, = media('source.mp4')
+    account_id, = add_accounts(streamer, [source])
+
+    code, _ = ControlAPI(streamer).route('PATCH', f"/accounts/{account_id}", {
+        'priority': -5, 'shuffle': True, 'restart_policy': {'max_restarts': 3, 'jitter': 0.5}})
+    assert code == 200
+    account = streamer.accounts[account_id]
+    assert (account['priority'], account['shuffle']) == (-5, True)
+    assert streamer.restart_policy(account_id)['max_restarts'] == 3
+
+
+def test_metrics_cover_state_encoder_and_process(streamer, media):
+    import asyncio
+    import urllib.request
+
+    streamer.settings['proc_sample_interval'] = 0.2
+    source, = media('source.mp4')
+    account_id, other = add_accounts(streamer, [source, 'idle.mp4'])
+    assert streamer.start_stream(account_id, loop=False)
+    assert wait_until(lambda: streamer.accounts[account_id]['status'] == 'streaming'
+                      and streamer.stream_telemetry.get(account_id)
+                      and 'ytms_process_resident_memory_bytes{' in streamer.metrics_text())
+
+    supervisor = streamer.supervisor
+    api = ControlAPI(streamer, port=0)
+    port = asyncio.run_coroutine_threadsafe(api.start(), supervisor.loop).result()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            lines = response.read().decode().splitlines()
+    finally:
+        asyncio.run_coroutine_threadsafe(api.close(), supervisor.loop).result()
+    base = f'account="{account_id}",label="Account 0"'
+    assert f'ytms_stream_state{{state="streaming",{base}}} 1' in lines
+    assert f'ytms_stream_state{{state="stopped",account="{other}",label="Account 1"}} 1' in lines
+    assert any(line.startswith(f'ytms_encoder_fps{{{base}}} ') for line in lines)
+    assert 'ytms_ffmpeg_processes 1' in lines
+    rss, = [line for line in lines if line.startswith('ytms_process_resident_memory_bytes{')]
+    assert base in rss and int(rss.rsplit(' ', 1)[1]) > 0
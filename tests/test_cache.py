@@ -0,0 +1,71 @@
+"""Transcode cache index: LRU bumps stay in memory until an add, an eviction or exit"""
+import json
+import os
+
+from main import YouTubeMultiStreamer, flush_at_exit
+
+
+def read_index(streamer):
+    with open(os.path.join(streamer.cache_dir, 'index.json')) as f:
+        return json.load(f)
+
+
+def test_lookup_does_not_rewrite_the_index(streamer, media):
+    path, = media('rendition.mp4')
+    with streamer.cache_lock:
+        streamer.cache_index['key'] = {'source': path, 'preset': 'medium', 'path': path,
+                                       'size': 16, 'created': 1.0, 'last_used': 1.0}
+        streamer.save_cache_index()
+
+    for _ in range(3):
+        assert streamer.get_cached_path('key') == path
+    assert read_index(streamer)['key']['last_used'] == 1.0
+
+    streamer.flush_cache_index()
+    assert read_index(streamer)['key']['last_used'] == streamer.cache_index['key']['last_used'] > 1.0
+
+
+def test_vanished_file_is_dropped_from_the_index(streamer, media):
+    path, = media('rendition.mp4')
+    with streamer.cache_lock:
+        streamer.cache_index['key'] = {'source': path, 'preset': 'medium', 'path': path,
+                                       'size': 16, 'created': 1.0, 'last_used': 1.0}
+        streamer.save_cache_index()
+    os.remove(path)
+
+    assert streamer.get_cached_path('key') is None
+    assert 'key' not in read_index(streamer)
+
+
+def test_exit_flush_writes_where_the_cache_is(streamer, media, tmp_path, monkeypatch):
+    path, = media('rendition.mp4')
+    with streamer.cache_lock:
+        streamer.cache_index['key'] = {'source': path, 'preset': 'medium', 'path': path,
+                                       'size': 16, 'created': 1.0, 'last_used': 1.0}
+        streamer.save_cache_index()
+    streamer.get_cached_path('key')
+
+    elsewhere = tmp_path / 'elsewhere'
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+    flush_at_exit()
+    assert streamer.cache_dir == str(tmp_path / 'cache')
+    assert read_index(streamer)['key']['last_used'] > 1.0
+    assert not os.listdir(elsewhere)
+
+
+def test_streamers_leave_no_exit_hooks_behind(tmp_path, monkeypatch):
+    import main
+    hooks = []
+
+    class Recorder:
+        register = staticmethod(hooks.append)
+        unregister = staticmethod(lambda func: hooks.remove(func) if func in hooks else None)
+
+    monkeypatch.setattr(main, 'atexit', Recorder)
+    monkeypatch.chdir(tmp_path)
+    for _ in range(3):
+        streamer = YouTubeMultiStreamer()
+        streamer.supervisor.ensure_running()
+        streamer.supervisor.shutdown()
+    assert hooks == []
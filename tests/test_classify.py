@@ -0,0 +1,70 @@
+"""FFmpeg stderr classification in StreamSupervisor"""
+import pytest
+
+from main import StreamSupervisor
+
+
+@pytest.fixture
+def supervisor():
+    return StreamSupervisor(None)
+
+
+@pytest.mark.parametrize('line, reason', [
+    ("[rtmp @ 0x55d] Server returned 401 Unauthorized (authorization failed)", 'auth'),
+    ("[https @ 0x55d] HTTP error 403 Forbidden", 'auth'),
+    ("rtmp://a.rtmp.youtube.com/live2/abcd-403x-efgh-ijkl: Connection refused", 'network'),
+    ("[tee @ 0x55d] Slave '[f=flv:onfail=ignore]rtmp://x/live2/4013-aaaa': error writing: Broken pipe", 'network'),
+    ("rtmp://a.rtmp.youtube.com/live2/key: Input/output error", 'network'),
+    ("D:\\video\\missing.mp4: No such file or directory", 'input_missing'),
+    ("[https @ 0x55d] HTTP error 404 Not Found", 'input_missing'),
+    ("Error while opening encoder for output stream #0:0", 'encoder'),
+    ("Error opening output files: something new", 'unknown'),
+])
+def test_error_lines(supervisor, line, reason):
+    assert supervisor.classify_line(line) == reason
+
+
+@pytest.mark.parametrize('line', [
+    "frame= 1200 fps= 30 q=23.0 size= 4031kB time=00:00:40.00 bitrate=4031.2kbits/s speed=1x",
+    "  Stream #0:0: Video: h264, yuv420p, 1280x720, 4013 kb/s, 30 fps",
+    "  title           : Live 401 session 403",
+    "Output #0, flv, to 'rtmp://a.rtmp.youtube.com/live2/abcd-4013-forb-idde':",
+])
+def test_info_lines_are_not_errors(supervisor, line):
+    assert supervisor.classify_line(line) is None
+
+
+def test_exit_uses_the_last_classified_error(supervisor):
+    lines = [
+        "Output #0, flv, to 'rtmp://a.rtmp.youtube.com/live2/abcd-0403-efgh':",
+        "frame=  900 fps= 30 bitrate=4031.2kbits/s speed=1x",
+        "rtmp://a.rtmp.youtube.com/live2/abcd-0403-efgh: Connection refused",
+        "Error opening output files",
+    ]
+    assert supervisor.classify_exit(1, lines) == ('network', lines[2])
+
+
+def test_exit_without_a_known_error(supervisor):
+    lines = ["frame=  900 fps= 30 bitrate=4031.2kbits/s", "Error opening output files", "Exiting normally"]
+    assert supervisor.classify_exit(1, lines) == ('unknown', "Error opening output files")
+    assert supervisor.classify_exit(0, lines)[0] == 'ended'
+    assert supervisor.classify_exit(-9, lines)[0] == 'killed'
+
+
+def test_live_lines_set_last_error_only_for_errors(streamer):
+    from collections import deque
+    from main import LogRing
+
+    with streamer.config_lock:
+        account_id = streamer.new_account('aaaa-bbbb-cccc-0403', 'in.mp4')
+    stream = {'accounts': [account_id], 'stderr_tail': deque(maxlen=20), 'log': LogRing(4096)}
+    streamer.stream_processes[account_id] = stream
+    streamer.stream_stats[account_id] = {'last_error': None}
+    supervisor = streamer.supervisor
+
+    supervisor.handle_stderr_line(stream, "Output #0, flv, to 'rtmp://x/live2/aaaa-bbbb-cccc-0403':")
+    supervisor.handle_stderr_line(stream, "frame=  900 fps= 30 bitrate=4031.2kbits/s speed=1x")
+    assert streamer.stream_stats[account_id]['last_error'] is None
+
+    supervisor.handle_stderr_line(stream, "rtmp://x/live2/aaaa-bbbb-cccc-0403: Connection refused")
+    assert streamer.stream_stats[account_id]['last_error']['reason'] == 'network'
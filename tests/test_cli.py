@@ -0,0 +1,60 @@
+"""One-shot subcommands: local config fallback and --data-dir"""
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from conftest import FAKE_FFMPEG, wait_until
+from main import find_instance, parse_args, run_command
+
+MAIN = os.path.join(os.path.dirname(FAKE_FFMPEG), 'main.py')
+
+
+def run(argv, capsys):
+    code = run_command(parse_args(argv))
+    return code, capsys.readouterr().out
+
+
+def test_local_fallback_starts_no_background_work(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    with open(data_dir / 'config.json', 'w') as f:
+        json.dump({'settings': {'agents': ['127.0.0.1:1']}, 'accounts': {'1': {
+            'id': 1, 'stream_key': 'aaaa-bbbb-cccc-dddd', 'video_source': 'a.mp4', 'label': 'One',
+            'preset': 'medium', 'schedules': [{'action': 'start', 'time': '10:00'}]}},
+            'next_account_id': 2}, f)
+    threads = set(threading.enumerate())
+
+    code, output = run(['status', '--json', '--data-dir', str(data_dir)], capsys)
+    assert code == 0
+    assert [status['label'] for status in json.loads(output)] == ['One']
+    # No schedule timer, supervisor loop or coordinator thread for a one-shot command
+    assert set(threading.enumerate()) == threads
+    code, output = run(['accounts', 'add', 'eeee-ffff-gggg-hhhh', '--label', 'Two', '--data-dir', str(data_dir)],
+                       capsys)
+    assert (code, output.strip()) == (0, '2')
+    assert all('config_writer' in thread.name for thread in set(threading.enumerate()) - threads)
+    assert os.getcwd() == str(data_dir)
+    with open(data_dir / 'config.json') as f:
+        assert len(json.load(f)['accounts']) == 2
+
+
+def test_commands_reach_a_daemon_in_another_data_dir(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    data_dir = tmp_path / 'daemon'
+    daemon = subprocess.Popen([sys.executable, MAIN, 'daemon', '--port', '0', '--data-dir', str(data_dir)],
+                              stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        assert wait_until(lambda: find_instance(str(data_dir / 'instance.json')) is not None, timeout=20)
+        code, output = run(['accounts', 'add', 'aaaa-bbbb-cccc-dddd', '--data-dir', str(data_dir)], capsys)
+        assert (code, output.strip()) == (0, '1')
+        code, output = run(['stop', '--data-dir', str(data_dir)], capsys)
+        assert code == 0 and 'Stopped.' in output
+    finally:
+        daemon.terminate()
+        daemon.wait(timeout=20)
+    # The account was added by the daemon, which wrote it on shutdown
+    with open(data_dir / 'config.json') as f:
+        assert json.load(f)['accounts']['1']['stream_key'] == 'aaaa-bbbb-cccc-dddd'
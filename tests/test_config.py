@@ -0,0 +1,86 @@
+"""Configuration persistence: coalesced atomic writes that leave runtime state out, and the SQLite store"""
+import json
+import os
+
+from conftest import wait_until
+from main import YouTubeMultiStreamer
+from test_api import add_accounts
+
+
+def read_config(streamer):
+    with open(streamer.config_path) as f:
+        return json.load(f)
+
+
+def test_runtime_updates_do_not_touch_the_file(streamer):
+    account_id, = add_accounts(streamer, ['source.mp4'])
+    streamer.flush_config()
+    writes = streamer.config_writes
+
+    streamer.update_account(account_id, status='streaming', pid=1234, start_time='2030-01-01T10:00')
+    assert not streamer.config_dirty.is_set()
+    assert streamer.config_writes == writes
+    assert 'status' not in read_config(streamer)['accounts'][str(account_id)]
+
+
+def test_burst_of_changes_is_one_atomic_write(streamer):
+    account_id, = add_accounts(streamer, ['source.mp4'])
+    streamer.flush_config()
+    streamer.settings['config_flush_interval'] = 0.5
+    writes = streamer.config_writes
+
+    for i in range(50):
+        streamer.update_account(account_id, label=f"label {i}", status='streaming' if i % 2 else 'stopped')
+    assert wait_until(lambda: streamer.config_writes > writes and not streamer.config_dirty.is_set())
+    assert streamer.config_writes - writes <= 2
+
+    saved = read_config(streamer)['accounts'][str(account_id)]
+    assert saved['label'] == 'label 49'
+    assert not set(streamer.runtime_fields) & set(saved)
+    assert not os.path.exists(streamer.config_path + '.tmp')
+
+
+def test_pending_changes_are_flushed_on_exit(streamer):
+    account_id, = add_accounts(streamer, ['source.mp4'])
+    streamer.flush_config()
+    streamer.settings['config_flush_interval'] = 60
+    streamer.update_account(account_id, label='renamed')
+    assert read_config(streamer)['accounts'][str(account_id)]['label'] != 'renamed'
+
+    streamer.flush_pending_config()
+    assert read_config(streamer)['accounts'][str(account_id)]['label'] == 'renamed'
+    assert not streamer.config_dirty.is_set()
+
+
+def test_sqlite_store_migrates_and_keeps_accounts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    accounts = {str(i): {'id': i, 'stream_key': f"key-{i}", 'video_source': 'source.mp4', 'label': label,
+                         'preset': preset, 'last_update': None}
+                for i, (label, preset) in enumerate([('news_1', 'low'), ('newsx1', 'medium'), ('music', 'low')], 1)}
+    with open('config.json', 'w') as f:
+        json.dump({'accounts': accounts, 'next_account_id': 4, 'settings': {'account_store': 'sqlite'}}, f)
+
+    streamer = YouTubeMultiStreamer(background=False)
+    try:
+        assert list(streamer.accounts) == [1, 2, 3]
+        assert streamer.store.count() == 3
+        assert 'accounts' not in read_config(streamer)
+        assert os.path.exists('config.json.bak')
+
+        assert streamer.find_accounts(preset='low') == [1, 3]
+        assert streamer.find_accounts(label='NEWS_') == [1]
+        streamer.update_account(2, preset='low', status='streaming')
+        assert streamer.find_accounts(preset='low') == [1, 2, 3]
+        streamer.remove_account(3)
+        streamer.flush_config()
+    finally:
+        streamer.store.close()
+
+    reopened = YouTubeMultiStreamer(background=False)
+    try:
+        assert list(reopened.accounts) == [1, 2]
+        assert reopened.accounts[2]['preset'] == 'low'
+        assert reopened.accounts[2]['status'] == 'stopped'
+        assert reopened.next_account_id == 4
+    finally:
+        reopened.store.close()
@@ -0,0 +1,36 @@
+"""Dashboard redraws: the sorted account view is only rebuilt when accounts change"""
+from benchmark import FakeScreen
+from test_api import add_accounts
+
+
+def test_idle_frames_reuse_the_sorted_view(streamer, media, monkeypatch):
+    source, = media('source.mp4')
+    first, second, third = add_accounts(streamer, [source] * 3)
+    scans = []
+    find_accounts = streamer.find_accounts
+
+    def counting(**filters):
+        scans.append(filters)
+        return find_accounts(**filters)
+    monkeypatch.setattr(streamer, 'find_accounts', counting)
+    screen, view = FakeScreen(), streamer.new_dashboard_view()
+    view['sort'] = 'label'
+
+    for _ in range(5):
+        streamer.render_dashboard(screen, view)
+    assert len(scans) == 1
+    writes = screen.writes
+    streamer.render_dashboard(screen, view)
+    assert screen.writes == writes  # Nothing changed on screen either
+
+    streamer.update_account(second, label='A first')
+    streamer.render_dashboard(screen, view)
+    assert len(scans) == 2
+    assert view['account_ids'] == [second, first, third]
+
+    view['status_filter'] = 'streaming'
+    streamer.render_dashboard(screen, view)
+    assert len(scans) == 3 and view['account_ids'] == []
+    streamer.update_account(third, status='streaming')
+    streamer.render_dashboard(screen, view)
+    assert view['account_ids'] == [third]
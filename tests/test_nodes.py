@@ -0,0 +1,118 @@
+"""A coordinator driving two localhost agents, each in its own data directory"""
+import json
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+
+from conftest import FAKE_FFMPEG, wait_until
+from main import YouTubeMultiStreamer, find_instance, api_request
+from test_api import add_accounts
+
+MAIN = os.path.join(os.path.dirname(FAKE_FFMPEG), 'main.py')
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason="pauses agents with SIGSTOP")
+
+
+def launch_agent(data_dir, sink_port):
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, 'config.json'), 'w') as f:
+        json.dump({'settings': {'ffmpeg_path': FAKE_FFMPEG, 'rtmp_base': f"rtmp://127.0.0.1:{sink_port}/live2",
+                                'cpu_budget': 1000000, 'ramp_interval': 0}}, f)
+    return subprocess.Popen([sys.executable, MAIN, 'agent', '--port', '0', '--data-dir', str(data_dir)],
+                            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            start_new_session=True, text=True)
+
+
+@pytest.fixture
+def agents(tmp_path, sink_port):
+    """Two running agents as [(address, process)]"""
+    processes = [launch_agent(tmp_path / f"agent-{i}", sink_port) for i in range(2)]
+    started = []
+    for i, process in enumerate(processes):
+        path = str(tmp_path / f"agent-{i}" / 'agent.json')
+        assert wait_until(lambda: find_instance(path) is not None, timeout=20)
+        host, port = find_instance(path)
+        started.append((f"{host}:{port}", process))
+    yield started
+    for process in processes:
+        try:
+            os.killpg(process.pid, signal.SIGCONT)
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        process.communicate(timeout=20)
+
+
+def coordinate(streamer, addresses):
+    streamer.settings.update({'agents': addresses, 'agent_interval': 0.3, 'agent_timeout': 1})
+
+
+def agent_statuses(address):
+    host, _, port = address.rpartition(':')
+    _, report = api_request((host, int(port)), 'GET', '/node')
+    return {status['id']: status['status'] for status in report['accounts']}
+
+
+def test_second_agent_in_one_data_dir_is_refused(agents, tmp_path, sink_port):
+    process = launch_agent(tmp_path / 'agent-0', sink_port)
+    output, _ = process.communicate(timeout=20)
+    assert process.returncode == 1
+    assert 'already runs' in output
+
+
+def test_placement_failover_and_release(streamer, agents, media):
+    (first_address, _), (second_address, _) = agents
+    source, = media('source.mp4')
+    account_id, = add_accounts(streamer, [source])
+    coordinate(streamer, [first_address, second_address])
+    placements = streamer.coordinator.placements
+
+    assert streamer.start_stream(account_id, loop=True)
+    assert wait_until(lambda: streamer.accounts[account_id]['status'] == 'streaming', timeout=20)
+    placed = placements[account_id]
+    other = second_address if placed == first_address else first_address
+    paused = dict(agents)[placed]
+
+    # A silent agent loses its account to the other one
+    os.killpg(paused.pid, signal.SIGSTOP)
+    assert wait_until(lambda: placements.get(account_id) == other
+                      and streamer.accounts[account_id]['status'] == 'streaming', timeout=20)
+
+    # Back again, it is told to stop the stream that moved away
+    os.killpg(paused.pid, signal.SIGCONT)
+    assert wait_until(lambda: agent_statuses(placed).get(account_id, 'stopped') == 'stopped', timeout=20)
+    assert placements[account_id] == other
+
+    streamer.stop_stream(account_id)
+    assert wait_until(lambda: agent_statuses(other).get(account_id, 'stopped') == 'stopped', timeout=20)
+    assert account_id not in placements
+    assert streamer.accounts[account_id]['status'] == 'stopped'
+
+
+def test_new_coordinator_adopts_running_streams(streamer, agents, media, tmp_path, monkeypatch):
+    addresses = [address for address, _ in agents]
+    source, = media('source.mp4')
+    account_id, = add_accounts(streamer, [source])
+    coordinate(streamer, addresses)
+    assert streamer.start_stream(account_id, loop=True)
+    assert wait_until(lambda: streamer.accounts[account_id]['status'] == 'streaming', timeout=20)
+    placed = streamer.coordinator.placements[account_id]
+
+    # A restarted coordinator with the same accounts picks the stream up instead of starting it twice
+    os.makedirs(tmp_path / 'restarted')
+    monkeypatch.chdir(tmp_path / 'restarted')
+    restarted = YouTubeMultiStreamer()
+    try:
+        adopted, = add_accounts(restarted, [source])
+        assert adopted == account_id
+        coordinate(restarted, addresses)
+        restarted.coordinator.ensure_running()
+        assert wait_until(lambda: restarted.coordinator.placements.get(account_id) == placed
+                          and restarted.accounts[account_id]['status'] == 'streaming', timeout=20)
+        assert sum(account_id in agent_statuses(address) for address in addresses) == 1
+    finally:
+        restarted.stop_all_streams(timeout=5)
+        restarted.supervisor.shutdown()
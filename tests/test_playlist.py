@@ -0,0 +1,60 @@
+"""Looping playlists: a flat concat list repeated by -stream_loop, reloaded at a pass boundary"""
+import time
+
+from conftest import wait_until
+from test_api import add_accounts
+
+
+def probe_with_duration(duration):
+    def probe(path):
+        return {'video_codec': 'h264', 'pix_fmt': 'yuv420p', 'width': 1280, 'height': 720, 'fps': 30,
+                'video_bitrate': None, 'audio_codec': 'aac', 'bitrate': None, 'duration': duration}
+    return probe
+
+
+def test_looping_playlist_is_a_flat_list(streamer, media, tmp_path):
+    media('a.mp4', 'b.mp4')
+    source = str(tmp_path / '*.mp4')
+    streamer.get_media_info = probe_with_duration(2.5)
+
+    path = streamer.write_playlist(source)
+    with open(path, encoding='utf-8') as f:
+        entries = [line for line in f if line.startswith('file ')]
+    assert len(entries) == 2 and not any(path in line for line in entries)
+    assert streamer.playlist_durations[path] == 5.0
+
+    args = streamer.source_input_args(source, loop=True)
+    assert args[args.index('-stream_loop') + 1] == '-1'
+    assert '-stream_loop' not in streamer.source_input_args(source, loop=False)
+
+
+def test_reload_restarts_at_the_pass_boundary(streamer, media, tmp_path):
+    media('a.mp4', 'b.mp4')
+    source = str(tmp_path / '*.mp4')
+    streamer.get_media_info = probe_with_duration(1.0)
+    account_id, = add_accounts(streamer, [source])
+
+    assert streamer.start_stream(account_id, loop=True)
+    assert wait_until(lambda: streamer.accounts[account_id]['status'] == 'streaming')
+    pid = streamer.accounts[account_id]['pid']
+    launched = streamer.stream_processes[account_id]['launched']
+
+    media('c.mp4')
+    assert streamer.reload_playlist(account_id)
+    assert wait_until(lambda: streamer.accounts[account_id]['pid'] not in (None, pid))
+    # Three items of one second each: the new process starts once the running pass ends
+    restarted = streamer.stream_processes[account_id]['launched']
+    assert restarted - launched >= 2.0 - 0.2
+    assert streamer.stream_stats[account_id]['restarts'] == 0
+    with open(streamer.playlist_path(source), encoding='utf-8') as f:
+        assert sum(line.startswith('file ') for line in f) == 3
+    assert time.time() - restarted < 5
+
+
+def test_bracketed_file_name_is_a_single_file(streamer, media):
+    source, = media('My Stream [HD].mp4')
+    assert not streamer.is_playlist(source)
+    account_id, = add_accounts(streamer, [source])
+
+    assert streamer.start_stream(account_id, loop=True)
+    assert wait_until(lambda: streamer.accounts[account_id]['status'] == 'streaming')
@@ -0,0 +1,46 @@
+"""Ingest relay: one pull per remote URL, fanned out to every stream reading it"""
+from conftest import wait_until
+from test_api import add_accounts
+
+URL = 'http://127.0.0.1:9/live.m3u8'
+
+
+def command_line(pid):
+    with open(f"/proc/{pid}/cmdline", 'rb') as f:
+        return f.read().decode().split('\0')
+
+
+def start_each(streamer, account_ids):
+    for account_id in account_ids:
+        assert streamer.start_stream(account_id)
+    assert wait_until(lambda: all(streamer.accounts[account_id]['status'] == 'streaming'
+                                  for account_id in account_ids))
+    return [command_line(streamer.accounts[account_id]['pid']) for account_id in account_ids]
+
+
+def test_streams_on_one_url_share_a_relay(streamer):
+    streamer.settings['relay_linger'] = 0
+    first, second = add_accounts(streamer, [URL, URL])
+    streamer.accounts[second]['preset'] = 'low'
+
+    commands = start_each(streamer, [first, second])
+    address = streamer.supervisor.relay_address(URL)
+    assert address.startswith('tcp://127.0.0.1:')
+    assert all(cmd[cmd.index('-i') + 1] == address and URL not in cmd for cmd in commands)
+    relay, = streamer.supervisor.relay_status()
+    assert relay['references'] == 2 and relay['pulling']
+    assert wait_until(lambda: streamer.supervisor.relay_status()[0]['consumers'] == 2)
+
+    streamer.stop_stream(first)
+    streamer.stop_stream(second)
+    assert wait_until(lambda: not streamer.supervisor.relay_status())
+
+
+def test_relay_off_reads_the_url_directly(streamer):
+    streamer.settings['relay_urls'] = False
+    first, second = add_accounts(streamer, [URL, URL])
+    streamer.accounts[second]['preset'] = 'low'
+
+    commands = start_each(streamer, [first, second])
+    assert all(cmd[cmd.index('-i') + 1] == URL for cmd in commands)
+    assert streamer.supervisor.relay_status() == []
@@ -0,0 +1,125 @@
+"""ScheduleTimer pre-buffering: every relay taken for a start is given back"""
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import wait_until
+from test_api import add_accounts
+
+
+@pytest.fixture
+def timer(streamer):
+    """The schedule timer with relays replaced by a reference count"""
+    refs = {}
+
+    async def acquire_relay(url):
+        refs[url] = refs.get(url, 0) + 1
+
+    def release_relay(url):
+        refs[url] -= 1
+
+    streamer.supervisor.acquire_relay = acquire_relay
+    streamer.supervisor.release_relay = release_relay
+    streamer.prewarm = lambda account_id, loop=False: []
+    streamer.start_group = lambda account_ids, loop=False: True
+    streamer.supervisor.ensure_running()
+    timer = streamer.schedule_timer
+    timer.refs = refs
+    return timer
+
+
+def schedule_start(streamer, account_id, hours=1):
+    at = (datetime.now() + timedelta(hours=hours)).isoformat(timespec='minutes')
+    streamer.accounts[account_id]['schedules'] = [{'action': 'start', 'at': at, 'loop': True}]
+
+
+def run(timer, coroutine):
+    return asyncio.run_coroutine_threadsafe(coroutine, timer.streamer.supervisor.loop).result()
+
+
+def dispatch_phase(timer, phase):
+    """Dispatch the queued events of one phase, as the timer does when they are due"""
+    async def dispatch():
+        due = [event for event in timer.heap if event[2] == phase]
+        timer.heap = [event for event in timer.heap if event[2] != phase]
+        heapq.heapify(timer.heap)
+        await timer.dispatch(due)
+    run(timer, dispatch())
+
+
+def test_prebuffered_relay_is_released_when_the_start_fires_later(streamer, timer):
+    account_id, = add_accounts(streamer, ['http://127.0.0.1/live.m3u8'])
+    schedule_start(streamer, account_id)
+    streamer.supervisor.call(timer.rebuild)
+
+    dispatch_phase(timer, 'prepare')
+    assert wait_until(lambda: timer.refs.get('http://127.0.0.1/live.m3u8') == 1)
+    dispatch_phase(timer, 'fire')
+    assert timer.refs['http://127.0.0.1/live.m3u8'] == 0
+    assert not timer.prebuffered
+
+
+def test_prebuffered_relay_is_released_when_the_start_is_cancelled(streamer, timer):
+    account_id, = add_accounts(streamer, ['http://127.0.0.1/live.m3u8'])
+    schedule_start(streamer, account_id)
+    streamer.supervisor.call(timer.rebuild)
+    dispatch_phase(timer, 'prepare')
+    assert wait_until(lambda: timer.refs.get('http://127.0.0.1/live.m3u8') == 1)
+
+    # An unrelated rebuild keeps the relay, removing the start gives it back
+    streamer.supervisor.call(timer.rebuild)
+    assert timer.refs['http://127.0.0.1/live.m3u8'] == 1
+    streamer.accounts[account_id]['schedules'] = []
+    streamer.supervisor.call(timer.rebuild)
+    assert timer.refs['http://127.0.0.1/live.m3u8'] == 0
+
+
+def test_failed_prepare_is_reported(streamer, timer, capsys):
+    account_id, = add_accounts(streamer, ['http://127.0.0.1/live.m3u8'])
+    schedule_start(streamer, account_id)
+
+    def prewarm(account_id, loop=False):
+        raise RuntimeError("probe exploded")
+    streamer.prewarm = prewarm
+    streamer.supervisor.call(timer.rebuild)
+    dispatch_phase(timer, 'prepare')
+
+    assert wait_until(lambda: any(event['event'] == 'prepare' and 'probe exploded' in event['result']
+                                  for event in timer.history))
+    assert 'probe exploded' in capsys.readouterr().out
+    assert not timer.prebuffered
+
+
+
+def upcoming_starts(streamer):
+    return [event['account'] for event in streamer.supervisor.call(streamer.schedule_timer.upcoming)
+            if event['event'] == 'start']
+
+
+def test_timezone_aware_start_is_stored_as_local_time(streamer, media):
+    from main import ControlAPI
+    source, = media('source.mp4')
+    account_id, = add_accounts(streamer, [source])
+    api = ControlAPI(streamer)
+
+    code, payload = api.route('PUT', f"/accounts/{account_id}/schedules",
+                              {'schedules': [{'action': 'start', 'at': '2030-01-01T10:00+02:00'}]})
+    assert code == 200
+    expected = datetime.fromisoformat('2030-01-01T10:00+02:00').astimezone().replace(tzinfo=None)
+    assert payload['schedules'][0]['at'] == expected.isoformat(timespec='minutes')
+    assert wait_until(lambda: upcoming_starts(streamer) == [account_id])
+    assert not streamer.schedule_timer.task.done()
+
+
+def test_bad_stored_entry_does_not_stop_the_timer(streamer, media):
+    source, = media('source.mp4')
+    first, second = add_accounts(streamer, [source, source])
+    # Written before normalize converted aware times, e.g. by hand in config.json
+    streamer.accounts[first]['schedules'] = [{'action': 'start', 'at': '2030-01-01T10:00+02:00'}]
+    schedule_start(streamer, second)
+    streamer.schedule_timer.reschedule()
+
+    assert wait_until(lambda: upcoming_starts(streamer) == [second])
+    assert not streamer.schedule_timer.task.done()
@@ -0,0 +1,43 @@
+"""Still-image sources: one image or a slideshow over the audio of the video source"""
+from conftest import wait_until
+
+
+def add_still(streamer, audio, image, label='Still'):
+    with streamer.config_lock:
+        return streamer.new_account(f"still-key-{label}", audio, label, mode='still', image=image)
+
+
+def test_bracketed_image_name_is_a_single_file(streamer, media):
+    audio, image = media('audio.mp3', 'cover [1].png')
+    assert streamer.resolve_images(image) == [image]
+    account_id = add_still(streamer, audio, image)
+
+    assert streamer.start_stream(account_id, loop=True)
+    assert wait_until(lambda: streamer.accounts[account_id]['status'] == 'streaming')
+    assert '-loop' in streamer.still_input_args(image)
+
+
+def test_still_group_steps_down_together(streamer, media):
+    audio, image = media('audio.mp3', 'cover.png')
+    first, second = (add_still(streamer, audio, image, label) for label in ('a', 'b'))
+    assert streamer.start_group([first, second], loop=True)
+    assert wait_until(lambda: all(streamer.accounts[account_id]['status'] == 'streaming'
+                                  for account_id in (first, second)))
+    stream = streamer.stream_processes[first]
+    assert stream is streamer.stream_processes[second]
+
+    supervisor = streamer.supervisor
+    assert supervisor.call(supervisor.step_preset, [stream], -1)
+    assert streamer.effective_preset(first) == streamer.effective_preset(second) == 'low'
+    assert stream['cost'] == streamer.group_cost([first, second])
+    assert '1500k' in stream['build_cmd']()
+    assert wait_until(lambda: all(streamer.accounts[account_id]['status'] == 'streaming'
+                                  for account_id in (first, second)))
+
+
+def test_still_group_encodes_at_its_lowest_rung(streamer, media):
+    audio, image = media('audio.mp3', 'cover.png')
+    first, second = (add_still(streamer, audio, image, label) for label in ('a', 'b'))
+    streamer.preset_overrides[second] = 'low'
+    assert streamer.still_group_preset([first, second]) == 'low'
+    assert streamer.group_cost([first, second]) == streamer.group_cost([second])
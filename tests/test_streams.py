@@ -0,0 +1,128 @@
+"""Stream processes against fake FFmpeg: shared encodes, looping, telemetry, stopping"""
+import json
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import wait_until
+from test_api import add_accounts
+
+
+def statuses(streamer, account_ids):
+    return [streamer.accounts[account_id]['status'] for account_id in account_ids]
+
+
+def test_same_source_and_preset_share_one_encode(streamer, media):
+    source, = media('shared.mp4')
+    first, second = add_accounts(streamer, [source, source])
+    assert streamer.start_group([first, second])
+    assert wait_until(lambda: statuses(streamer, [first, second]) == ['streaming'] * 2)
+
+    stream = streamer.stream_processes[first]
+    assert stream is streamer.stream_processes[second]
+    assert streamer.accounts[first]['pid'] == streamer.accounts[second]['pid']
+    cmd = stream['build_cmd']()
+    assert cmd.count('-c:v') == 1
+    outputs = cmd[cmd.index('tee') + 1].split('|')
+    assert [output.rsplit('/', 1)[1] for output in outputs] == [streamer.accounts[first]['stream_key'],
+                                                               streamer.accounts[second]['stream_key']]
+    assert streamer.get_stream_status(first)['shared_encode'] == 2
+
+
+def test_presets_on_one_source_share_one_decode(streamer, media):
+    source, = media('shared.mp4')
+    account_ids = add_accounts(streamer, [source] * 3)
+    streamer.accounts[account_ids[2]]['preset'] = 'low'
+    assert streamer.start_group(account_ids)
+    assert wait_until(lambda: statuses(streamer, account_ids) == ['streaming'] * 3)
+
+    stream = streamer.stream_processes[account_ids[0]]
+    assert all(streamer.stream_processes[account_id] is stream for account_id in account_ids)
+    cmd = stream['build_cmd']()
+    assert cmd.count('-i') == 1
+    assert cmd[cmd.index('-filter_complex') + 1].startswith('[0:v]split=2')
+    assert cmd.count('-c:v') == 2
+    assert [len(cmd[i + 1].split('|')) for i, arg in enumerate(cmd) if arg == 'tee'] == [2, 1]
+    assert [streamer.get_stream_status(account_id)['shared_encode'] for account_id in account_ids] == [2, 2, 1]
+    assert streamer.get_stream_status(account_ids[2])['shared_decode'] == 3
+
+
+def test_looping_file_stays_in_one_process(streamer, media):
+    source, = media('loop.mp4')
+    account_id, = add_accounts(streamer, [source])
+    cmd = streamer.build_ffmpeg_command(source, 'key', 'medium', loop=True)
+    assert cmd[cmd.index('-stream_loop'):cmd.index('-i')] == ['-stream_loop', '-1']
+    assert '-stream_loop' not in streamer.build_ffmpeg_command(source, 'key', 'medium')
+
+    assert streamer.start_stream(account_id, loop=True)
+    assert wait_until(lambda: streamer.accounts[account_id]['status'] == 'streaming')
+    pid = streamer.accounts[account_id]['pid']
+    assert not wait_until(lambda: streamer.accounts[account_id]['pid'] != pid, timeout=1.5)
+    assert streamer.stream_stats[account_id]['restarts'] == 0
+
+
+def test_stream_without_loop_ends_with_its_source(streamer, media, monkeypatch):
+    monkeypatch.setenv('FAKE_FFMPEG_DURATION', '0.5')
+    source, = media('once.mp4')
+    account_id, = add_accounts(streamer, [source])
+
+    assert streamer.start_stream(account_id)
+    assert wait_until(lambda: streamer.accounts[account_id]['status'] == 'stopped')
+    assert streamer.stream_stats[account_id]['restarts'] == 0
+
+
+def test_progress_reports_fill_the_telemetry_ring(streamer, media, monkeypatch):
+    monkeypatch.setenv('FAKE_FFMPEG_SPEED', '0.8')
+    monkeypatch.setenv('FAKE_FFMPEG_PROGRESS_INTERVAL', '0.1')
+    streamer.settings['telemetry_samples'] = 4
+    source, = media('slow.mp4')
+    account_id, = add_accounts(streamer, [source])
+
+    assert streamer.start_stream(account_id, loop=False)
+    assert wait_until(lambda: len(streamer.stream_telemetry.get(account_id, ())) == 4)
+    time.sleep(0.5)
+    assert len(streamer.stream_telemetry[account_id]) == 4
+    status = streamer.get_stream_status(account_id)
+    assert status['speed'] == status['speed_min'] == 0.8
+    assert status['fps'] == 24.0
+    assert status['speed_trend'] == '→'
+
+
+def test_stop_all_kills_hung_encoders_in_parallel(streamer, media, monkeypatch):
+    monkeypatch.setenv('FAKE_FFMPEG_IGNORE_QUIT', '1')
+    streamer.settings['stop_timeout'] = 1
+    account_ids = add_accounts(streamer, media('a.mp4', 'b.mp4', 'c.mp4', 'd.mp4'))
+    for account_id in account_ids:
+        assert streamer.start_stream(account_id)
+    assert wait_until(lambda: statuses(streamer, account_ids) == ['streaming'] * 4)
+
+    started = time.time()
+    assert streamer.stop_all_streams(timeout=5)
+    # One stop_timeout for all four, not one each
+    assert time.time() - started < 3
+    assert statuses(streamer, account_ids) == ['stopped'] * 4
+
+
+@pytest.mark.skipif(sys.platform != 'linux', reason="checks orphans through /proc")
+def test_orphans_of_a_dead_supervisor_are_reaped(streamer, tmp_path):
+    dead = subprocess.Popen([sys.executable, '-c', ''])
+    dead.wait()
+    orphan = subprocess.Popen([sys.executable, streamer.settings['ffmpeg_path'], '-re', '-i', 'source.mp4',
+                               '-f', 'flv', streamer.rtmp_url('orphan')],
+                              stdin=subprocess.DEVNULL, start_new_session=True)
+
+    def running_fake_ffmpeg():
+        with open(f"/proc/{orphan.pid}/cmdline", 'rb') as f:
+            return b'fake_ffmpeg.py' in f.read()
+    try:
+        assert wait_until(running_fake_ffmpeg)
+        pid_file = tmp_path / streamer.settings['pid_file']
+        pid_file.write_text(json.dumps({'owner': dead.pid, 'children': [orphan.pid]}))
+
+        streamer.supervisor.reap_orphans()
+        assert orphan.wait(timeout=5) == -9
+        assert not pid_file.exists()
+    finally:
+        orphan.kill()
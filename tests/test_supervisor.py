@@ -0,0 +1,61 @@
+"""StreamSupervisor resource budgeting: admission, core pinning and encoder threads"""
+import main
+from conftest import wait_until
+from test_api import add_accounts
+
+
+def fake_stream(cost, admitted=True, cores=None):
+    return {'cost': cost, 'admitted': admitted, 'cores': cores}
+
+
+def test_lone_stream_gets_every_core(streamer, monkeypatch):
+    monkeypatch.setattr(main.os, 'cpu_count', lambda: 8)
+    supervisor = streamer.supervisor
+    stream = fake_stream(1.0)
+    monkeypatch.setattr(supervisor, 'running', {1: stream})
+    assert supervisor.encoder_threads(stream) == 8
+
+
+def test_busy_host_splits_cores_by_cost(streamer, monkeypatch):
+    monkeypatch.setattr(main.os, 'cpu_count', lambda: 8)
+    supervisor = streamer.supervisor
+    heavy, light = fake_stream(3.0), fake_stream(1.0)
+    queued = fake_stream(5.0, admitted=False)
+    monkeypatch.setattr(supervisor, 'running', {1: heavy, 2: light, 3: fake_stream(4.0), 4: queued})
+    assert supervisor.encoder_threads(heavy) == 3
+    assert supervisor.encoder_threads(light) == 1
+
+
+def test_cpu_budget_and_pinning_cap_threads(streamer, monkeypatch):
+    monkeypatch.setattr(main.os, 'cpu_count', lambda: 8)
+    streamer.settings['cpu_budget'] = 2
+    supervisor = streamer.supervisor
+    stream, pinned = fake_stream(1.0), fake_stream(1.0, cores=[4, 5, 6])
+    monkeypatch.setattr(supervisor, 'running', {1: stream, 2: pinned})
+    assert supervisor.encoder_threads(stream) == 1
+    assert supervisor.encoder_threads(pinned) == 3
+
+
+def test_stream_over_the_budget_waits_for_a_free_core(streamer, media):
+    streamer.settings['cpu_budget'] = 0.01
+    first, second = add_accounts(streamer, media('a.mp4', 'b.mp4'))
+
+    # The first runs on an idle host although it costs more than the whole budget
+    assert streamer.start_stream(first, loop=True)
+    assert wait_until(lambda: streamer.accounts[first]['status'] == 'streaming')
+    assert streamer.start_stream(second, loop=True)
+    assert not wait_until(lambda: streamer.accounts[second]['status'] != 'queued', timeout=1)
+
+    streamer.stop_stream(first)
+    assert wait_until(lambda: streamer.accounts[second]['status'] == 'streaming')
+    assert streamer.supervisor.cpu_in_use == streamer.stream_processes[second]['cost']
+
+
+def test_pinned_streams_take_the_least_loaded_cores(streamer, monkeypatch):
+    monkeypatch.setattr(main.os, 'sched_getaffinity', lambda pid: {0, 1, 2, 3}, raising=False)
+    supervisor = streamer.supervisor
+    assert supervisor.allocate_cores(2.0) == [0, 1]
+    assert supervisor.allocate_cores(1.5) == [2, 3]
+    assert supervisor.allocate_cores(0.5) == [0]
+    supervisor.call(supervisor.release_cpu, {'admitted': True, 'cost': 2.0, 'cores': [0, 1]})
+    assert supervisor.allocate_cores(1.0) == [1]